@@ -0,0 +1,77 @@
+import os
+import threading
+import time
+from contextlib import closing
+from typing import Dict, Tuple
+import pandas as pd
+import streamlit as st
+from anomalies import get_anomalies
+from db import subnet_db_path
+from rollups import AVAILABILITY_METRIC, COMPLETION_TIME_METRIC, RESPONSE_TIME_METRIC, sync_assignment_rollups, sync_availability_rollups
+from sidecar import connect_sidecar
+
+# Metrics watched for anomalies: how an alert describes them, their unit and whether high (1) or low (-1) values are bad
+WATCHED_METRICS = {
+    RESPONSE_TIME_METRIC: ("slow availability responses", "ms", 1),
+    AVAILABILITY_METRIC: ("availability drop", "", -1),
+    COMPLETION_TIME_METRIC: ("slow challenge completions", "s", 1)
+}
+
+# Seconds between two syncs of the node baselines, reruns in between are shown the nodes flagged by the last one
+ANOMALY_SYNC_INTERVAL_SECONDS = 60
+
+class FlaggedNodes:
+    """The nodes flagged by the last sync of each database and when it ran, shared by every session"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.synced: Dict[str, Tuple[float, pd.DataFrame]] = {}
+
+    def get(self, db_path: str) -> pd.DataFrame:
+        """Return the flagged nodes, syncing the baselines first if the last sync is older than the interval"""
+        with self.lock:
+            synced = self.synced.get(db_path)
+            if synced is None or time.monotonic() - synced[0] >= ANOMALY_SYNC_INTERVAL_SECONDS:
+                synced = (time.monotonic(), load_flagged_nodes(db_path))
+                self.synced[db_path] = synced
+            return synced[1]
+
+@st.cache_resource(show_spinner=False)
+def get_flagged_nodes() -> FlaggedNodes:
+    """Return the process wide flagged nodes"""
+    return FlaggedNodes()
+
+def load_flagged_nodes(db_path: str) -> pd.DataFrame:
+    """Fold the checks and assignments written since the last sync into the node baselines and return the flagged nodes"""
+    sync_availability_rollups(db_path)
+    sync_assignment_rollups(db_path)
+    with closing(connect_sidecar()) as conn:
+        return pd.concat(
+            [get_anomalies(conn, metric, direction).assign(metric=metric) for metric, (_, _, direction) in WATCHED_METRICS.items()],
+            ignore_index=True
+        )
+
+def show_anomaly_alerts() -> None:
+    """
+    Draw the sidebar panel listing nodes whose response times, availability or completion times left their own baseline.
+
+    Only the pages showing validator.db draw it, and its baselines are synced at most once per ANOMALY_SYNC_INTERVAL_SECONDS.
+    """
+    db_path = subnet_db_path("validator.db")
+    if not os.path.exists(db_path):
+        return
+    try:
+        flagged = get_flagged_nodes().get(db_path)
+    except Exception as e:
+        st.sidebar.caption(f"Anomaly detection is unavailable ({e})")
+        return
+    with st.sidebar.expander(f"🚨 Anomalies ({len(flagged)})" if len(flagged) else "Anomalies", expanded=len(flagged) > 0):
+        if flagged.empty:
+            st.caption("No node is deviating from its baseline")
+        for alert in flagged.itertuples():
+            description, unit, _ = WATCHED_METRICS[alert.metric]
+            if unit:
+                values = f"{alert.recent:,.0f}{unit} recently, {alert.baseline:,.0f}{unit} usually"
+            else:
+                values = f"{alert.recent:.0%} recently, {alert.baseline:.0%} usually"
+            st.error(f"**Node {alert.node_id}**: {description} ({values})")
@@ -0,0 +1,90 @@
+import sqlite3
+from typing import Iterable
+import numpy as np
+import pandas as pd
+
+# Smoothing of the baseline (long memory, about the last 500 samples so an outage takes long to become normal) and of the recent level (about the last 10)
+BASELINE_ALPHA = 0.002
+RECENT_ALPHA = 0.2
+
+# A node needs this many samples of a metric before it can be flagged
+MIN_BASELINE_SAMPLES = 30
+
+# A node is flagged when its recent level is this many standard errors from its baseline...
+ANOMALY_THRESHOLD = 4.0
+
+# ...and also differs from it by at least this fraction of the baseline, so tiny shifts in very stable metrics are ignored
+MIN_RELATIVE_DEVIATION = 0.2
+
+def ensure_baselines(conn: sqlite3.Connection) -> None:
+    """Create the table of per node baselines: an exponentially weighted mean and variance, and a faster moving recent mean"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS node_baselines (
+            metric TEXT NOT NULL,
+            node_id INTEGER NOT NULL,
+            count INTEGER NOT NULL,
+            mean REAL NOT NULL,
+            variance REAL NOT NULL,
+            recent REAL NOT NULL,
+            last_at TEXT,
+            PRIMARY KEY (metric, node_id)
+        )
+    """)
+
+def clear_baselines(conn: sqlite3.Connection, metrics: Iterable[str]) -> None:
+    for metric in metrics:
+        conn.execute("DELETE FROM node_baselines WHERE metric = ?", (metric,))
+
+def update_baselines(conn: sqlite3.Connection, metric: str, samples: pd.DataFrame) -> None:
+    """
+    Fold samples (node_id, timestamp, value) into the baselines of their nodes, oldest first.
+
+    Each sample updates the exponentially weighted moving mean and variance (West, 1979) of its
+    node in constant time, so the cost of a refresh is proportional to the new samples only.
+    While a node has few samples the weights are 1 / count, i.e. the plain mean and variance.
+    """
+    samples = samples.dropna(subset=['node_id', 'value']).sort_values('timestamp', kind="stable")
+    if samples.empty:
+        return
+    node_ids = samples['node_id'].astype(int).unique().tolist()
+    state = {
+        row[0]: list(row[1:])
+        for row in conn.execute(
+            f"SELECT node_id, count, mean, variance, recent, last_at FROM node_baselines WHERE metric = ? AND node_id IN ({', '.join('?' for _ in node_ids)})",
+            [metric] + node_ids
+        )
+    }
+    rows = []
+    for node_id, node_samples in samples.groupby(samples['node_id'].astype(int)):
+        count, mean, variance, recent, last_at = state.get(node_id, [0, 0.0, 0.0, 0.0, None])
+        for value in node_samples['value'].to_numpy(dtype=float).tolist():
+            count += 1
+            alpha = max(BASELINE_ALPHA, 1 / count)
+            difference = value - mean
+            mean += alpha * difference
+            variance = (1 - alpha) * (variance + alpha * difference * difference)
+            recent += max(RECENT_ALPHA, 1 / count) * (value - recent)
+        last_at = node_samples['timestamp'].iloc[-1]
+        rows.append((metric, node_id, count, mean, variance, recent, None if pd.isna(last_at) else str(last_at)))
+    conn.executemany(
+        "INSERT OR REPLACE INTO node_baselines (metric, node_id, count, mean, variance, recent, last_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        rows
+    )
+
+def get_anomalies(conn: sqlite3.Connection, metric: str, direction: int) -> pd.DataFrame:
+    """
+    Return the nodes whose recent level of a metric is anomalously high (direction 1) or low (-1) against their baseline.
+
+    The score is how many standard errors of the recent mean (an EWMA with weight RECENT_ALPHA has
+    a variance of alpha / (2 - alpha) times that of one sample) it lies from the baseline.
+    """
+    baselines = pd.read_sql_query(
+        "SELECT node_id, count, mean AS baseline, variance, recent, last_at FROM node_baselines WHERE metric = ? AND count >= ? ORDER BY node_id",
+        conn, params=(metric, MIN_BASELINE_SAMPLES)
+    )
+    standard_error = np.sqrt(baselines['variance'] * RECENT_ALPHA / (2 - RECENT_ALPHA))
+    deviation = direction * (baselines['recent'] - baselines['baseline'])
+    # A node that never varied scores infinity on any change
+    baselines['score'] = deviation / standard_error
+    anomalous = (baselines['score'] >= ANOMALY_THRESHOLD) & (deviation >= MIN_RELATIVE_DEVIATION * baselines['baseline'].abs())
+    return baselines[anomalous].drop(columns=['variance']).sort_values('score', ascending=False, ignore_index=True)
@@ -0,0 +1,346 @@
+import functools
+import inspect
+import os
+import queue
+import sqlite3
+import sys
+import threading
+from collections import OrderedDict
+from contextlib import closing, contextmanager
+from datetime import datetime
+from typing import Any, Callable, Iterator, List, Optional
+from urllib.parse import quote
+import pandas as pd
+import streamlit as st
+from dotenv import load_dotenv
+from sidecar import connect_sidecar
+
+# Load environment variables
+load_dotenv()
+
+# How long a read waits for the subnet's writers before giving up
+BUSY_TIMEOUT_MS = 5000
+
+# Page cache per connection (negative values are KiB) and how much of the database file is memory mapped
+CACHE_SIZE_KIB = 32 * 1024
+MMAP_SIZE_BYTES = 256 * 1024 * 1024
+
+# Connections kept open per database, shared by every session
+POOL_SIZE = 4
+
+# Prepared statements cached per connection, so repeated page queries are not re-parsed on every rerun
+CACHED_STATEMENTS = 256
+
+# Loader results kept in memory across reruns and sessions, the least recently used are evicted past either limit
+RESULT_CACHE_MAX_ENTRIES = 64
+RESULT_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+def subnet_db_path(filename: str) -> str:
+    """Return the path to one of the subnet's databases, stopping the page if the environment variable is not set"""
+    subnet_repo = os.getenv("ABSOLUTE_PATH_TO_SUBNET_REPO")
+    if subnet_repo is None:
+        st.error("You did not set your environment variable")
+        st.stop()
+    return subnet_repo + "/" + filename
+
+def show_db_error(e: Exception, db_path: str, action: Optional[str] = None) -> None:
+    """Explain a failed read or write to the user and stop the page"""
+    st.error(f"Error {action or 'reading from ' + os.path.basename(db_path)} ({e})")
+    st.info("Did you forget to set your environment variable? Cave is currently searching for " + db_path)
+    st.info("If you are sure you have set the environment variable, please check that the database file exists at " + db_path)
+    st.info("If you are sure the file exists, please ensure a miner and validator are running")
+    st.stop()
+
+def connect_read_only(db_path: str, sidecar_path: Optional[str] = None) -> sqlite3.Connection:
+    """
+    Open a subnet database read only, optionally with the sidecar attached (read only) as "cave".
+
+    mode=ro and query_only guarantee Cave never takes the write lock on the subnet's databases,
+    and a missing file is reported instead of silently created.
+    """
+    conn = sqlite3.connect(
+        f"file:{quote(db_path)}?mode=ro", uri=True, isolation_level=None,
+        check_same_thread=False, cached_statements=CACHED_STATEMENTS
+    )
+    conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+    conn.execute("PRAGMA query_only = ON")
+    conn.execute(f"PRAGMA cache_size = -{CACHE_SIZE_KIB}")
+    conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE_BYTES}")
+    if sidecar_path is not None:
+        # The sidecar is Cave's own database, make sure it exists before attaching it read only
+        connect_sidecar(sidecar_path).close()
+        conn.execute("ATTACH DATABASE ? AS cave", (f"file:{quote(sidecar_path)}?mode=ro",))
+    return conn
+
+class ReadOnlyPool:
+    """
+    A small pool of read only connections to one database, shared across sessions and reruns.
+
+    Connections are opened lazily and reopened if the database file was replaced (e.g. the
+    subnet was reset), so long lived connections never read a deleted file.
+    """
+
+    def __init__(self, db_path: str, sidecar_path: Optional[str] = None, size: int = POOL_SIZE):
+        self.db_path = db_path
+        self.sidecar_path = sidecar_path
+        self.idle = queue.LifoQueue()
+        self.slots = queue.Queue()
+        for _ in range(size):
+            self.slots.put(None)
+
+    def _file_id(self) -> tuple:
+        stat = os.stat(self.db_path)
+        return stat.st_dev, stat.st_ino
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """Borrow a connection, waiting for one to be returned if all are in use"""
+        try:
+            conn, file_id = self.idle.get_nowait()
+        except queue.Empty:
+            self.slots.get()
+            conn, file_id = None, None
+        try:
+            if conn is not None and file_id != self._file_id():
+                conn.close()
+                conn = None
+            if conn is None:
+                file_id = self._file_id()
+                conn = connect_read_only(self.db_path, self.sidecar_path)
+        except BaseException:
+            if conn is not None:
+                conn.close()
+            self.slots.put(None)
+            raise
+        released = False
+        try:
+            yield conn
+            released = True
+        finally:
+            if released:
+                self.idle.put((conn, file_id))
+            else:
+                # Don't hand a connection in an unknown state to the next reader, whatever interrupted it
+                conn.close()
+                self.slots.put(None)
+
+    def query(self, sql: str, params=()) -> List[tuple]:
+        """Return every row of a query"""
+        with self.connection() as conn:
+            return conn.execute(sql, params).fetchall()
+
+    def query_one(self, sql: str, params=()) -> Optional[tuple]:
+        """Return the first row of a query, or None"""
+        with self.connection() as conn:
+            return conn.execute(sql, params).fetchone()
+
+    def query_dicts(self, sql: str, params=()) -> List[dict]:
+        """Return every row of a query as a {column: value} dict"""
+        with self.connection() as conn:
+            cursor = conn.execute(sql, params)
+            columns = [description[0] for description in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def query_frame(self, sql: str, params=()) -> pd.DataFrame:
+        """Return the result of a query as a DataFrame"""
+        with self.connection() as conn:
+            return pd.read_sql_query(sql, conn, params=params)
+
+@st.cache_resource(show_spinner=False)
+def get_read_only_pool(db_path: str, sidecar_path: Optional[str] = None) -> ReadOnlyPool:
+    """Return the process wide read only pool for a database"""
+    return ReadOnlyPool(db_path, sidecar_path)
+
+def get_validator_db() -> ReadOnlyPool:
+    """Return the read only pool for validator.db"""
+    return get_read_only_pool(subnet_db_path("validator.db"))
+
+def get_logs_db(sidecar_path: Optional[str] = None) -> ReadOnlyPool:
+    """Return the read only pool for logging.db, optionally with the sidecar attached as "cave" """
+    return get_read_only_pool(subnet_db_path("logging.db"), sidecar_path)
+
+def format_like(value: datetime, stored: Optional[str]) -> str:
+    """Format a time like a stored ISO 8601 timestamp (with a "T" or a space before the time), so the two compare correctly as text"""
+    return value.isoformat(sep=" " if stored and stored[10:11] == " " else "T")
+
+def first_id_since(pool: ReadOnlyPool, table: str, id_column: str, time_column: str, since: str) -> Optional[int]:
+    """
+    Return the smallest id of a row whose ISO 8601 timestamp is at or after since, or None.
+
+    Rows of append only tables like availability_checks are written in time order, so this is a
+    binary search over the primary key (a few index lookups) instead of a scan of the unindexed
+    timestamp column.
+    """
+    with pool.connection() as conn:
+        min_id, max_id = conn.execute(f"SELECT min({id_column}), max({id_column}) FROM {table}").fetchone()
+        if min_id is None:
+            return None
+        first_row_sql = f"SELECT {id_column}, coalesce({time_column}, '') FROM {table} WHERE {id_column} >= ? ORDER BY {id_column} LIMIT 1"
+        low, high = min_id, max_id + 1
+        while low < high:
+            middle = (low + high) // 2
+            if conn.execute(first_row_sql, (middle,)).fetchone()[1] >= since:
+                high = middle
+            else:
+                low = middle + 1
+        if low > max_id:
+            return None
+        return conn.execute(first_row_sql, (low,)).fetchone()[0]
+
+def create_index(db_path: str, name: str, table: str, columns: str) -> None:
+    """
+    Create an index on one of the subnet's databases.
+
+    Building the index reads the whole table while holding the write lock, and the subnet then
+    maintains it on every insert, so it is only done when explicitly asked for.
+    """
+    with closing(sqlite3.connect(db_path, timeout=30, isolation_level=None)) as conn:
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})")
+
+def db_version(db_path: str) -> tuple:
+    """
+    Return a token that changes whenever a database is written to.
+
+    Every commit either appends to the -wal file or (without WAL, or on checkpoint) rewrites the
+    database file, so their size and modification time are enough, and reading them is a stat
+    call rather than a query.
+    """
+    version = ()
+    for path in (db_path, db_path + "-wal"):
+        try:
+            stat = os.stat(path)
+            version += (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+        except FileNotFoundError:
+            version += (None,)
+    return version
+
+def estimate_size(value: Any, seen: Optional[set] = None) -> int:
+    """Roughly estimate how many bytes a loader result holds, following lists, dicts and object attributes"""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    seen = seen if seen is not None else set()
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(estimate_size(key, seen) + estimate_size(item, seen) for key, item in value.items())
+    elif isinstance(value, (list, tuple, set)):
+        size += sum(estimate_size(item, seen) for item in value)
+    elif hasattr(value, "__dict__"):
+        size += estimate_size(vars(value), seen)
+    return size
+
+class ResultCache:
+    """
+    An LRU cache of loader results, each stored with the version of the database it was read from.
+
+    Entries are only reloaded when their database changed, and evicted least recently used first
+    once there are too many of them or they hold too much memory. Results are shared by every
+    session, cache_until_changed hands out copies so that a page can't change them for the others.
+    """
+
+    def __init__(self, max_entries: int = RESULT_CACHE_MAX_ENTRIES, max_bytes: int = RESULT_CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+
+    def get(self, key: tuple, version: tuple) -> tuple:
+        """Return (True, result) if the key was cached at this version, otherwise (False, None)"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] != version:
+                return False, None
+            self.entries.move_to_end(key)
+            return True, entry[1]
+
+    def put(self, key: tuple, version: tuple, result: Any) -> None:
+        size = estimate_size(result)
+        with self.lock:
+            if key in self.entries:
+                self.total_bytes -= self.entries.pop(key)[2]
+            if size > self.max_bytes:
+                return
+            self.entries[key] = (version, result, size)
+            self.total_bytes += size
+            while len(self.entries) > self.max_entries or self.total_bytes > self.max_bytes:
+                _, (_, _, evicted_size) = self.entries.popitem(last=False)
+                self.total_bytes -= evicted_size
+
+def copy_result(value: Any) -> Any:
+    """Copy the DataFrames and Series in a loader result, rebuilding the tuples, lists and dicts holding them"""
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return value.copy()
+    if isinstance(value, tuple):
+        return tuple(copy_result(item) for item in value)
+    if isinstance(value, list):
+        return [copy_result(item) for item in value]
+    if isinstance(value, dict):
+        return {key: copy_result(item) for key, item in value.items()}
+    return value
+
+@st.cache_resource(show_spinner=False)
+def get_result_cache() -> ResultCache:
+    """Return the process wide loader result cache"""
+    return ResultCache()
+
+def cache_until_changed(loader: Callable) -> Callable:
+    """
+    Cache a page loader's results until the database it reads from is written to.
+
+    The loader must take the database path as its db_path argument. Reruns that change nothing
+    in the database (selecting rows, changing filters) are then served without touching SQLite.
+    Loaders are keyed by their file rather than their module, since Streamlit runs every page as
+    __main__, and every call gets its own copy of the cached DataFrames.
+    """
+    signature = inspect.signature(loader)
+
+    @functools.wraps(loader)
+    def wrapper(*args, **kwargs):
+        arguments = signature.bind(*args, **kwargs)
+        arguments.apply_defaults()
+        key = (loader.__code__.co_filename, loader.__qualname__, tuple(arguments.arguments.items()))
+        version = db_version(arguments.arguments["db_path"])
+        cache = get_result_cache()
+        hit, result = cache.get(key, version)
+        if not hit:
+            result = loader(*args, **kwargs)
+            cache.put(key, version, result)
+        return copy_result(result)
+
+    return wrapper
+
+@cache_until_changed
+def index_exists(name: str, db_path: str) -> bool:
+    """Whether an index with this name exists in a database"""
+    try:
+        return get_read_only_pool(db_path).query_one("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = ?", (name,)) is not None
+    except Exception as e:
+        show_db_error(e, db_path)
+
+def parse_timestamps(frame: pd.DataFrame, columns: List[str]) -> pd.DataFrame:
+    """Parse ISO 8601 timestamp columns in one vectorized pass each, unparseable or missing values become NaT"""
+    for column in columns:
+        frame[column] = pd.to_datetime(frame[column], format="ISO8601", errors="coerce")
+    return frame
+
+def format_durations(durations: pd.Series) -> pd.Series:
+    """Format timedeltas as H:MM:SS without fractional seconds (like str(timedelta)), missing ones as None"""
+    seconds = durations.dt.total_seconds()
+    whole = seconds.fillna(0).astype("int64")
+    text = (whole // 3600).astype(str) + ":" + (whole // 60 % 60).astype(str).str.zfill(2) + ":" + (whole % 60).astype(str).str.zfill(2)
+    return text.where(seconds.notna(), None)
+
+def text_stats_columns(column: str, alias: str) -> str:
+    """SQL select list entries for the length and line count of a text column, so listings don't have to read the text itself"""
+    return (
+        f"length({column}) AS {alias}_size, "
+        f"length({column}) - length(replace({column}, char(10), '')) + ({column} != '' AND substr({column}, -1) != char(10)) AS {alias}_lines"
+    )
+
+def duration_column(start: str, end: str, alias: str) -> str:
+    """SQL select list entry formatting end - start as H:MM:SS without fractional seconds, NULL if either is missing"""
+    seconds = f"CAST((julianday({end}) - julianday({start})) * 86400 AS INTEGER)"
+    return f"(({seconds}) / 3600) || ':' || printf('%02d:%02d', ({seconds}) / 60 % 60, ({seconds}) % 60) AS {alias}"
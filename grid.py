@@ -0,0 +1,224 @@
+from datetime import timedelta
+from typing import Dict, List, Optional, Sequence, Tuple
+import pandas as pd
+import streamlit as st
+from db import cache_until_changed, get_read_only_pool, parse_timestamps, show_db_error
+
+# Rows shown per grid page
+GRID_PAGE_SIZE = 100
+
+# Counting stops here, so a count costs the same on a table of any size
+COUNT_LIMIT = 100000
+
+def _to_python(value):
+    """Turn numpy scalars read by pandas back into values sqlite3 can bind"""
+    return value.item() if hasattr(value, "item") else value
+
+@cache_until_changed
+def count_grid_rows(source: str, where: str, params: tuple, db_path: str) -> int:
+    """Return how many rows match the filter, up to COUNT_LIMIT + 1"""
+    try:
+        return get_read_only_pool(db_path).query_one(
+            f"SELECT count(*) FROM (SELECT 1 FROM {source} WHERE {where} LIMIT ?)", params + (COUNT_LIMIT + 1,)
+        )[0]
+    except Exception as e:
+        show_db_error(e, db_path)
+
+@cache_until_changed
+def get_distinct_values(source: str, column: str, db_path: str) -> List:
+    """Return the distinct non-null values of a column, for filters on low cardinality columns like a status"""
+    try:
+        return [row[0] for row in get_read_only_pool(db_path).query(f"SELECT DISTINCT {column} FROM {source} WHERE {column} IS NOT NULL ORDER BY 1")]
+    except Exception as e:
+        show_db_error(e, db_path)
+
+@cache_until_changed
+def fetch_grid_page(
+    select: str,
+    source: str,
+    where: str,
+    params: tuple,
+    sort_expression: str,
+    primary_key: str,
+    descending: bool,
+    cursor: Optional[tuple],
+    limit: int,
+    timestamp_columns: tuple,
+    boolean_columns: tuple,
+    db_path: str
+) -> pd.DataFrame:
+    """
+    Return up to limit rows in (sort_expression, primary_key) order that come after the cursor.
+
+    The cursor is the (sort key, primary key) of the last row of the previous page, so every page
+    is a seek on an index over the sort expression rather than an OFFSET that reads all earlier rows.
+    """
+    comparison = "<" if descending else ">"
+    direction = "DESC" if descending else "ASC"
+    if cursor is not None:
+        where = f"({where}) AND ({sort_expression}, {primary_key}) {comparison} (?, ?)"
+        params = params + cursor
+    try:
+        page = get_read_only_pool(db_path).query_frame(f"""
+            SELECT {select}, {sort_expression} AS _sort_key, {primary_key} AS _row_key
+            FROM {source}
+            WHERE {where}
+            ORDER BY {sort_expression} {direction}, {primary_key} {direction}
+            LIMIT ?
+        """, params + (limit,))
+    except Exception as e:
+        show_db_error(e, db_path)
+    for column in boolean_columns:
+        page[column] = page[column].astype("boolean")
+    return parse_timestamps(page, list(timestamp_columns))
+
+@cache_until_changed
+def table_has_rows(source: str, where: str, db_path: str) -> bool:
+    """Return whether a table (or join) has any rows at all"""
+    try:
+        return get_read_only_pool(db_path).query_one(f"SELECT 1 FROM {source} WHERE {where} LIMIT 1") is not None
+    except Exception as e:
+        show_db_error(e, db_path)
+
+class GridFilter:
+    """
+    A sidebar filter on one column of a grid.
+
+    kind is "integer" or "text" (exact match typed in), "choice" (one of options), "boolean"
+    or "date_range" (on an ISO 8601 timestamp column).
+    """
+
+    def __init__(self, label: str, column: str, kind: str, options: Sequence = ()):
+        if kind not in ("integer", "text", "choice", "boolean", "date_range"):
+            raise ValueError(f"Unknown filter kind {kind}")
+        self.label = label
+        self.column = column
+        self.kind = kind
+        self.options = list(options)
+
+    def render(self, key: str) -> Optional[Tuple[str, list]]:
+        """Draw the filter's widget and return its SQL condition and parameters, or None if it is not set"""
+        widget_key = f"{key}_filter_{self.column}"
+        if self.kind in ("integer", "text"):
+            value = st.text_input(self.label, key=widget_key).strip()
+            if not value:
+                return None
+            if self.kind == "integer":
+                try:
+                    value = int(value)
+                except ValueError:
+                    st.warning(f"{self.label} must be a whole number")
+                    return None
+            return f"{self.column} = ?", [value]
+        if self.kind == "choice":
+            value = st.selectbox(self.label, ["All"] + self.options, key=widget_key)
+            return None if value == "All" else (f"{self.column} = ?", [value])
+        if self.kind == "boolean":
+            value = st.selectbox(self.label, ["All", "Yes", "No"], key=widget_key)
+            return None if value == "All" else (f"{self.column} = ?", [1 if value == "Yes" else 0])
+        dates = st.date_input(self.label, value=(), key=widget_key)
+        if len(dates) != 2:
+            return None
+        # ISO 8601 timestamps sort as text, so a date range is a range of strings
+        start, end = dates
+        return f"{self.column} >= ? AND {self.column} < ?", [start.isoformat(), (end + timedelta(days=1)).isoformat()]
+
+class PaginatedGrid:
+    """
+    A table over a validator.db query that is filtered, sorted and paged in SQL.
+
+    source is a table or join and where a condition every row has to match, e.g. on the challenge type.
+    Only one page of rows is read per rerun, pages are addressed with keyset cursors and the
+    total is counted up to COUNT_LIMIT, so opening a grid costs about the same on any table
+    size as long as the sort expression is indexed, so the first sort option should be the
+    primary key. Sort expressions must not be NULL, wrap nullable columns in coalesce().
+    """
+
+    def __init__(
+        self,
+        key: str,
+        db_path: str,
+        select: str,
+        source: str,
+        primary_key: str,
+        sort_options: Dict[str, str],
+        where: str = "1",
+        filters: Sequence[GridFilter] = (),
+        timestamp_columns: Sequence[str] = (),
+        boolean_columns: Sequence[str] = (),
+        page_size: int = GRID_PAGE_SIZE
+    ):
+        self.key = key
+        self.db_path = db_path
+        self.select = select
+        self.source = source
+        self.primary_key = primary_key
+        self.sort_options = sort_options
+        self.where = where
+        self.filters = filters
+        self.timestamp_columns = tuple(timestamp_columns)
+        self.boolean_columns = tuple(boolean_columns)
+        self.page_size = page_size
+
+    def has_rows(self) -> bool:
+        return table_has_rows(self.source, self.where, db_path=self.db_path)
+
+    def render(self, column_order: Optional[List[str]] = None) -> Optional[pd.Series]:
+        """Draw the filters (in the sidebar), sort controls, current page and pager, and return the selected row if any"""
+        clauses = [f"({self.where})"]
+        params = []
+        with st.sidebar:
+            st.subheader("Filters")
+            for grid_filter in self.filters:
+                condition = grid_filter.render(self.key)
+                if condition is not None:
+                    clauses.append(f"({condition[0]})")
+                    params.extend(condition[1])
+        where = " AND ".join(clauses)
+        params = tuple(params)
+
+        sort_col, order_col = st.columns(2)
+        sort_label = sort_col.selectbox("Sort by", list(self.sort_options), key=f"{self.key}_sort")
+        descending = order_col.selectbox("Order", ["Descending", "Ascending"], key=f"{self.key}_order") == "Descending"
+
+        # Go back to the first page whenever the filters or sort order change
+        view = (where, params, sort_label, descending)
+        if st.session_state.get(f"{self.key}_view") != view:
+            st.session_state[f"{self.key}_view"] = view
+            st.session_state[f"{self.key}_cursors"] = []
+        cursors = st.session_state[f"{self.key}_cursors"]
+
+        page = fetch_grid_page(
+            self.select, self.source, where, params, self.sort_options[sort_label], self.primary_key, descending,
+            cursors[-1] if cursors else None, self.page_size + 1, self.timestamp_columns, self.boolean_columns, db_path=self.db_path
+        )
+        has_next_page = len(page) > self.page_size
+        page = page.iloc[:self.page_size]
+
+        # The page number is part of the key so a selection doesn't carry over to another page
+        selection = st.dataframe(
+            page,
+            column_order=column_order or [column for column in page.columns if column not in ("_sort_key", "_row_key")],
+            on_select="rerun",
+            selection_mode="single-row",
+            hide_index=True,
+            key=f"{self.key}_table_{len(cursors)}_{hash(view)}"
+        )
+
+        total = count_grid_rows(self.source, where, params, db_path=self.db_path)
+        total_text = f"{COUNT_LIMIT:,}+" if total > COUNT_LIMIT else f"{total:,}"
+        first_row = len(cursors) * self.page_size + 1
+        st.text(f"Showing rows {first_row:,}–{first_row + len(page) - 1:,} of {total_text}" if len(page) else f"No rows match the selected filters ({total_text})")
+        previous_col, next_col = st.columns(2)
+        with previous_col:
+            if st.button("Previous page", disabled=not cursors, use_container_width=True, key=f"{self.key}_previous"):
+                cursors.pop()
+                st.rerun()
+        with next_col:
+            if st.button("Next page", disabled=not has_next_page, use_container_width=True, key=f"{self.key}_next"):
+                last_row = page.iloc[-1]
+                cursors.append((_to_python(last_row['_sort_key']), _to_python(last_row['_row_key'])))
+                st.rerun()
+
+        selected_rows = selection['selection']['rows']
+        return page.iloc[selected_rows[0]] if selected_rows else None
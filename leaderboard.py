@@ -0,0 +1,207 @@
+import math
+import sqlite3
+from contextlib import closing
+from datetime import timedelta
+from typing import Dict, Optional, Sequence, Tuple
+import numpy as np
+import pandas as pd
+from db import connect_read_only
+from response_queue import PENDING_LOOKUP_SIZE
+from rollups import QuantileSketch
+from sidecar import SIDECAR_DB_PATH, chunks, connect_sidecar, get_watermark, set_watermark
+
+# Responses read from validator.db per batch while folding new ones
+LEADERBOARD_BATCH_SIZE = 20000
+
+# Half-life of a score's weight in a miner's recent score, by when its response was received
+SCORE_HALF_LIFE = timedelta(days=1)
+DECAY_RATE = math.log(2) / SCORE_HALF_LIFE.total_seconds()
+
+# Columns read per response, NULL keys are folded under placeholders because they are part of the primary key
+RESPONSE_COLUMNS = """
+    r.response_id, coalesce(r.miner_hotkey, '') AS miner_hotkey, coalesce(r.node_id, -1) AS node_id, coalesce(c.type, 'unknown') AS type,
+    r.processing_time, r.received_at, r.completed_at, r.evaluated, r.score
+"""
+
+KEY_COLUMNS = ['miner_hotkey', 'node_id', 'type']
+
+def ensure_leaderboard(conn: sqlite3.Connection) -> None:
+    """Create the per miner, node and challenge type totals of the leaderboard and the responses still waiting for a score"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS miner_leaderboard (
+            miner_hotkey TEXT NOT NULL,
+            node_id INTEGER NOT NULL,
+            type TEXT NOT NULL,
+            responses INTEGER NOT NULL,
+            timeouts INTEGER NOT NULL,
+            scored INTEGER NOT NULL,
+            score_sum REAL NOT NULL,
+            decayed_sum REAL NOT NULL,
+            decayed_weight REAL NOT NULL,
+            decayed_at REAL,
+            processing_sketch TEXT NOT NULL,
+            last_received_at TEXT,
+            PRIMARY KEY (miner_hotkey, node_id, type)
+        )
+    """)
+    conn.execute("CREATE TABLE IF NOT EXISTS leaderboard_pending (response_id INTEGER PRIMARY KEY)")
+
+def _epoch_seconds(timestamps: pd.Series) -> pd.Series:
+    return (pd.to_datetime(timestamps, format="ISO8601", errors="coerce") - pd.Timestamp(0)).dt.total_seconds()
+
+def _fold(conn: sqlite3.Connection, arrived: pd.DataFrame, scored: pd.DataFrame) -> None:
+    """
+    Fold newly received responses (counts, timeouts, processing times) and newly scored ones into the leaderboard.
+
+    The recent score is an exponentially decayed mean: every score is weighted by
+    exp(-DECAY_RATE * age), where the age is measured from decayed_at, the newest response a
+    score was folded from. Moving decayed_at forward rescales the stored sums, and both sums
+    scale alike, so scores arriving out of order are folded in with their proper weight.
+    The leaderboard has a row per miner and challenge type, so it is read and written whole.
+    """
+    state: Dict[Tuple[str, int, str], list] = {
+        tuple(row[:3]): list(row[3:])
+        for row in conn.execute(
+            "SELECT miner_hotkey, node_id, type, responses, timeouts, scored, score_sum, decayed_sum, decayed_weight, decayed_at, processing_sketch, last_received_at FROM miner_leaderboard"
+        )
+    }
+    changed = set()
+
+    def row(key):
+        changed.add(key)
+        return state.setdefault(key, [0, 0, 0, 0.0, 0.0, 0.0, None, QuantileSketch().to_json(), None])
+
+    if not arrived.empty:
+        arrived = arrived.assign(timeout=arrived['completed_at'].isna())
+        for key, group in arrived.groupby(KEY_COLUMNS, sort=False):
+            stored = row((key[0], int(key[1]), key[2]))
+            sketch = QuantileSketch.from_json(stored[7])
+            sketch.add(group['processing_time'].to_numpy(dtype=float))
+            stored[0] += len(group)
+            stored[1] += int(group['timeout'].sum())
+            stored[7] = sketch.to_json()
+            last_received_at = group['received_at'].dropna().max()
+            if not pd.isna(last_received_at) and (stored[8] is None or str(last_received_at) > stored[8]):
+                stored[8] = str(last_received_at)
+
+    scored = scored.dropna(subset=['score'])
+    if not scored.empty:
+        at = _epoch_seconds(scored['received_at'])
+        decayed = scored.assign(at=at).dropna(subset=['at'])
+        newest = decayed.groupby(KEY_COLUMNS, sort=False)['at'].transform('max')
+        weight = np.exp(-DECAY_RATE * (newest - decayed['at']))
+        decayed = decayed.assign(weight=weight, weighted=weight * decayed['score'].astype(float), newest=newest)
+        decays = decayed.groupby(KEY_COLUMNS, sort=False).agg(decayed_sum=('weighted', 'sum'), decayed_weight=('weight', 'sum'), newest=('newest', 'max'))
+        totals = scored.groupby(KEY_COLUMNS, sort=False)['score'].agg(['count', 'sum'])
+        for key, (count, total) in totals.iterrows():
+            stored = row((key[0], int(key[1]), key[2]))
+            stored[2] += int(count)
+            stored[3] += float(total)
+            if key not in decays.index:
+                continue
+            decayed_sum, decayed_weight, newest = decays.loc[key]
+            decayed_at = newest if stored[6] is None else max(stored[6], newest)
+            stored_scale = 0.0 if stored[6] is None else math.exp(-DECAY_RATE * (decayed_at - stored[6]))
+            batch_scale = math.exp(-DECAY_RATE * (decayed_at - newest))
+            stored[4] = stored[4] * stored_scale + decayed_sum * batch_scale
+            stored[5] = stored[5] * stored_scale + decayed_weight * batch_scale
+            stored[6] = float(decayed_at)
+
+    conn.executemany(
+        """
+        INSERT OR REPLACE INTO miner_leaderboard (miner_hotkey, node_id, type, responses, timeouts, scored, score_sum, decayed_sum, decayed_weight, decayed_at, processing_sketch, last_received_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        [key + tuple(state[key]) for key in changed]
+    )
+
+def sync_leaderboard(validator_db_path: str, sidecar_path: str = SIDECAR_DB_PATH) -> int:
+    """
+    Bring the leaderboard up to date and return how many responses were folded in.
+
+    New responses are read by id above the watermark. Scores are written when a response is
+    evaluated, which can be long after it arrived, so unevaluated responses are remembered and
+    looked up by primary key on later syncs, the same way the evaluation queue is tracked.
+    """
+    with closing(connect_sidecar(sidecar_path)) as conn, closing(connect_read_only(validator_db_path)) as source:
+        ensure_leaderboard(conn)
+        max_id = source.execute("SELECT max(response_id) FROM responses").fetchone()[0] or 0
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            watermark = get_watermark(conn, "leaderboard")
+            if max_id < watermark:
+                conn.execute("DELETE FROM miner_leaderboard")
+                conn.execute("DELETE FROM leaderboard_pending")
+                watermark = 0
+
+            # Fold in the scores of responses evaluated since an earlier sync
+            pending_ids = [row[0] for row in conn.execute("SELECT response_id FROM leaderboard_pending")]
+            for chunk in chunks(pending_ids, PENDING_LOOKUP_SIZE):
+                responses = pd.read_sql_query(
+                    f"SELECT {RESPONSE_COLUMNS} FROM responses r LEFT JOIN challenges c ON c.challenge_id = r.challenge_id WHERE r.response_id IN ({', '.join('?' for _ in chunk)})",
+                    source, params=chunk
+                )
+                done = responses[responses['evaluated'].fillna(0).astype(bool)]
+                _fold(conn, done.iloc[0:0], done)
+                # Responses that no longer exist are dropped as well
+                still_pending = set(responses.loc[~responses['evaluated'].fillna(0).astype(bool), 'response_id'])
+                conn.executemany("DELETE FROM leaderboard_pending WHERE response_id = ?", [(response_id,) for response_id in chunk if response_id not in still_pending])
+
+            folded = 0
+            last_id = watermark
+            while True:
+                responses = pd.read_sql_query(
+                    f"""
+                    SELECT {RESPONSE_COLUMNS}
+                    FROM responses r LEFT JOIN challenges c ON c.challenge_id = r.challenge_id
+                    WHERE r.response_id > ? AND r.response_id <= ?
+                    ORDER BY r.response_id LIMIT ?
+                    """,
+                    source, params=(last_id, max_id, LEADERBOARD_BATCH_SIZE)
+                )
+                if responses.empty:
+                    break
+                is_evaluated = responses['evaluated'].fillna(0).astype(bool)
+                _fold(conn, responses, responses[is_evaluated])
+                conn.executemany(
+                    "INSERT OR IGNORE INTO leaderboard_pending (response_id) VALUES (?)",
+                    [(int(response_id),) for response_id in responses.loc[~is_evaluated, 'response_id']]
+                )
+                folded += len(responses)
+                last_id = int(responses['response_id'].iloc[-1])
+
+            set_watermark(conn, "leaderboard", max(watermark, max_id))
+            conn.execute("COMMIT")
+            return folded
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+def get_leaderboard(conn: sqlite3.Connection, types: Optional[Sequence[str]] = None) -> pd.DataFrame:
+    """
+    Return one row per miner and node with its response count, timeout rate, mean and recent score and
+    median processing time over the given challenge types (all of them if None).
+
+    Rows of several types are combined by adding their totals, merging their processing time
+    sketches and rescaling their decayed sums to the newest decayed_at before adding them.
+    """
+    where = "1" if types is None else f"type IN ({', '.join('?' for _ in types)})"
+    rows = pd.read_sql_query(f"SELECT * FROM miner_leaderboard WHERE {where}", conn, params=tuple(types or ()))
+    columns = ['miner_hotkey', 'node_id', 'responses', 'timeout_rate', 'mean_score', 'recent_score', 'median_processing_time', 'last_received_at']
+    if rows.empty:
+        return pd.DataFrame(columns=columns)
+    newest = rows.groupby(['miner_hotkey', 'node_id'])['decayed_at'].transform('max')
+    scale = np.exp(-DECAY_RATE * (newest - rows['decayed_at'])).fillna(0.0)
+    rows = rows.assign(decayed_sum=rows['decayed_sum'] * scale, decayed_weight=rows['decayed_weight'] * scale)
+    miners = rows.groupby(['miner_hotkey', 'node_id'], as_index=False).agg(
+        responses=('responses', 'sum'), timeouts=('timeouts', 'sum'), scored=('scored', 'sum'), score_sum=('score_sum', 'sum'),
+        decayed_sum=('decayed_sum', 'sum'), decayed_weight=('decayed_weight', 'sum'), last_received_at=('last_received_at', 'max')
+    )
+    sketches = {}
+    for miner_hotkey, node_id, sketch in zip(rows['miner_hotkey'], rows['node_id'], rows['processing_sketch']):
+        sketches.setdefault((miner_hotkey, node_id), QuantileSketch()).merge(QuantileSketch.from_json(sketch))
+    miners['median_processing_time'] = [sketches[key].quantile(0.5) for key in zip(miners['miner_hotkey'], miners['node_id'])]
+    miners['timeout_rate'] = miners['timeouts'] / miners['responses'].where(miners['responses'] > 0)
+    miners['mean_score'] = miners['score_sum'] / miners['scored'].where(miners['scored'] > 0)
+    miners['recent_score'] = miners['decayed_sum'] / miners['decayed_weight'].where(miners['decayed_weight'] > 0)
+    return miners[columns]
@@ -0,0 +1,326 @@
+import json
+import re
+import sqlite3
+from contextlib import closing
+from typing import Iterator, List, Tuple
+from db import connect_read_only
+from sidecar import SIDECAR_DB_PATH, connect_sidecar, get_watermark, set_watermark
+
+# Number of log rows copied from logging.db per batch while indexing
+SYNC_BATCH_SIZE = 5000
+
+# Markers wrapped around matched terms in search snippets, replaced with HTML when rendering
+SNIPPET_START = "\x02"
+SNIPPET_END = "\x03"
+
+# Unique key of the facet rollup
+LOG_FACETS_KEY = "ifnull(pathname, ''), ifnull(levelname, ''), ifnull(active_coroutines, ''), ifnull(eval_loop_num, -1)"
+
+def ensure_log_fts(conn: sqlite3.Connection) -> None:
+    """Create the full-text index over log messages, keyed by the rowid of the log in logging.db"""
+    conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS log_fts USING fts5(message)")
+
+def reset_log_fts(sidecar_path: str = SIDECAR_DB_PATH) -> None:
+    """Drop everything in the full-text index, e.g. after the logs table was cleared"""
+    with closing(connect_sidecar(sidecar_path)) as conn:
+        ensure_log_fts(conn)
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute("DELETE FROM log_fts")
+        set_watermark(conn, "log_fts", 0)
+        conn.execute("COMMIT")
+
+def sync_log_fts(logs_db_path: str, sidecar_path: str = SIDECAR_DB_PATH) -> int:
+    """
+    Index the logs that were written since the last sync and return how many were added.
+
+    Rows are read from logging.db by rowid above the sidecar's watermark, so the cost of a
+    sync is proportional to the number of new logs. If logging.db was cleared or its oldest
+    rows were deleted, the matching index entries are dropped too.
+    """
+    with closing(connect_sidecar(sidecar_path)) as conn, closing(connect_read_only(logs_db_path)) as logs_conn:
+        ensure_log_fts(conn)
+        min_rowid, max_rowid = logs_conn.execute("SELECT min(rowid), max(rowid) FROM logs").fetchone()
+        min_rowid, max_rowid = min_rowid or 0, max_rowid or 0
+
+        # BEGIN IMMEDIATE so concurrent sessions syncing at the same time take turns instead of double indexing
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            watermark = get_watermark(conn, "log_fts")
+            if max_rowid < watermark:
+                conn.execute("DELETE FROM log_fts")
+                watermark = 0
+            else:
+                conn.execute("DELETE FROM log_fts WHERE rowid < ?", (min_rowid,))
+
+            indexed = 0
+            cursor = logs_conn.execute("SELECT rowid, message FROM logs WHERE rowid > ? AND rowid <= ? ORDER BY rowid", (watermark, max_rowid))
+            while batch := cursor.fetchmany(SYNC_BATCH_SIZE):
+                conn.executemany("INSERT INTO log_fts (rowid, message) VALUES (?, ?)", batch)
+                indexed += len(batch)
+
+            set_watermark(conn, "log_fts", max(watermark, max_rowid))
+            conn.execute("COMMIT")
+            return indexed
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+def search_logs(conn: sqlite3.Connection, query: str, where: str, params: List, limit: int, offset: int = 0) -> List[dict]:
+    """
+    Return logs whose message matches an FTS5 query, best match first.
+
+    conn must be a connection to logging.db with the sidecar attached as "cave". The query
+    supports FTS5 syntax such as "exact phrases", prefix* and AND/OR/NOT; input that is not
+    valid FTS5 syntax is searched for as a single phrase instead. where/params are an extra
+    filter over the logs table. Each result has a "snippet" with matches wrapped in
+    SNIPPET_START/SNIPPET_END.
+    """
+    sql = f"""
+        SELECT logs.rowid AS rowid, logs.*, snippet(log_fts, 0, '{SNIPPET_START}', '{SNIPPET_END}', '…', 24) AS snippet
+        FROM cave.log_fts
+        JOIN logs ON logs.rowid = log_fts.rowid
+        WHERE log_fts MATCH ? AND ({where})
+        ORDER BY log_fts.rank
+        LIMIT ? OFFSET ?
+    """
+    try:
+        cursor = conn.execute(sql, [query] + list(params) + [limit, offset])
+    except sqlite3.OperationalError as e:
+        if "fts5" not in str(e) and "no such column" not in str(e):
+            raise
+        phrase = '"' + query.replace('"', '""') + '"'
+        cursor = conn.execute(sql, [phrase] + list(params) + [limit, offset])
+    columns = [description[0] for description in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+def ensure_log_facets(conn: sqlite3.Connection) -> None:
+    """Create the facet rollup, one row per distinct (file, level, coroutines, loop number) with its log count"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS log_facets (
+            pathname TEXT,
+            levelname TEXT,
+            active_coroutines TEXT,
+            eval_loop_num INTEGER,
+            log_count INTEGER NOT NULL
+        )
+    """)
+    # SQLite treats NULLs in a unique index as distinct, so the key is indexed with NULLs mapped to sentinels
+    # and upserted against the same expressions, otherwise logs without coroutines or a loop number never conflict
+    conn.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS log_facets_key ON log_facets ({LOG_FACETS_KEY})")
+
+def reset_log_facets(sidecar_path: str = SIDECAR_DB_PATH) -> None:
+    """Drop the facet rollup, e.g. after the logs table was cleared"""
+    with closing(connect_sidecar(sidecar_path)) as conn:
+        ensure_log_facets(conn)
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute("DELETE FROM log_facets")
+        set_watermark(conn, "log_facets", 0)
+        conn.execute("COMMIT")
+
+def sync_log_facets(logs_db_path: str, sidecar_path: str = SIDECAR_DB_PATH) -> int:
+    """
+    Fold the logs written since the last sync into the facet rollup and return how many were added.
+
+    New rows are grouped in logging.db and upserted as counts, so the cost is proportional to
+    the number of new logs. Counts cannot be subtracted, so the rollup is rebuilt from scratch
+    if logging.db was cleared or its oldest rows were deleted.
+    """
+    with closing(connect_sidecar(sidecar_path)) as conn, closing(connect_read_only(logs_db_path)) as logs_conn:
+        ensure_log_facets(conn)
+        min_rowid, max_rowid = logs_conn.execute("SELECT min(rowid), max(rowid) FROM logs").fetchone()
+        min_rowid, max_rowid = min_rowid or 0, max_rowid or 0
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            watermark = get_watermark(conn, "log_facets")
+            first_rowid = get_watermark(conn, "log_facets_first")
+            if watermark and (max_rowid < watermark or min_rowid > first_rowid):
+                conn.execute("DELETE FROM log_facets")
+                watermark = 0
+
+            cursor = logs_conn.execute("""
+                SELECT pathname, levelname, active_coroutines, eval_loop_num, count(*)
+                FROM logs
+                WHERE rowid > ? AND rowid <= ?
+                GROUP BY pathname, levelname, active_coroutines, eval_loop_num
+            """, (watermark, max_rowid))
+            conn.executemany(f"""
+                INSERT INTO log_facets (pathname, levelname, active_coroutines, eval_loop_num, log_count)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT ({LOG_FACETS_KEY})
+                DO UPDATE SET log_count = log_count + excluded.log_count
+            """, cursor)
+
+            set_watermark(conn, "log_facets", max(watermark, max_rowid))
+            set_watermark(conn, "log_facets_first", min_rowid)
+            conn.execute("COMMIT")
+            return max(max_rowid - watermark, 0)
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+def count_log_facet(conn: sqlite3.Connection, facet: str, where: str, params: List) -> dict:
+    """
+    Return {value: log count} for one facet of the rollup, restricted by a filter over the logs table.
+
+    facet is "pathname", "levelname", "eval_loop_num" or "active_coroutines" (counted per
+    coroutine). The rollup is aliased as logs so the same WHERE clause used to query
+    logging.db applies to it unchanged.
+    """
+    if facet == "active_coroutines":
+        sql = f"""
+            SELECT coroutine.value, sum(logs.log_count)
+            FROM log_facets AS logs, json_each(logs.active_coroutines) AS coroutine
+            WHERE {where}
+            GROUP BY coroutine.value
+        """
+    else:
+        sql = f"SELECT logs.{facet}, sum(logs.log_count) FROM log_facets AS logs WHERE {where} GROUP BY logs.{facet}"
+    return dict(conn.execute(sql, list(params)).fetchall())
+
+def count_logs(conn: sqlite3.Connection, where: str, params: List) -> int:
+    """Return the number of logs matching a filter over the logs table, read from the facet rollup"""
+    return conn.execute(f"SELECT coalesce(sum(logs.log_count), 0) FROM log_facets AS logs WHERE {where}", list(params)).fetchone()[0]
+
+def ensure_log_fields(conn: sqlite3.Connection) -> None:
+    """Create the key/value index over JSON log messages and the per-key log counts"""
+    conn.execute("CREATE TABLE IF NOT EXISTS log_fields (log_rowid INTEGER NOT NULL, key TEXT NOT NULL, value TEXT)")
+    conn.execute("CREATE INDEX IF NOT EXISTS log_fields_key_value ON log_fields (key, value, log_rowid)")
+    conn.execute("CREATE INDEX IF NOT EXISTS log_fields_rowid ON log_fields (log_rowid)")
+    conn.execute("CREATE TABLE IF NOT EXISTS log_field_keys (key TEXT PRIMARY KEY, log_count INTEGER NOT NULL)")
+
+def reset_log_fields(sidecar_path: str = SIDECAR_DB_PATH) -> None:
+    """Drop the JSON field index, e.g. after the logs table was cleared"""
+    with closing(connect_sidecar(sidecar_path)) as conn:
+        ensure_log_fields(conn)
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute("DELETE FROM log_fields")
+        conn.execute("DELETE FROM log_field_keys")
+        set_watermark(conn, "log_fields", 0)
+        conn.execute("COMMIT")
+
+def flatten_json(obj, prefix: str = "") -> Iterator[Tuple[str, str]]:
+    """
+    Yield (key, value) pairs for every scalar in a parsed JSON message.
+
+    Nested keys are joined with dots (data.miner_hotkey) and list elements are indexed under
+    the key of the list. Strings are kept as is, other scalars are stored as their JSON text
+    (3, 1.5, true, null).
+    """
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            yield from flatten_json(value, f"{prefix}.{key}" if prefix else str(key))
+    elif isinstance(obj, list):
+        for value in obj:
+            yield from flatten_json(value, prefix)
+    elif prefix:
+        yield prefix, obj if isinstance(obj, str) else json.dumps(obj)
+
+def sync_log_fields(logs_db_path: str, sidecar_path: str = SIDECAR_DB_PATH) -> int:
+    """
+    Parse and index the JSON messages written since the last sync and return how many logs were read.
+
+    Each message is parsed exactly once, here, and flattened into log_fields. json_valid() lets
+    SQLite skip plain text messages without handing them to Python.
+    """
+    with closing(connect_sidecar(sidecar_path)) as conn, closing(connect_read_only(logs_db_path)) as logs_conn:
+        ensure_log_fields(conn)
+        min_rowid, max_rowid = logs_conn.execute("SELECT min(rowid), max(rowid) FROM logs").fetchone()
+        min_rowid, max_rowid = min_rowid or 0, max_rowid or 0
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            watermark = get_watermark(conn, "log_fields")
+            if max_rowid < watermark:
+                conn.execute("DELETE FROM log_fields")
+                conn.execute("DELETE FROM log_field_keys")
+                watermark = 0
+            else:
+                # Take logs deleted from the head of the table back out of the per-key counts
+                trimmed = conn.execute("""
+                    SELECT key, count(DISTINCT log_rowid) FROM log_fields WHERE log_rowid < ? GROUP BY key
+                """, (min_rowid,)).fetchall()
+                conn.executemany("UPDATE log_field_keys SET log_count = log_count - ? WHERE key = ?", [(count, key) for key, count in trimmed])
+                conn.execute("DELETE FROM log_fields WHERE log_rowid < ?", (min_rowid,))
+
+            key_counts = {}
+            cursor = logs_conn.execute("""
+                SELECT rowid, message FROM logs
+                WHERE rowid > ? AND rowid <= ? AND substr(ltrim(message), 1, 1) IN ('{', '[') AND json_valid(message)
+                ORDER BY rowid
+            """, (watermark, max_rowid))
+            while batch := cursor.fetchmany(SYNC_BATCH_SIZE):
+                fields = []
+                for rowid, message in batch:
+                    pairs = set(flatten_json(json.loads(message)))
+                    fields.extend((rowid, key, value) for key, value in pairs)
+                    for key in {key for key, _ in pairs}:
+                        key_counts[key] = key_counts.get(key, 0) + 1
+                conn.executemany("INSERT INTO log_fields (log_rowid, key, value) VALUES (?, ?, ?)", fields)
+            conn.executemany("""
+                INSERT INTO log_field_keys (key, log_count) VALUES (?, ?)
+                ON CONFLICT (key) DO UPDATE SET log_count = log_count + excluded.log_count
+            """, key_counts.items())
+            conn.execute("DELETE FROM log_field_keys WHERE log_count <= 0")
+
+            set_watermark(conn, "log_fields", max(watermark, max_rowid))
+            conn.execute("COMMIT")
+            return max(max_rowid - watermark, 0)
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+# A single condition of a JSON field query, e.g. data.miner_hotkey = "5F..." or status != error
+FIELD_CONDITION = re.compile(r'\s*([^\s=!]+)\s*(!=|=)\s*(?:"((?:[^"\\]|\\.)*)"|(\S+))')
+
+# What separates two conditions
+FIELD_CONDITION_SEPARATOR = re.compile(r"\s+AND(?:\s+|$)", re.IGNORECASE)
+
+def parse_field_query(query: str) -> List[Tuple[str, str, str]]:
+    """
+    Parse a JSON field query into (key, operator, value) conditions.
+
+    Conditions are joined with AND and have the form key = value or key != value. Values may
+    be "quoted" strings or bare words, numbers and booleans. Conditions are matched one after
+    another, so a quoted value may itself contain AND. Raises ValueError on bad input.
+    """
+    conditions = []
+    position = 0
+    while True:
+        match = FIELD_CONDITION.match(query, position)
+        if match is None:
+            raise ValueError(f"Could not understand '{query[position:].strip()}', expected something like status = \"error\"")
+        key, operator, quoted, bare = match.groups()
+        conditions.append((key, operator, json.loads(f'"{quoted}"') if quoted is not None else bare))
+        position = match.end()
+        if not query[position:].strip():
+            return conditions
+        separator = FIELD_CONDITION_SEPARATOR.match(query, position)
+        if separator is None:
+            raise ValueError(f"Could not understand '{query[position:].strip()}', expected AND between conditions")
+        position = separator.end()
+        if not query[position:].strip():
+            raise ValueError("Expected a condition after AND")
+
+def build_field_filter(conditions: List[Tuple[str, str, str]]) -> Tuple[str, List]:
+    """
+    Turn parsed JSON field conditions into a WHERE clause over the logs table.
+
+    The clause reads the sidecar, so it needs a logging.db connection with the sidecar attached as "cave".
+    """
+    clauses = []
+    params = []
+    for key, operator, value in conditions:
+        clauses.append(f"logs.rowid IN (SELECT log_rowid FROM cave.log_fields WHERE key = ? AND value {operator} ?)")
+        params.extend([key, value])
+    return " AND ".join(clauses) or "1", params
+
+def get_top_field_keys(conn: sqlite3.Connection, limit: int = 50) -> List[Tuple[str, int]]:
+    """Return the most common JSON keys with the number of logs containing them"""
+    return conn.execute("SELECT key, log_count FROM log_field_keys ORDER BY log_count DESC, key LIMIT ?", (limit,)).fetchall()
+
+def get_field_value_counts(conn: sqlite3.Connection, key: str, limit: int = 25) -> List[Tuple[str, int]]:
+    """Return the most common values of a JSON key with the number of logs having each"""
+    return conn.execute("""
+        SELECT value, count(DISTINCT log_rowid) FROM log_fields WHERE key = ? GROUP BY value ORDER BY 2 DESC, value LIMIT ?
+    """, (key, limit)).fetchall()
@@ -0,0 +1,235 @@
+import glob
+import json
+import os
+import sqlite3
+import time
+from contextlib import closing
+from datetime import datetime, timedelta
+from typing import List, Optional
+import pandas as pd
+from sidecar import SIDECAR_DB_PATH, connect_sidecar
+
+# Archived logs are written here as compressed Parquet segments of up to ARCHIVE_CHUNK_SIZE logs each,
+# named logs_<run>_<first rowid>_<last rowid>.parquet so that sorting their names sorts them oldest first
+LOG_ARCHIVE_DIR = os.getenv("CAVE_LOG_ARCHIVE_DIR") or os.path.join(os.path.dirname(SIDECAR_DB_PATH), "log_archive")
+
+# Rows deleted per transaction, small enough that the subnet's loggers only ever wait a few milliseconds for the write lock
+DELETE_BATCH_SIZE = 1000
+
+# Pause between delete batches so waiting writers get the lock
+DELETE_BATCH_PAUSE_SECONDS = 0.01
+
+# Rows read per query while archiving, each read is its own short transaction
+ARCHIVE_CHUNK_SIZE = 50000
+
+# Columns read back when searching archived logs, the ones a log is displayed with
+ARCHIVE_SEARCH_COLUMNS = ['timestamp', 'levelname', 'pathname', 'lineno', 'message', 'active_coroutines', 'eval_loop_num']
+
+# Pages released per incremental_vacuum call
+VACUUM_STEP_PAGES = 1000
+
+def parse_log_timestamp(timestamp: str) -> Optional[datetime]:
+    """Parse a log timestamp written by the subnet's logger (ISO 8601, with a space or T and optional ,ms)"""
+    try:
+        return datetime.fromisoformat(str(timestamp).replace(",", "."))
+    except ValueError:
+        return None
+
+def find_age_cutoff_rowid(conn: sqlite3.Connection, cutoff: datetime) -> int:
+    """
+    Return the largest rowid of a log written before cutoff (0 if none).
+
+    Logs are appended in time order, so this binary searches rowids with point lookups
+    instead of scanning the timestamp column.
+    """
+    low, high = conn.execute("SELECT min(rowid), max(rowid) FROM logs").fetchone()
+    if low is None:
+        return 0
+    result = 0
+    while low <= high:
+        middle = (low + high) // 2
+        row = conn.execute("SELECT rowid, timestamp FROM logs WHERE rowid >= ? ORDER BY rowid LIMIT 1", (middle,)).fetchone()
+        if row is None or row[0] > high:
+            high = middle - 1
+            continue
+        timestamp = parse_log_timestamp(row[1])
+        if timestamp is not None and timestamp.tzinfo is not None:
+            timestamp = timestamp.replace(tzinfo=None)
+        if timestamp is not None and timestamp < cutoff:
+            result = row[0]
+            low = row[0] + 1
+        else:
+            high = middle - 1
+    return result
+
+def find_row_count_cutoff_rowid(conn: sqlite3.Connection, max_rows: int) -> int:
+    """Return the largest rowid that has to go so that at most max_rows logs are kept (0 if none)"""
+    row = conn.execute("SELECT rowid FROM logs ORDER BY rowid DESC LIMIT 1 OFFSET ?", (max_rows,)).fetchone()
+    return row[0] if row else 0
+
+def archive_logs(conn: sqlite3.Connection, cutoff_rowid: int, archive_dir: str = LOG_ARCHIVE_DIR) -> tuple:
+    """
+    Copy every log with rowid <= cutoff_rowid to zstd compressed Parquet segments, returns (rows, bytes written).
+
+    Each chunk read is written out as its own segment straight away, so only one chunk is ever held in memory.
+    Segments are named after the run and then the rowids they hold, since SQLite can hand out the rowids of
+    deleted logs again, and an existing segment is never overwritten.
+    """
+    run = datetime.now().strftime("%Y%m%dT%H%M%S%f")
+    rows = written = 0
+    last_rowid = 0
+    while True:
+        logs = pd.read_sql_query(
+            "SELECT rowid AS rowid, * FROM logs WHERE rowid > ? AND rowid <= ? ORDER BY rowid LIMIT ?",
+            conn, params=(last_rowid, cutoff_rowid, ARCHIVE_CHUNK_SIZE)
+        )
+        if logs.empty:
+            return rows, written
+        os.makedirs(archive_dir, exist_ok=True)
+        last_rowid = int(logs['rowid'].iloc[-1])
+        path = os.path.join(archive_dir, f"logs_{run}_{int(logs['rowid'].iloc[0]):012d}_{last_rowid:012d}.parquet")
+        with open(path, "xb") as segment:
+            logs.to_parquet(segment, compression="zstd", index=False)
+        rows += len(logs)
+        written += os.path.getsize(path)
+
+def delete_logs_in_batches(conn: sqlite3.Connection, cutoff_rowid: int, batch_size: int = DELETE_BATCH_SIZE) -> tuple:
+    """Delete every log with rowid <= cutoff_rowid, one short transaction per batch, returns (rows, batches, longest batch in ms)"""
+    deleted = batches = 0
+    longest_batch_ms = 0.0
+    while True:
+        started = time.perf_counter()
+        conn.execute("BEGIN IMMEDIATE")
+        cursor = conn.execute(
+            "DELETE FROM logs WHERE rowid IN (SELECT rowid FROM logs WHERE rowid <= ? ORDER BY rowid LIMIT ?)",
+            (cutoff_rowid, batch_size)
+        )
+        conn.execute("COMMIT")
+        longest_batch_ms = max(longest_batch_ms, (time.perf_counter() - started) * 1000)
+        if cursor.rowcount <= 0:
+            break
+        deleted += cursor.rowcount
+        batches += 1
+        time.sleep(DELETE_BATCH_PAUSE_SECONDS)
+    return deleted, batches, longest_batch_ms
+
+def incremental_vacuum_enabled(conn: sqlite3.Connection) -> bool:
+    """Whether the database can hand free pages back to the file system a few at a time (auto_vacuum = INCREMENTAL)"""
+    return conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+
+def reclaim_free_pages(conn: sqlite3.Connection) -> int:
+    """Release free pages in small steps if incremental vacuum is enabled, returns how many were released"""
+    if not incremental_vacuum_enabled(conn):
+        return 0
+    reclaimed = 0
+    while True:
+        free_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if free_pages == 0:
+            return reclaimed
+        conn.execute(f"PRAGMA incremental_vacuum({VACUUM_STEP_PAGES})").fetchall()
+        released = free_pages - conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if released <= 0:
+            return reclaimed
+        reclaimed += released
+        time.sleep(DELETE_BATCH_PAUSE_SECONDS)
+
+def enable_incremental_vacuum(logs_db_path: str) -> None:
+    """
+    Switch logging.db to auto_vacuum = INCREMENTAL.
+
+    This needs a one-time full VACUUM, which rewrites the file and holds the write lock while
+    it runs, so it is only done when explicitly asked for.
+    """
+    with closing(sqlite3.connect(logs_db_path, timeout=30, isolation_level=None)) as conn:
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
+
+def ensure_retention_runs(conn: sqlite3.Connection) -> None:
+    """Create the table recording what each retention run did and cost"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS log_retention_runs (
+            run_id INTEGER PRIMARY KEY,
+            ran_at TEXT NOT NULL,
+            policy TEXT NOT NULL,
+            rows_archived INTEGER NOT NULL,
+            archive_bytes INTEGER NOT NULL,
+            rows_deleted INTEGER NOT NULL,
+            batches INTEGER NOT NULL,
+            longest_batch_ms REAL NOT NULL,
+            pages_reclaimed INTEGER NOT NULL,
+            free_pages INTEGER NOT NULL,
+            seconds REAL NOT NULL
+        )
+    """)
+
+def apply_log_retention(
+    logs_db_path: str,
+    max_age_days: Optional[float] = None,
+    max_rows: Optional[int] = None,
+    archive: bool = False,
+    archive_dir: str = LOG_ARCHIVE_DIR,
+    sidecar_path: str = SIDECAR_DB_PATH
+) -> dict:
+    """
+    Delete logs older than max_age_days and/or beyond the newest max_rows, and return what it cost.
+
+    Logs are optionally archived first, then deleted in small batches so the subnet's
+    processes are never blocked on the write lock for long, then free pages are released
+    if incremental vacuum is enabled. Every run is recorded in the sidecar.
+    """
+    started = time.perf_counter()
+    with closing(sqlite3.connect(logs_db_path, timeout=30, isolation_level=None)) as conn:
+        cutoff_rowid = 0
+        if max_age_days is not None:
+            cutoff_rowid = max(cutoff_rowid, find_age_cutoff_rowid(conn, datetime.now() - timedelta(days=max_age_days)))
+        if max_rows is not None:
+            cutoff_rowid = max(cutoff_rowid, find_row_count_cutoff_rowid(conn, max_rows))
+
+        rows_archived = archive_bytes = 0
+        if archive and cutoff_rowid:
+            rows_archived, archive_bytes = archive_logs(conn, cutoff_rowid, archive_dir)
+        rows_deleted, batches, longest_batch_ms = delete_logs_in_batches(conn, cutoff_rowid) if cutoff_rowid else (0, 0, 0.0)
+        pages_reclaimed = reclaim_free_pages(conn)
+        free_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+    run = {
+        'ran_at': datetime.now().isoformat(timespec="seconds"),
+        'policy': json.dumps({'max_age_days': max_age_days, 'max_rows': max_rows, 'archive': archive}),
+        'rows_archived': rows_archived,
+        'archive_bytes': archive_bytes,
+        'rows_deleted': rows_deleted,
+        'batches': batches,
+        'longest_batch_ms': round(longest_batch_ms, 2),
+        'pages_reclaimed': pages_reclaimed,
+        'free_pages': free_pages,
+        'seconds': round(time.perf_counter() - started, 3)
+    }
+    with closing(connect_sidecar(sidecar_path)) as conn:
+        ensure_retention_runs(conn)
+        conn.execute(f"INSERT INTO log_retention_runs ({', '.join(run)}) VALUES ({', '.join('?' for _ in run)})", list(run.values()))
+    return run
+
+def get_retention_runs(limit: int = 20, sidecar_path: str = SIDECAR_DB_PATH) -> List[dict]:
+    """Return the most recent retention runs, newest first"""
+    with closing(connect_sidecar(sidecar_path)) as conn:
+        ensure_retention_runs(conn)
+        cursor = conn.execute("SELECT * FROM log_retention_runs ORDER BY run_id DESC LIMIT ?", (limit,))
+        columns = [description[0] for description in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+def search_archived_logs(query: str, levelname: Optional[str] = None, limit: int = 100, archive_dir: str = LOG_ARCHIVE_DIR) -> List[dict]:
+    """
+    Return up to limit archived logs whose message contains query (case insensitive), newest first.
+
+    Segments are scanned newest first and scanning stops as soon as enough matches were found.
+    Only the displayed columns are read, and the level filter is applied while reading.
+    """
+    matches = []
+    filters = None if levelname is None else [('levelname', '==', levelname)]
+    for path in sorted(glob.glob(os.path.join(archive_dir, "logs_*.parquet")), reverse=True):
+        logs = pd.read_parquet(path, columns=ARCHIVE_SEARCH_COLUMNS, filters=filters)
+        mask = logs['message'].astype(str).str.contains(query, case=False, regex=False)
+        matches.extend(logs[mask].iloc[::-1].head(limit - len(matches)).to_dict('records'))
+        if len(matches) >= limit:
+            break
+    return matches
@@ -0,0 +1,219 @@
+import re
+import sqlite3
+from contextlib import closing
+from typing import Dict, List, Optional, Tuple
+from db import connect_read_only
+from log_index import SYNC_BATCH_SIZE
+from sidecar import SIDECAR_DB_PATH, connect_sidecar, get_watermark, set_watermark
+
+# Placeholder for the variable parts of a template
+WILDCARD = "<*>"
+
+# Tokens that are almost always variables (numbers, hex ids, uuids) are masked before clustering
+VARIABLE_TOKEN = re.compile(r"^[\W_]*(?:-?\d+(?:\.\d+)?(?:e-?\d+)?|0x[0-9a-fA-F]+|[0-9a-fA-F]{16,}|[0-9a-fA-F]{8}-[0-9a-fA-F-]{27})[\W_]*$")
+
+# Drain parameters: how many leading tokens route a message through the parse tree,
+# and the fraction of tokens a message must share with a template to join it
+PREFIX_DEPTH = 2
+SIMILARITY_THRESHOLD = 0.5
+
+# Longest message (in tokens) clustered as is, longer ones are clustered on their first tokens
+MAX_TOKENS = 64
+
+class LogTemplate:
+    def __init__(self, template_id: Optional[int], tokens: List[str]):
+        self.template_id = template_id
+        self.tokens = tokens
+
+    @property
+    def text(self) -> str:
+        return " ".join(self.tokens)
+
+    def similarity(self, tokens: List[str]) -> float:
+        """Fraction of positions where the message matches the template's constant tokens"""
+        matches = sum(1 for mine, theirs in zip(self.tokens, tokens) if mine == theirs)
+        return matches / len(tokens) if tokens else 1.0
+
+    def merge(self, tokens: List[str]) -> bool:
+        """Generalize positions that differ from the message to wildcards, returns True if the template changed"""
+        merged = [mine if mine == theirs else WILDCARD for mine, theirs in zip(self.tokens, tokens)]
+        changed = merged != self.tokens
+        self.tokens = merged
+        return changed
+
+class Drain:
+    """
+    Online log template miner based on Drain (He et al., 2017).
+
+    Messages are routed by token count and their first PREFIX_DEPTH tokens to a small group of
+    candidate templates, and join the most similar one if it is similar enough (generalizing
+    the template) or start a new one. Routing keeps each message's cost independent of the
+    number of templates.
+    """
+
+    def __init__(self, templates: List[LogTemplate] = ()):
+        self.groups: Dict[Tuple, List[LogTemplate]] = {}
+        for template in templates:
+            self.groups.setdefault(self.route(template.tokens), []).append(template)
+
+    @staticmethod
+    def tokenize(message: str) -> List[str]:
+        tokens = str(message).split()[:MAX_TOKENS]
+        return [WILDCARD if VARIABLE_TOKEN.match(token) else token for token in tokens]
+
+    @staticmethod
+    def route(tokens: List[str]) -> Tuple:
+        prefix = tuple(WILDCARD if any(c.isdigit() for c in token) else token for token in tokens[:PREFIX_DEPTH])
+        return (len(tokens),) + prefix
+
+    def add(self, message: str) -> Tuple[LogTemplate, bool]:
+        """Cluster a message, returns its template and whether the template is new or changed"""
+        tokens = self.tokenize(message)
+        group = self.groups.setdefault(self.route(tokens), [])
+        best, best_similarity = None, -1.0
+        for template in group:
+            similarity = template.similarity(tokens)
+            if similarity > best_similarity:
+                best, best_similarity = template, similarity
+        if best is not None and best_similarity >= SIMILARITY_THRESHOLD:
+            return best, best.merge(tokens)
+        template = LogTemplate(None, tokens)
+        group.append(template)
+        return template, True
+
+def ensure_log_templates(conn: sqlite3.Connection) -> None:
+    """Create the template tables: templates with their stats, per-level counts and which template each log belongs to"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS log_templates (
+            template_id INTEGER PRIMARY KEY,
+            template TEXT NOT NULL,
+            log_count INTEGER NOT NULL DEFAULT 0,
+            first_seen TEXT,
+            last_seen TEXT
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS log_template_levels (
+            template_id INTEGER NOT NULL,
+            levelname TEXT NOT NULL,
+            log_count INTEGER NOT NULL,
+            PRIMARY KEY (template_id, levelname)
+        )
+    """)
+    conn.execute("CREATE TABLE IF NOT EXISTS log_template_members (log_rowid INTEGER PRIMARY KEY, template_id INTEGER NOT NULL, levelname TEXT)")
+    conn.execute("CREATE INDEX IF NOT EXISTS log_template_members_template ON log_template_members (template_id, log_rowid)")
+
+def _clear_log_templates(conn: sqlite3.Connection) -> None:
+    conn.execute("DELETE FROM log_templates")
+    conn.execute("DELETE FROM log_template_levels")
+    conn.execute("DELETE FROM log_template_members")
+
+def reset_log_templates(sidecar_path: str = SIDECAR_DB_PATH) -> None:
+    """Drop all mined templates, e.g. after the logs table was cleared"""
+    with closing(connect_sidecar(sidecar_path)) as conn:
+        ensure_log_templates(conn)
+        conn.execute("BEGIN IMMEDIATE")
+        _clear_log_templates(conn)
+        set_watermark(conn, "log_templates", 0)
+        conn.execute("COMMIT")
+
+def sync_log_templates(logs_db_path: str, sidecar_path: str = SIDECAR_DB_PATH) -> int:
+    """
+    Cluster the logs written since the last sync into templates and return how many were read.
+
+    The parse tree is rebuilt from the stored templates (there are far fewer templates than
+    logs), new logs are clustered and the counts, first/last seen timestamps and per-level
+    counts of their templates are updated. Logs deleted from the head of the table are
+    taken back out of the counts.
+    """
+    with closing(connect_sidecar(sidecar_path)) as conn, closing(connect_read_only(logs_db_path)) as logs_conn:
+        ensure_log_templates(conn)
+        min_rowid, max_rowid = logs_conn.execute("SELECT min(rowid), max(rowid) FROM logs").fetchone()
+        min_rowid, max_rowid = min_rowid or 0, max_rowid or 0
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            watermark = get_watermark(conn, "log_templates")
+            if max_rowid < watermark:
+                _clear_log_templates(conn)
+                watermark = 0
+            else:
+                trimmed = conn.execute("""
+                    SELECT template_id, levelname, count(*) FROM log_template_members WHERE log_rowid < ? GROUP BY template_id, levelname
+                """, (min_rowid,)).fetchall()
+                conn.executemany("UPDATE log_templates SET log_count = log_count - ? WHERE template_id = ?", [(count, template_id) for template_id, _, count in trimmed])
+                conn.executemany("UPDATE log_template_levels SET log_count = log_count - ? WHERE template_id = ? AND levelname = ?", [(count, template_id, level) for template_id, level, count in trimmed])
+                conn.execute("DELETE FROM log_template_members WHERE log_rowid < ?", (min_rowid,))
+
+            drain = Drain([LogTemplate(template_id, template.split()) for template_id, template in conn.execute("SELECT template_id, template FROM log_templates")])
+
+            cursor = logs_conn.execute("SELECT rowid, timestamp, levelname, message FROM logs WHERE rowid > ? AND rowid <= ? ORDER BY rowid", (watermark, max_rowid))
+            while batch := cursor.fetchmany(SYNC_BATCH_SIZE):
+                members = []
+                level_counts = {}
+                seen = {}
+                for rowid, timestamp, levelname, message in batch:
+                    template, changed = drain.add(message)
+                    if template.template_id is None:
+                        template.template_id = conn.execute("INSERT INTO log_templates (template, first_seen) VALUES (?, ?)", (template.text, timestamp)).lastrowid
+                    elif changed:
+                        conn.execute("UPDATE log_templates SET template = ? WHERE template_id = ?", (template.text, template.template_id))
+                    members.append((rowid, template.template_id, levelname))
+                    level_counts[(template.template_id, levelname)] = level_counts.get((template.template_id, levelname), 0) + 1
+                    count, _ = seen.get(template.template_id, (0, None))
+                    seen[template.template_id] = (count + 1, timestamp)
+                conn.executemany("INSERT OR REPLACE INTO log_template_members (log_rowid, template_id, levelname) VALUES (?, ?, ?)", members)
+                conn.executemany(
+                    "UPDATE log_templates SET log_count = log_count + ?, last_seen = ? WHERE template_id = ?",
+                    [(count, last_seen, template_id) for template_id, (count, last_seen) in seen.items()]
+                )
+                conn.executemany("""
+                    INSERT INTO log_template_levels (template_id, levelname, log_count) VALUES (?, ?, ?)
+                    ON CONFLICT (template_id, levelname) DO UPDATE SET log_count = log_count + excluded.log_count
+                """, [(template_id, levelname, count) for (template_id, levelname), count in level_counts.items()])
+            conn.execute("DELETE FROM log_template_levels WHERE log_count <= 0")
+
+            set_watermark(conn, "log_templates", max(watermark, max_rowid))
+            conn.execute("COMMIT")
+            return max(max_rowid - watermark, 0)
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+def get_log_templates(conn: sqlite3.Connection, order_by: str = "last_seen", levelname: Optional[str] = None, limit: int = 500) -> List[dict]:
+    """
+    Return mined templates with their log count, first/last seen timestamps and per-level counts.
+
+    order_by is "last_seen", "log_count" or "first_seen" (newest patterns first). If levelname
+    is given, only templates with logs at that level are returned and log_count is the count
+    at that level.
+    """
+    if order_by not in ("last_seen", "log_count", "first_seen"):
+        raise ValueError(f"Cannot order templates by {order_by}")
+    if levelname is None:
+        rows = conn.execute(f"""
+            SELECT template_id, template, log_count, first_seen, last_seen FROM log_templates
+            WHERE log_count > 0 ORDER BY {order_by} DESC LIMIT ?
+        """, (limit,)).fetchall()
+    else:
+        rows = conn.execute(f"""
+            SELECT t.template_id, t.template, l.log_count, t.first_seen, t.last_seen
+            FROM log_templates t JOIN log_template_levels l ON l.template_id = t.template_id
+            WHERE l.levelname = ? AND l.log_count > 0 ORDER BY {'l.log_count' if order_by == 'log_count' else 't.' + order_by} DESC LIMIT ?
+        """, (levelname, limit)).fetchall()
+    templates = [
+        {'template_id': template_id, 'template': template, 'log_count': log_count, 'first_seen': first_seen, 'last_seen': last_seen, 'levels': {}}
+        for template_id, template, log_count, first_seen, last_seen in rows
+    ]
+    by_id = {template['template_id']: template for template in templates}
+    if by_id:
+        placeholders = ", ".join("?" for _ in by_id)
+        for template_id, level, count in conn.execute(f"SELECT template_id, levelname, log_count FROM log_template_levels WHERE template_id IN ({placeholders})", list(by_id)):
+            by_id[template_id]['levels'][level] = count
+    return templates
+
+def get_template_sample_rowids(conn: sqlite3.Connection, template_id: int, limit: int = 10) -> List[int]:
+    """Return the rowids of the most recent logs belonging to a template"""
+    return [row[0] for row in conn.execute(
+        "SELECT log_rowid FROM log_template_members WHERE template_id = ? ORDER BY log_rowid DESC LIMIT ?", (template_id, limit)
+    )]
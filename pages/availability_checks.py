@@ -1,105 +1,146 @@
 import streamlit as st
-from datetime import datetime
-from typing import Optional, List
-import sqlite3
+from datetime import timedelta
+from typing import Optional, Tuple
 import pandas as pd
-from dotenv import load_dotenv
-import os
-
-# Load environment variables
-load_dotenv() 
+from contextlib import closing
+from alerts import show_anomaly_alerts
+from db import cache_until_changed, first_id_since, format_like, get_read_only_pool, show_db_error, subnet_db_path
+from grid import GridFilter, PaginatedGrid
+from rollups import AVAILABILITY_METRIC, RESPONSE_TIME_METRIC, get_node_series, get_node_summary, sync_availability_rollups
+from sidecar import connect_sidecar
 
 # Get the absolute path to the database
-try:
-    db_path = os.getenv("ABSOLUTE_PATH_TO_SUBNET_REPO") + "/validator.db"
-except Exception as e:
-    st.error("You did not set your environment variable")
-    st.stop()
+db_path = subnet_db_path("validator.db")
 
 st.set_page_config(layout="wide")
+show_anomaly_alerts()
 
-class AvailabilityCheck:
-    def __init__(
-        self,
-        id: Optional[int] = None,  # Optional because it's auto-incrementing
-        node_id: int = None,
-        hotkey: str = None,
-        checked_at: datetime = None,
-        is_available: bool = None,
-        response_time_ms: float = None,
-        error: Optional[str] = None  # Optional because it can be NULL
-    ):
-        self.id = id
-        self.node_id = node_id
-        self.hotkey = hotkey
-        self.checked_at = checked_at
-        self.is_available = is_available
-        self.response_time_ms = response_time_ms
-        self.error = error
+# Time windows that can be charted, ending at the newest check (None charts every check)
+TIME_WINDOWS = {
+    "Last 6 hours": timedelta(hours=6),
+    "Last 24 hours": timedelta(days=1),
+    "Last 7 days": timedelta(days=7),
+    "Last 30 days": timedelta(days=30),
+    "All time": None
+}
 
-    def to_dict(self) -> dict:
-        return {
-            'id': self.id,
-            'node_id': self.node_id,
-            'hotkey': self.hotkey,
-            'checked_at': self.checked_at.isoformat() if self.checked_at else None,
-            'is_available': self.is_available,
-            'response_time_ms': self.response_time_ms,
-            'error': self.error
-        }
+# Bucket widths for the time series and how the chart names them, the narrowest that keeps the chart within MAX_CHART_POINTS is used
+BUCKET_WIDTHS = {
+    timedelta(minutes=1): "1 minute", timedelta(minutes=5): "5 minutes", timedelta(minutes=15): "15 minutes",
+    timedelta(minutes=30): "30 minutes", timedelta(hours=1): "1 hour", timedelta(hours=3): "3 hours",
+    timedelta(hours=6): "6 hours", timedelta(hours=12): "12 hours", timedelta(days=1): "1 day", timedelta(days=7): "1 week"
+}
 
-    @classmethod
-    def from_db_row(cls, row: tuple) -> 'AvailabilityCheck':
-        return cls(
-            id=row[0],
-            node_id=row[1],
-            hotkey=row[2],
-            checked_at=datetime.fromisoformat(row[3]) if row[3] else None,
-            is_available=bool(row[4]),
-            response_time_ms=float(row[5]),
-            error=row[6]
-        )
+# Points drawn across all nodes' series, though every node gets at least MIN_POINTS_PER_NODE
+MAX_CHART_POINTS = 10000
+MIN_POINTS_PER_NODE = 48
+
+# Returns response time statistics per node (mean and percentiles) from the sidecar rollups,
+# which only have to fold in the checks written since the last call
+@cache_until_changed
+def get_response_time_summary(db_path: str = db_path) -> pd.DataFrame:
+    try:
+        sync_availability_rollups(db_path)
+        with closing(connect_sidecar()) as conn:
+            return get_node_summary(conn, RESPONSE_TIME_METRIC)
+    except Exception as e:
+        show_db_error(e, db_path)
 
-def get_all_availability_checks(db_path: str = db_path) -> List[AvailabilityCheck]:
+# Returns the mean response time and availability per node in time buckets over a window ending at the newest check,
+# with buckets wide enough that the chart stays around MAX_CHART_POINTS points however many checks the window holds.
+# Buckets of an hour or more are merged from the sidecar rollups, narrower ones are grouped from the checks in SQL
+@cache_until_changed
+def get_availability_series(window: Optional[timedelta], node_ids: tuple, node_count: int, db_path: str = db_path) -> Tuple[pd.DataFrame, timedelta]:
     try:
-        with sqlite3.connect(db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT * FROM availability_checks")
-            return [AvailabilityCheck.from_db_row(row) for row in cursor.fetchall()]
+        pool = get_read_only_pool(db_path)
+        first_checked_at, last_checked_at = pool.query_one(
+            "SELECT (SELECT checked_at FROM availability_checks ORDER BY id LIMIT 1), (SELECT checked_at FROM availability_checks ORDER BY id DESC LIMIT 1)"
+        )
+        end = pd.Timestamp(last_checked_at)
+        start = pd.Timestamp(first_checked_at) if window is None else end - window
+        points_per_node = max(MAX_CHART_POINTS // max(node_count, 1), MIN_POINTS_PER_NODE)
+        width = next((width for width in BUCKET_WIDTHS if (end - start) / width <= points_per_node), max(BUCKET_WIDTHS))
+
+        if width >= timedelta(hours=1):
+            start = start.floor("h")
+            sync_availability_rollups(db_path)
+            with closing(connect_sidecar()) as conn:
+                response_times = get_node_series(conn, RESPONSE_TIME_METRIC, start, width, list(node_ids))
+                availability = get_node_series(conn, AVAILABILITY_METRIC, start, width, list(node_ids))
+            series = pd.merge(
+                response_times[['node_id', 'bucket_start', 'mean']].rename(columns={'mean': 'response_time_ms'}),
+                availability[['node_id', 'bucket_start', 'mean']].rename(columns={'mean': 'availability'}),
+                on=['node_id', 'bucket_start'], how='outer'
+            )
+        else:
+            start = start.floor(width)
+            since = format_like(start, last_checked_at)
+            node_filter = f"AND node_id IN ({', '.join('?' for _ in node_ids)})" if node_ids else ""
+            series = pool.query_frame(f"""
+                SELECT node_id, CAST(round((julianday(checked_at) - julianday(?)) * 86400) / ? AS INTEGER) AS bucket,
+                       avg(response_time_ms) AS response_time_ms, avg(is_available) AS availability
+                FROM availability_checks
+                WHERE id >= ? AND checked_at >= ? {node_filter}
+                GROUP BY node_id, bucket
+            """, (since, width.total_seconds(), first_id_since(pool, "availability_checks", "id", "checked_at", since) or 0, since) + node_ids)
+            series.insert(1, 'bucket_start', start + pd.to_timedelta(series.pop('bucket') * width.total_seconds(), unit="s"))
     except Exception as e:
-        st.error(f"Error reading from validator.db ({e})")
-        st.info("Did you forget to set the environment variable? Cave is currently searching for " + db_path)
-        st.info("If you are sure you have set the environment variable, please check that the database file exists at " + db_path)
-        st.info("If you are sure the file exists, please ensure a miner and validator are running")
-        st.stop()
+        show_db_error(e, db_path)
+    return series.sort_values(['bucket_start', 'node_id']), width
 
-# Get and process availability checks
-availability_checks = get_all_availability_checks()
-availability_checks_dict = [check.to_dict() for check in availability_checks]
+availability_checks_grid = PaginatedGrid(
+    key="availability_checks",
+    db_path=db_path,
+    select="id, node_id, hotkey, checked_at, is_available, response_time_ms, error",
+    source="availability_checks",
+    primary_key="id",
+    sort_options={
+        "Check ID": "id",
+        "Checked at": "coalesce(checked_at, '')",
+        "Response time": "coalesce(response_time_ms, -1)",
+        "Node ID": "coalesce(node_id, -1)"
+    },
+    filters=[
+        GridFilter("Node ID", "node_id", "integer"),
+        GridFilter("Hotkey", "hotkey", "text"),
+        GridFilter("Available", "is_available", "boolean"),
+        GridFilter("Checked at", "checked_at", "date_range")
+    ],
+    timestamp_columns=['checked_at'],
+    boolean_columns=['is_available']
+)
 
-if len(availability_checks) == 0:
+if not availability_checks_grid.has_rows():
     st.info("No availability checks found in " + db_path + ". Please ensure a miner and validator are running. It may be the case that everything is fine, but your availability_checks table is empty.")
     st.stop()
 
 # Display availability checks table
 st.subheader('Availability checks table')
-st.dataframe(
-    availability_checks_dict,
-    column_order=['id', 'node_id', 'hotkey', 'checked_at', 'is_available', 'response_time_ms', 'error'],
-    hide_index=True
-)
-
-# Calculate average response times
-response_times_df = pd.DataFrame([
-    {'NodeID': check.node_id, 'Response time (ms)': check.response_time_ms}
-    for check in availability_checks
-])
-avg_response_times = response_times_df.groupby('NodeID')['Response time (ms)'].mean().reset_index()
+availability_checks_grid.render(column_order=['id', 'node_id', 'hotkey', 'checked_at', 'is_available', 'response_time_ms', 'error'])
 
-# Display average response time per node in a bar chart
-st.subheader('Average response time per node')
+# Display response time percentiles per node in a bar chart
+response_times = get_response_time_summary().rename(columns={'node_id': 'NodeID', 'mean': 'Mean'})
+st.subheader('Response time per node')
 st.bar_chart(
-    data=avg_response_times,
+    data=response_times,
     x='NodeID',
-    y='Response time (ms)'
+    y=['Mean', 'p50', 'p95', 'p99'],
+    y_label='Response time (ms)',
+    stack=False
 )
+
+# Display response time and availability over time, bucketed so long windows stay responsive
+st.subheader('Response time and availability over time')
+window_col, nodes_col = st.columns([1, 3])
+window = TIME_WINDOWS[window_col.selectbox("Time window", list(TIME_WINDOWS), index=1)]
+node_ids = tuple(nodes_col.multiselect("Nodes", response_times['NodeID'].tolist(), placeholder="All nodes"))
+series, width = get_availability_series(window, node_ids, len(node_ids) or len(response_times))
+if series.empty:
+    st.info("No availability checks in this time window")
+else:
+    series = series.assign(Node=series['node_id'].astype(str)).rename(columns={
+        'bucket_start': 'Time', 'response_time_ms': 'Response time (ms)', 'availability': 'Availability'
+    })
+    st.caption(f"Each point is the mean of a node's checks over {BUCKET_WIDTHS[width]}")
+    st.line_chart(series, x='Time', y='Response time (ms)', color='Node')
+    st.line_chart(series, x='Time', y='Availability', color='Node')
@@ -0,0 +1,125 @@
+import streamlit as st
+import altair as alt
+import pandas as pd
+from contextlib import closing
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+from alerts import show_anomaly_alerts
+from db import cache_until_changed, first_id_since, format_like, get_read_only_pool, show_db_error, subnet_db_path
+from grid import table_has_rows
+from rollups import AVAILABILITY_METRIC, RESPONSE_TIME_METRIC, get_node_quantiles, get_node_series, sync_availability_rollups
+from sidecar import connect_sidecar
+
+# Get the absolute path to the database
+db_path = subnet_db_path("validator.db")
+
+st.set_page_config(layout="wide")
+show_anomaly_alerts()
+
+# Time windows that can be drawn, ending at the newest check (None draws every check)
+TIME_WINDOWS = {
+    "Last 24 hours": timedelta(days=1),
+    "Last 7 days": timedelta(days=7),
+    "Last 30 days": timedelta(days=30),
+    "All time": None
+}
+
+# Cell widths and how the page names them, the narrowest that keeps the heatmap within MAX_COLUMNS columns is used
+CELL_WIDTHS = {
+    timedelta(hours=1): "1 hour", timedelta(hours=3): "3 hours", timedelta(hours=6): "6 hours",
+    timedelta(hours=12): "12 hours", timedelta(days=1): "1 day", timedelta(days=7): "1 week"
+}
+MAX_COLUMNS = 168
+
+# What the cells can be colored by
+COLOR_OPTIONS = ["Availability", "p95 response time"]
+
+# Returns one cell per node and time bucket over a window ending at the newest check, colored by the
+# availability ratio or p95 response time of the node's checks in it. Cells are merged from the hourly
+# rollups in the sidecar, so the cost depends on the number of cells rather than the number of checks
+@cache_until_changed
+def get_heatmap(window: Optional[timedelta], color_by: str, db_path: str = db_path) -> Tuple[pd.DataFrame, timedelta]:
+    try:
+        first_checked_at, last_checked_at = get_read_only_pool(db_path).query_one(
+            "SELECT (SELECT checked_at FROM availability_checks ORDER BY id LIMIT 1), (SELECT checked_at FROM availability_checks ORDER BY id DESC LIMIT 1)"
+        )
+        end = pd.Timestamp(last_checked_at)
+        start = (pd.Timestamp(first_checked_at) if window is None else end - window).floor("h")
+        width = next((width for width in CELL_WIDTHS if (end - start) / width <= MAX_COLUMNS), max(CELL_WIDTHS))
+        sync_availability_rollups(db_path)
+        with closing(connect_sidecar()) as conn:
+            if color_by == "Availability":
+                cells = get_node_series(conn, AVAILABILITY_METRIC, start, width).rename(columns={'mean': 'value'})
+            else:
+                cells = get_node_quantiles(conn, RESPONSE_TIME_METRIC, start, width, 0.95).rename(columns={'quantile': 'value'})
+    except Exception as e:
+        show_db_error(e, db_path)
+    cells['bucket_end'] = cells['bucket_start'] + width
+    # Number the cells of a row, so a clicked cell is identified without round tripping timestamps through the chart
+    cells['cell'] = ((cells['bucket_start'] - start) // width).astype(int)
+    return cells, width
+
+# Returns the checks of one node between two times, for drilling into a cell
+@cache_until_changed
+def get_cell_checks(node_id: int, start: datetime, end: datetime, db_path: str = db_path) -> pd.DataFrame:
+    try:
+        pool = get_read_only_pool(db_path)
+        stored = pool.query_one("SELECT checked_at FROM availability_checks ORDER BY id DESC LIMIT 1")[0]
+        start, end = format_like(start, stored), format_like(end, stored)
+        first_id = first_id_since(pool, "availability_checks", "id", "checked_at", start)
+        return pool.query_frame(
+            """
+            SELECT id, checked_at, is_available, response_time_ms, error
+            FROM availability_checks
+            WHERE id >= ? AND node_id = ? AND checked_at >= ? AND checked_at < ?
+            ORDER BY id
+            """,
+            (first_id if first_id is not None else -1, node_id, start, end)
+        ).astype({'is_available': 'boolean'})
+    except Exception as e:
+        show_db_error(e, db_path)
+
+if not table_has_rows("availability_checks", "1", db_path=db_path):
+    st.info("No availability checks found in " + db_path + ". Please ensure a miner and validator are running. It may be the case that everything is fine, but your availability_checks table is empty.")
+    st.stop()
+
+window_col, color_col = st.columns(2)
+window = TIME_WINDOWS[window_col.selectbox("Time window", list(TIME_WINDOWS), index=1)]
+color_by = color_col.selectbox("Color by", COLOR_OPTIONS)
+cells, width = get_heatmap(window, color_by)
+
+if cells.empty:
+    st.info("No availability checks in this time window")
+    st.stop()
+
+st.subheader(f"{color_by} per node")
+st.caption(f"Each cell covers {CELL_WIDTHS[width]} of a node's checks. Click a cell to see its checks.")
+if color_by == "Availability":
+    color = alt.Color('value:Q', title='Availability', scale=alt.Scale(scheme='redyellowgreen', domain=[0, 1]))
+else:
+    color = alt.Color('value:Q', title='p95 response time (ms)', scale=alt.Scale(scheme='viridis'))
+cell_selection = alt.selection_point(name="cell", fields=['node_id', 'cell'], on='click')
+heatmap = alt.Chart(cells).mark_rect().encode(
+    x=alt.X('bucket_start:T', title='Time'),
+    x2='bucket_end:T',
+    y=alt.Y('node_id:O', title='Node', sort='ascending'),
+    color=color,
+    opacity=alt.condition(cell_selection, alt.value(1), alt.value(0.4)),
+    tooltip=[
+        alt.Tooltip('node_id:O', title='Node'),
+        alt.Tooltip('bucket_start:T', title='From', format='%Y-%m-%d %H:%M'),
+        alt.Tooltip('value:Q', title=color_by, format='.3f' if color_by == "Availability" else '.1f'),
+        alt.Tooltip('count:Q', title='Checks')
+    ]
+).add_params(cell_selection).properties(height=alt.Step(12))
+event = st.altair_chart(heatmap, use_container_width=True, on_select="rerun", key="availability_heatmap")
+
+# Drill through to the checks of the clicked cell
+selected_cells = event['selection'].get('cell', [])
+if selected_cells:
+    selected = cells[(cells['node_id'] == selected_cells[0]['node_id']) & (cells['cell'] == selected_cells[0]['cell'])]
+    if not selected.empty:
+        selected = selected.iloc[0]
+        st.subheader(f"Checks of node {selected['node_id']} from {selected['bucket_start']:%Y-%m-%d %H:%M} to {selected['bucket_end']:%Y-%m-%d %H:%M}")
+        checks = get_cell_checks(int(selected['node_id']), selected['bucket_start'], selected['bucket_end'])
+        st.dataframe(checks, hide_index=True, use_container_width=True)
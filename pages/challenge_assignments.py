@@ -1,130 +1,233 @@
 import streamlit as st
-from datetime import datetime
-from typing import Optional, List
-import sqlite3
+import altair as alt
+import numpy as np
+from datetime import datetime, timedelta
+from typing import Tuple
 import pandas as pd
-from dotenv import load_dotenv
-import os
-
-# Load environment variables
-load_dotenv() 
+from contextlib import closing
+from alerts import show_anomaly_alerts
+from db import cache_until_changed, create_index, format_durations, format_like, get_read_only_pool, index_exists, show_db_error, subnet_db_path
+from grid import GridFilter, PaginatedGrid, get_distinct_values
+from rollups import COMPLETION_TIME_METRIC, get_node_summary, sync_assignment_rollups
+from sidecar import connect_sidecar
 
 # Get the absolute path to the database 
-try:
-    db_path = os.getenv("ABSOLUTE_PATH_TO_SUBNET_REPO") + "/validator.db"
-except Exception as e:
-    st.error("You did not set your environment variable")
-    st.stop()
+db_path = subnet_db_path("validator.db")
 
 st.set_page_config(layout="wide")
+show_anomaly_alerts()
+
+# What the funnel and stage latencies can be broken down by
+BREAKDOWNS = {"Node": "a.node_id", "Miner": "a.miner_hotkey", "Challenge type": "c.type"}
+
+# Stages of an assignment and the columns they start and end at
+STAGES = {"Assigned → sent": ("assigned_at", "sent_at"), "Sent → completed": ("sent_at", "completed_at")}
+
+# Statuses an assignment can still leave, with the column recording when it entered them
+IN_FLIGHT_STATUSES = {'assigned': 'assigned_at', 'sent': 'sent_at'}
+
+# Stuck assignments listed at most
+STUCK_LIMIT = 1000
 
-class ChallengeAssignment:
-    def __init__(
-        self,
-        assignment_id: Optional[int] = None,  # Optional because it's auto-incrementing
-        challenge_id: str = None,
-        miner_hotkey: str = None,
-        node_id: int = None,
-        assigned_at: datetime = None,
-        sent_at: Optional[datetime] = None,
-        completed_at: Optional[datetime] = None,
-        status: str = 'assigned'  # Default status
-    ):
-        self.assignment_id = assignment_id
-        self.challenge_id = challenge_id
-        self.miner_hotkey = miner_hotkey
-        self.node_id = node_id
-        self.assigned_at = assigned_at or datetime.now()
-        self.sent_at = sent_at
-        self.completed_at = completed_at
-        self.status = status
-
-    def to_dict(self) -> dict:
-        """Convert the object to a dictionary for database operations"""
-        return {
-            'assignment_id': self.assignment_id,
-            'challenge_id': self.challenge_id,
-            'miner_hotkey': self.miner_hotkey,
-            'node_id': self.node_id,
-            'assigned_at': self.assigned_at.isoformat() if self.assigned_at else None,
-            'sent_at': self.sent_at.isoformat() if self.sent_at else None,
-            'completed_at': self.completed_at.isoformat() if self.completed_at else None,
-            'status': self.status
-        }
-
-    @classmethod
-    def from_db_row(cls, row: tuple) -> 'ChallengeAssignment':
-        """Create a ChallengeAssignment instance from a database row"""
-        return cls(
-            assignment_id=row[0],
-            challenge_id=row[1],
-            miner_hotkey=row[2],
-            node_id=row[3],
-            assigned_at=datetime.fromisoformat(row[4]) if row[4] else None,
-            sent_at=datetime.fromisoformat(row[5]) if row[5] else None,
-            completed_at=datetime.fromisoformat(row[6]) if row[6] else None,
-            status=row[7]
-        )
-
-def get_all_challenge_assignments(db_path: str = db_path) -> List[ChallengeAssignment]:
+# Optional index that makes finding stuck assignments a range scan per in-flight status instead of a full scan
+STUCK_INDEX = "idx_challenge_assignments_status_assigned_at"
+
+@cache_until_changed
+def get_completion_time_summary(db_path: str = db_path) -> pd.DataFrame:
     """
-    Read all challenge assignments from the database and return them as a list of ChallengeAssignment objects.
+    Read the time from a challenge being sent to being completed per node (mean and percentiles).
+    The statistics come from the sidecar rollups, which only fold in newly completed assignments.
     
     Args:
         db_path (str): Path to the SQLite database file
         
     Returns:
-        List[ChallengeAssignment]: List of ChallengeAssignment objects
+        pd.DataFrame: One row per node with at least one completed assignment
     """
     try:
-        with sqlite3.connect(db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT * FROM challenge_assignments")
-            return [ChallengeAssignment.from_db_row(row) for row in cursor.fetchall()]
+        sync_assignment_rollups(db_path)
+        with closing(connect_sidecar()) as conn:
+            return get_node_summary(conn, COMPLETION_TIME_METRIC)
     except Exception as e:
-        st.error(f"Error reading from validator.db ({e})")
-        st.info("Did you forget to set the environment variable? Cave is currently searching for " + db_path)
-        st.info("If you are sure you have set the environment variable, please check that the database file exists at " + db_path)
-        st.info("If you are sure the file exists, please ensure a miner and validator are running")
-        st.stop()
+        show_db_error(e, db_path)
 
-# Get all challenge assignments
-assignments = get_all_challenge_assignments()
-assignments_dict = [assignment.to_dict() for assignment in assignments]
+@cache_until_changed
+def get_status_counts(breakdown: str, db_path: str = db_path) -> pd.DataFrame:
+    """
+    Count assignments per status (and how many of them were sent) for every node, miner or challenge type.
+    
+    Args:
+        breakdown (str): One of BREAKDOWNS
+        db_path (str): Path to the SQLite database file
+        
+    Returns:
+        pd.DataFrame: One row per group and status with the assignments and sent counts
+    """
+    try:
+        return get_read_only_pool(db_path).query_frame(f"""
+            SELECT {BREAKDOWNS[breakdown]} AS "group", a.status, count(*) AS assignments, count(a.sent_at) AS sent
+            FROM challenge_assignments a LEFT JOIN challenges c ON c.challenge_id = a.challenge_id
+            GROUP BY 1, 2
+        """)
+    except Exception as e:
+        show_db_error(e, db_path)
 
-if len(assignments) == 0:
-    st.info("No challenge assignments found in " + db_path + ". Please ensure a miner and validator are running. It may be the case that everything is fine, but your challenge_assignments table is empty.")
-    st.stop()
+@cache_until_changed
+def get_stage_latencies(breakdown: str, db_path: str = db_path) -> pd.DataFrame:
+    """
+    Read how long every sent assignment spent in each stage, computed by SQLite from the timestamp columns.
+    
+    Args:
+        breakdown (str): One of BREAKDOWNS
+        db_path (str): Path to the SQLite database file
+        
+    Returns:
+        pd.DataFrame: The group of each assignment and its seconds per stage (NaN for stages it has not finished)
+    """
+    stages = ", ".join(f'(julianday(a.{end}) - julianday(a.{start})) * 86400 AS "{stage}"' for stage, (start, end) in STAGES.items())
+    try:
+        return get_read_only_pool(db_path).query_frame(f"""
+            SELECT {BREAKDOWNS[breakdown]} AS "group", {stages}
+            FROM challenge_assignments a LEFT JOIN challenges c ON c.challenge_id = a.challenge_id
+            WHERE a.sent_at IS NOT NULL
+        """)
+    except Exception as e:
+        show_db_error(e, db_path)
 
-st.subheader('Challenge assignments table')
-st.dataframe(
-    assignments_dict,
-    column_order=['assignment_id', 'challenge_id', 'miner_hotkey', 'node_id', 'assigned_at', 'sent_at', 'completed_at', 'status'],
-    hide_index=True
+@cache_until_changed
+def get_stuck_assignments(cutoff: datetime, db_path: str = db_path) -> Tuple[pd.DataFrame, int]:
+    """
+    Find assignments that entered an in-flight status before the cutoff and are still in it.
+    
+    An assignment is always sent after it was assigned, so both statuses can be bounded on
+    assigned_at, which lets the opt-in STUCK_INDEX on (status, assigned_at) answer the query.
+    
+    Args:
+        cutoff (datetime): Assignments in their status since before this are stuck
+        db_path (str): Path to the SQLite database file
+        
+    Returns:
+        Tuple[pd.DataFrame, int]: The longest stuck assignments (up to STUCK_LIMIT) and how many are stuck in total
+    """
+    try:
+        pool = get_read_only_pool(db_path)
+        stored = pool.query_one("SELECT assigned_at FROM challenge_assignments ORDER BY assignment_id DESC LIMIT 1")
+        cutoff_text = format_like(cutoff, stored[0] if stored else None)
+        entered_at = "CASE status " + " ".join(f"WHEN '{status}' THEN {column}" for status, column in IN_FLIGHT_STATUSES.items()) + " END"
+        in_flight = ", ".join(f"'{status}'" for status in IN_FLIGHT_STATUSES)
+        where = f"status IN ({in_flight}) AND assigned_at < ? AND {entered_at} < ?"
+        total = pool.query_one(f"SELECT count(*) FROM challenge_assignments WHERE {where}", (cutoff_text, cutoff_text))[0]
+        stuck = pool.query_frame(f"""
+            SELECT assignment_id, challenge_id, miner_hotkey, node_id, status, {entered_at} AS in_status_since
+            FROM challenge_assignments
+            WHERE {where}
+            ORDER BY assigned_at
+            LIMIT ?
+        """, (cutoff_text, cutoff_text, STUCK_LIMIT))
+    except Exception as e:
+        show_db_error(e, db_path)
+    stuck['in_status_since'] = pd.to_datetime(stuck['in_status_since'], format="ISO8601", errors="coerce")
+    return stuck, total
+
+assignments_grid = PaginatedGrid(
+    key="challenge_assignments",
+    db_path=db_path,
+    select="assignment_id, challenge_id, miner_hotkey, node_id, assigned_at, sent_at, completed_at, status",
+    source="challenge_assignments",
+    primary_key="assignment_id",
+    sort_options={
+        "Assignment ID": "assignment_id",
+        "Assigned at": "coalesce(assigned_at, '')",
+        "Completed at": "coalesce(completed_at, '')",
+        "Node ID": "coalesce(node_id, -1)"
+    },
+    filters=[
+        GridFilter("Node ID", "node_id", "integer"),
+        GridFilter("Miner hotkey", "miner_hotkey", "text"),
+        GridFilter("Status", "status", "choice", get_distinct_values("challenge_assignments", "status", db_path=db_path)),
+        GridFilter("Assigned at", "assigned_at", "date_range")
+    ],
+    timestamp_columns=['assigned_at', 'sent_at', 'completed_at']
 )
 
-# Calculate average completion time per node
-completion_times = []
-for assignment in assignments:
-    if assignment.completed_at and assignment.sent_at:
-        completion_time = (assignment.completed_at - assignment.sent_at).total_seconds()
-        completion_times.append({
-            'NodeID': assignment.node_id,
-            'Average completion time (s)': completion_time
-        })
+if not assignments_grid.has_rows():
+    st.info("No challenge assignments found in " + db_path + ". Please ensure a miner and validator are running. It may be the case that everything is fine, but your challenge_assignments table is empty.")
+    st.stop()
 
-completion_times_df = pd.DataFrame(completion_times)
+st.subheader('Challenge assignments table')
+assignments_grid.render(column_order=['assignment_id', 'challenge_id', 'miner_hotkey', 'node_id', 'assigned_at', 'sent_at', 'completed_at', 'status'])
 
-if not completion_times_df.empty:
-    avg_completion_times = completion_times_df.groupby('NodeID')['Average completion time (s)'].mean().reset_index()
+# Calculate completion time percentiles per node
+completion_times = get_completion_time_summary().rename(columns={'node_id': 'NodeID', 'mean': 'Mean'})
 
-    # Display average completion time per node in a bar chart
-    st.subheader('Average challenge completion time per node')
+if not completion_times.empty:
+    # Display completion time percentiles per node in a bar chart
+    st.subheader('Challenge completion time per node')
     st.bar_chart(
-        data=avg_completion_times,
+        data=completion_times,
         x='NodeID',
-        y='Average completion time (s)'
+        y=['Mean', 'p50', 'p95', 'p99'],
+        y_label='Completion time (s)',
+        stack=False
     )
 else:
     st.info('No completed challenges found to calculate completion times')
 
+# Display how many assignments make it through each stage
+st.subheader('Assignment funnel')
+breakdown = st.selectbox("Break down by", list(BREAKDOWNS))
+status_counts = get_status_counts(breakdown)
+statuses = status_counts.groupby('status')['assignments'].sum()
+funnel = pd.DataFrame({
+    'Stage': ['Assigned', 'Sent', 'Completed'],
+    'Assignments': [statuses.sum(), status_counts['sent'].sum(), statuses.get('completed', 0)]
+})
+assigned_col, sent_col, completed_col, failed_col = st.columns(4)
+assigned_col.metric("Assigned", f"{funnel['Assignments'][0]:,}")
+sent_col.metric("Sent", f"{funnel['Assignments'][1]:,}", help=f"{funnel['Assignments'][1] / max(funnel['Assignments'][0], 1):.0%} of assigned")
+completed_col.metric("Completed", f"{funnel['Assignments'][2]:,}", help=f"{funnel['Assignments'][2] / max(funnel['Assignments'][1], 1):.0%} of sent")
+failed_col.metric("Failed", f"{statuses.get('failed', 0):,}")
+st.altair_chart(
+    alt.Chart(funnel).mark_bar().encode(
+        x=alt.X('Assignments:Q'),
+        y=alt.Y('Stage:N', sort=None, title=None),
+        tooltip=['Stage', 'Assignments']
+    ),
+    use_container_width=True
+)
+st.bar_chart(status_counts.astype({'group': str}), x='group', y='assignments', color='status', x_label=breakdown, y_label='Assignments')
+
+# Display how long assignments spend in each stage
+st.subheader('Stage latency')
+stage = st.radio("Stage", list(STAGES), horizontal=True)
+latencies = get_stage_latencies(breakdown)[['group', stage]].dropna()
+if latencies.empty:
+    st.info(f"No assignment has finished the {stage} stage yet")
+else:
+    p50_col, p90_col, p99_col = st.columns(3)
+    overall = latencies[stage].quantile([0.5, 0.9, 0.99])
+    p50_col.metric("p50", f"{overall[0.5]:.1f}s")
+    p90_col.metric("p90", f"{overall[0.9]:.1f}s")
+    p99_col.metric("p99", f"{overall[0.99]:.1f}s")
+    counts, edges = np.histogram(latencies[stage], bins=50)
+    st.bar_chart(pd.DataFrame({'Seconds': edges[:-1].round(1), 'Assignments': counts}), x='Seconds', y='Assignments')
+    per_group = latencies.groupby('group')[stage].quantile([0.5, 0.9, 0.99]).unstack()
+    per_group.columns = ['p50', 'p90', 'p99']
+    st.bar_chart(per_group.reset_index().astype({'group': str}), x='group', y=['p50', 'p90', 'p99'], x_label=breakdown, y_label=f"{stage} (s)", stack=False)
+
+# Display assignments that have not moved on for too long
+st.subheader('Stuck assignments')
+threshold_minutes = st.number_input("Flag assignments that have been assigned or sent for longer than (minutes)", min_value=1, value=30)
+# Round the cutoff to the minute, so reruns within a minute reuse the cached result
+cutoff = (datetime.now() - timedelta(minutes=threshold_minutes)).replace(second=0, microsecond=0)
+stuck, stuck_total = get_stuck_assignments(cutoff)
+if stuck.empty:
+    st.success(f"No assignment has been waiting in the same status for longer than {threshold_minutes} minutes")
+else:
+    st.warning(f"{stuck_total:,} assignments have been waiting in the same status for longer than {threshold_minutes} minutes" + (f", showing the {STUCK_LIMIT:,} oldest" if stuck_total > STUCK_LIMIT else ""))
+    stuck = stuck.assign(stuck_for=format_durations(datetime.now() - stuck['in_status_since']))
+    st.dataframe(stuck, column_order=['assignment_id', 'challenge_id', 'miner_hotkey', 'node_id', 'status', 'in_status_since', 'stuck_for'], hide_index=True)
+if not index_exists(STUCK_INDEX, db_path=db_path):
+    if st.button("Index stuck assignment lookups", help="Finding stuck assignments currently scans every assignment. This creates an index on (status, assigned_at) in validator.db, which locks the database while it is built and is then kept up to date by the validator"):
+        create_index(db_path, STUCK_INDEX, "challenge_assignments", "status, assigned_at")
+        st.rerun()
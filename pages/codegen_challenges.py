@@ -1,22 +1,16 @@
 import streamlit as st
 from datetime import datetime
 from typing import Optional, List
-import sqlite3
 import json
-from dotenv import load_dotenv
-import os
-
-# Load environment variables
-load_dotenv() 
+from alerts import show_anomaly_alerts
+from db import cache_until_changed, get_read_only_pool, show_db_error, subnet_db_path
+from grid import GridFilter, PaginatedGrid
 
 # Get the absolute path to the database
-try:
-    db_path = os.getenv("ABSOLUTE_PATH_TO_SUBNET_REPO") + "/validator.db"
-except Exception as e:
-    st.error("You did not set your environment variable")
-    st.stop()
+db_path = subnet_db_path("validator.db")
 
 st.set_page_config(layout="wide")
+show_anomaly_alerts()
 
 class CodegenChallenge:
     def __init__(
@@ -62,57 +56,59 @@ class CodegenChallenge:
             context_file_paths=json.loads(row[6])
         )
 
-def get_all_codegen_challenges(db_path: str = db_path) -> List[CodegenChallenge]:
+@cache_until_changed
+def get_codegen_challenge(challenge_id: str, db_path: str = db_path) -> CodegenChallenge:
     """
-    Read all codegen challenges from the database and return them as a list of CodegenChallenge objects.
+    Read a single codegen challenge by its id, for the details view.
     
     Args:
+        challenge_id (str): The challenge to read
         db_path (str): Path to the SQLite database file
         
     Returns:
-        List[CodegenChallenge]: List of CodegenChallenge objects
+        CodegenChallenge: The challenge
     """
     try:
-        with sqlite3.connect(db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                SELECT cc.challenge_id, c.created_at, cc.problem_statement, 
-                       cc.dynamic_checklist, cc.repository_url, cc.commit_hash, cc.context_file_paths
-                FROM codegen_challenges cc
-                JOIN challenges c ON cc.challenge_id = c.challenge_id
-                WHERE c.type = 'codegen'
-            """)
-            return [CodegenChallenge.from_db_row(row) for row in cursor.fetchall()]
+        row = get_read_only_pool(db_path).query_one("""
+            SELECT cc.challenge_id, c.created_at, cc.problem_statement, 
+                   cc.dynamic_checklist, cc.repository_url, cc.commit_hash, cc.context_file_paths
+            FROM codegen_challenges cc
+            JOIN challenges c ON cc.challenge_id = c.challenge_id
+            WHERE cc.challenge_id = ?
+        """, (challenge_id,))
+        return CodegenChallenge.from_db_row(row)
     except Exception as e:
-        st.error(f"Error reading from validator.db ({e})")
-        st.info("Did you forget to set your environment variable? Cave is currently searching for " + db_path)
-        st.info("If you are sure you have set the environment variable, please check that the database file exists at " + db_path)
-        st.info("If you are sure the file exists, please ensure a miner and validator are running")
-        st.stop()
+        show_db_error(e, db_path)
 
-# Get all codegen challenges
-challenges = get_all_codegen_challenges()
-challenges_dict = [challenge.to_dict() for challenge in challenges]
+codegen_challenges_grid = PaginatedGrid(
+    key="codegen_challenges",
+    db_path=db_path,
+    select="cc.challenge_id, c.created_at, cc.problem_statement, cc.dynamic_checklist, cc.repository_url, cc.commit_hash, cc.context_file_paths",
+    source="codegen_challenges cc JOIN challenges c ON cc.challenge_id = c.challenge_id",
+    primary_key="cc.challenge_id",
+    sort_options={"Created at": "coalesce(c.created_at, '')", "Challenge ID": "cc.challenge_id"},
+    where="c.type = 'codegen'",
+    filters=[
+        GridFilter("Repository URL", "cc.repository_url", "text"),
+        GridFilter("Created at", "c.created_at", "date_range")
+    ],
+    timestamp_columns=['created_at']
+)
 
-if len(challenges) == 0:
+if not codegen_challenges_grid.has_rows():
     st.info("No codegen challenges found in " + db_path + ". Please ensure a miner and validator are running. It may be the case that everything is fine, but your codegen_challenges table is empty.")
     st.stop()
 
 # Display challenges table
 st.subheader('Codegen Challenges table')
-challenges_df = st.dataframe(
-    challenges_dict,
+selected_row = codegen_challenges_grid.render(
     column_order=['challenge_id', 'created_at', 'problem_statement', 'repository_url', 
-                 'commit_hash', 'context_file_paths', 'dynamic_checklist'],
-    on_select="rerun",
-    selection_mode="single-row",
-    hide_index=True
+                  'commit_hash', 'context_file_paths', 'dynamic_checklist']
 )
 
 # Display challenge details when selected
-try:
-    row_num = challenges_df['selection']['rows'][0]
-    selected_challenge = challenges[row_num]
+if selected_row is not None:
+    selected_challenge = get_codegen_challenge(selected_row['challenge_id'])
     
     st.subheader(f'Challenge {selected_challenge.challenge_id}')
     
@@ -135,6 +131,5 @@ try:
     st.write('**Dynamic Checklist:**')
     for item in selected_challenge.dynamic_checklist:
         st.checkbox(f"{item}")
-except:
+else:
     st.write("Select a challenge from the table to see its details")
-    pass
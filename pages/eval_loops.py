@@ -0,0 +1,88 @@
+import streamlit as st
+import altair as alt
+import pandas as pd
+from db import cache_until_changed, get_read_only_pool, show_db_error, subnet_db_path
+
+# Returns the path to the logs.db file
+logs_db_path = subnet_db_path("logging.db")
+
+st.set_page_config(layout="wide")
+
+# Returns log and error counts, start and end per loop and coroutine over the most recent num_loops loops (all if None)
+# Logs are counted once per coroutine active when they were written, and the counting and limiting are done by SQLite,
+# so only the loops profiled are expanded and a few rows per loop leave the database. Cached until new logs are written
+@cache_until_changed
+def get_coroutines(num_loops, db_path: str = logs_db_path):
+    recent = "" if num_loops is None else "AND logs.eval_loop_num > (SELECT max(eval_loop_num) FROM logs) - ?"
+    try:
+        coroutines = get_read_only_pool(db_path).query_frame(f"""
+            SELECT logs.eval_loop_num, coroutine.value AS coroutine, count(*) AS logs,
+                   sum(logs.levelname IN ('ERROR', 'CRITICAL')) AS errors, min(logs.timestamp) AS start, max(logs.timestamp) AS "end"
+            FROM logs, json_each(logs.active_coroutines) AS coroutine
+            WHERE logs.eval_loop_num != 0 {recent}
+              AND EXISTS (SELECT 1 FROM json_each(logs.active_coroutines) WHERE json_each.value = 'evaluation_task')
+            GROUP BY logs.eval_loop_num, coroutine.value
+        """, () if num_loops is None else (num_loops,))
+    except Exception as e:
+        show_db_error(e, db_path, "reading logs")
+    for column in ['start', 'end']:
+        coroutines[column] = pd.to_datetime(coroutines[column].str.replace(",", ".", regex=False), format="ISO8601")
+    return coroutines
+
+# Returns one row per evaluation loop with its start, end, duration and log/error counts
+def summarize_loops(coroutines):
+    # Every log of a loop is written while the evaluation_task coroutine is active, so its row covers the whole loop
+    loops = coroutines.loc[coroutines['coroutine'] == 'evaluation_task', ['eval_loop_num', 'start', 'end', 'logs', 'errors']].reset_index(drop=True)
+    loops['duration_s'] = (loops['end'] - loops['start']).dt.total_seconds()
+    return loops
+
+# Only profile the most recent loops
+with st.sidebar:
+    num_loops = st.selectbox("Evaluation loops to profile", [25, 50, 100, 250, "All"], index=1)
+
+coroutines = get_coroutines(None if num_loops == "All" else num_loops)
+
+if coroutines.empty:
+    st.info("No evaluation loop logs found in " + logs_db_path + ". Logs are attributed to a loop when they are written while the evaluation_task coroutine is active.")
+    st.stop()
+
+loops = summarize_loops(coroutines)
+
+st.subheader('Evaluation loop durations')
+percentiles = loops['duration_s'].quantile([0.5, 0.9, 0.95, 0.99])
+p50_col, p90_col, p95_col, p99_col, max_col = st.columns(5)
+p50_col.metric("p50", f"{percentiles[0.5]:.1f}s")
+p90_col.metric("p90", f"{percentiles[0.9]:.1f}s")
+p95_col.metric("p95", f"{percentiles[0.95]:.1f}s")
+p99_col.metric("p99", f"{percentiles[0.99]:.1f}s")
+max_col.metric("Slowest", f"{loops['duration_s'].max():.1f}s", help=f"Loop #{int(loops.loc[loops['duration_s'].idxmax(), 'eval_loop_num'])}")
+
+st.line_chart(loops.rename(columns={'eval_loop_num': 'Loop', 'duration_s': 'Duration (s)'}), x='Loop', y='Duration (s)')
+
+# Gantt style timeline, one bar per coroutine per loop
+st.subheader('Timeline')
+timeline = alt.Chart(coroutines).mark_bar().encode(
+    x=alt.X('start:T', title='Time'),
+    x2='end:T',
+    y=alt.Y('eval_loop_num:O', title='Loop', sort='descending'),
+    color=alt.Color('coroutine:N', title='Coroutine'),
+    tooltip=['eval_loop_num', 'coroutine', 'start', 'end', 'logs', 'errors']
+)
+st.altair_chart(timeline, use_container_width=True)
+
+# Which coroutines are busiest and most error prone in each loop
+st.subheader('Logs per coroutine per loop')
+st.bar_chart(coroutines, x='eval_loop_num', y='logs', color='coroutine', x_label='Loop', y_label='Logs')
+
+st.subheader('Errors per coroutine per loop')
+if coroutines['errors'].sum() > 0:
+    st.bar_chart(coroutines[coroutines['errors'] > 0], x='eval_loop_num', y='errors', color='coroutine', x_label='Loop', y_label='Errors')
+else:
+    st.info("No errors were logged in these loops")
+
+st.subheader('Slowest loops')
+st.dataframe(
+    loops.sort_values('duration_s', ascending=False),
+    column_order=['eval_loop_num', 'start', 'end', 'duration_s', 'logs', 'errors'],
+    hide_index=True
+)
@@ -0,0 +1,78 @@
+import streamlit as st
+import pandas as pd
+from contextlib import closing
+from alerts import show_anomaly_alerts
+from db import cache_until_changed, show_db_error, subnet_db_path
+from grid import table_has_rows
+from leaderboard import SCORE_HALF_LIFE, get_leaderboard, sync_leaderboard
+from sidecar import connect_sidecar
+
+# Get the absolute path to the database
+db_path = subnet_db_path("validator.db")
+
+st.set_page_config(layout="wide")
+show_anomaly_alerts()
+
+# Challenge types the leaderboard can cover (None combines every type)
+CHALLENGE_TYPES = {"Combined": None, "Codegen": ["codegen"], "Regression": ["regression"]}
+
+# What miners can be ranked by, and whether higher values rank first
+RANKINGS = {
+    "Recent score": ("recent_score", True),
+    "Mean score": ("mean_score", True),
+    "Responses": ("responses", True),
+    "Timeout rate": ("timeout_rate", False),
+    "Median processing time": ("median_processing_time", False)
+}
+
+# Columns shown and their headers
+LEADERBOARD_COLUMNS = {
+    'rank': "Rank", 'miner_hotkey': "Miner", 'node_id': "Node", 'recent_score': "Recent score", 'mean_score': "Mean score",
+    'responses': "Responses", 'timeout_rate': "Timeout rate", 'median_processing_time': "Median processing time (s)", 'last_received_at': "Last response"
+}
+
+# Miners shown per page
+LEADERBOARD_PAGE_SIZE = 50
+
+# Returns the leaderboard over the given challenge types. The responses written since the last refresh are folded
+# into the totals kept in the sidecar first, so a refresh costs the new responses and the evaluation backlog only
+@cache_until_changed
+def get_leaderboard_frame(challenge_type: str, db_path: str = db_path) -> pd.DataFrame:
+    try:
+        sync_leaderboard(db_path)
+        with closing(connect_sidecar()) as conn:
+            return get_leaderboard(conn, CHALLENGE_TYPES[challenge_type])
+    except Exception as e:
+        show_db_error(e, db_path)
+
+if not table_has_rows("responses", "1", db_path=db_path):
+    st.info("No responses found in " + db_path + ". Please ensure a miner and validator are running.")
+    st.stop()
+
+type_col, rank_col, min_col = st.columns(3)
+challenge_type = type_col.selectbox("Challenge type", list(CHALLENGE_TYPES))
+rank_by = rank_col.selectbox("Rank by", list(RANKINGS))
+min_responses = min_col.number_input("Minimum responses", min_value=0, value=0, step=10)
+leaderboard = get_leaderboard_frame(challenge_type)
+
+# Ranking and paging work on the cached leaderboard, which has a row per miner, so neither touches the database
+column, descending = RANKINGS[rank_by]
+ranked = leaderboard[leaderboard['responses'] >= min_responses].sort_values(column, ascending=not descending, na_position='last', kind="stable")
+ranked.insert(0, 'rank', range(1, len(ranked) + 1))
+
+if ranked.empty:
+    st.info("No miners have enough responses")
+    st.stop()
+
+pages = (len(ranked) - 1) // LEADERBOARD_PAGE_SIZE + 1
+page = st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, value=1) if pages > 1 else 1
+page_rows = ranked.iloc[(page - 1) * LEADERBOARD_PAGE_SIZE:page * LEADERBOARD_PAGE_SIZE]
+
+st.caption(f"{len(ranked):,} miners. The recent score weighs every score by its response's age, halving every {SCORE_HALF_LIFE.total_seconds() / 3600:g} hours.")
+st.dataframe(
+    page_rows.rename(columns=LEADERBOARD_COLUMNS),
+    column_order=list(LEADERBOARD_COLUMNS.values()),
+    hide_index=True,
+    use_container_width=True
+)
+st.caption("A response timed out if the miner never completed it (it has no completed_at). Median processing times are estimated to within 1%.")
@@ -1,55 +1,238 @@
 import streamlit as st
+import html
 import json
-import os
-import sqlite3
-from dotenv import load_dotenv
-
-# Load environment variables
-load_dotenv() 
+from collections import deque
+from contextlib import closing
+from log_index import (
+    SNIPPET_END, SNIPPET_START, build_field_filter, count_log_facet, count_logs, get_field_value_counts,
+    get_top_field_keys, parse_field_query, reset_log_facets, reset_log_fields, reset_log_fts, search_logs,
+    sync_log_facets, sync_log_fields, sync_log_fts
+)
+from log_retention import (
+    apply_log_retention, enable_incremental_vacuum, get_retention_runs, incremental_vacuum_enabled, search_archived_logs
+)
+from log_templates import get_log_templates, get_template_sample_rowids, reset_log_templates, sync_log_templates
+from db import get_read_only_pool, show_db_error, subnet_db_path
+from sidecar import SIDECAR_DB_PATH, connect_sidecar
 
 # Returns the path to the logs.db file
-try:
-    logs_db_path = os.getenv("ABSOLUTE_PATH_TO_SUBNET_REPO") + "/logging.db"
-except Exception as e:
-    st.error("You did not set your environment variable")
-    st.stop()
-
-# Returns all logs from logs.db as a list of dictionaries
-def get_logs():
+logs_db_path = subnet_db_path("logging.db")
+
+# Style shared by every rendered log message
+LOG_PRE_STYLE = "white-space: pre-wrap; word-break: break-word; margin: 2px 0 0 0; font-size: 0.85rem;"
+
+# Matches logs written while the evaluation task was running, the only logs whose eval_loop_num is meaningful
+IN_EVALUATION_TASK = "EXISTS (SELECT 1 FROM json_each(logs.active_coroutines) WHERE json_each.value = 'evaluation_task')"
+
+# Turns the sidebar selections into a parameterized WHERE clause over the logs table
+def build_log_filter(file_selection, level_selection, coroutine_selection, loop_num_selection):
+    clauses = []
+    params = []
+    if file_selection is not None:
+        clauses.append("pathname = ?")
+        params.append(file_selection)
+    if level_selection is not None:
+        clauses.append("levelname = ?")
+        params.append(level_selection)
+    if coroutine_selection:
+        # active_coroutines is stored as a JSON array, so match on its elements rather than the raw text
+        placeholders = ", ".join("?" for _ in coroutine_selection)
+        clauses.append(f"EXISTS (SELECT 1 FROM json_each(logs.active_coroutines) WHERE json_each.value IN ({placeholders}))")
+        params.extend(coroutine_selection)
+    if loop_num_selection is not None:
+        clauses.append(f"eval_loop_num = ? AND {IN_EVALUATION_TASK}")
+        params.append(loop_num_selection)
+    return " AND ".join(clauses) or "1", params
+
+# Returns the sidebar facets as {value: log count} dicts, each counted with every other selected filter applied,
+# along with the number of logs matching all filters and the total number of logs
+# Counts are read from the sidecar facet rollup, which only has to fold in the logs written since the last rerun
+def get_log_facets(file_selection, level_selection, coroutine_selection, loop_num_selection):
+    try:
+        sync_log_facets(logs_db_path)
+        with closing(connect_sidecar()) as conn:
+            files = count_log_facet(conn, "pathname", *build_log_filter(None, level_selection, coroutine_selection, loop_num_selection))
+            levels = count_log_facet(conn, "levelname", *build_log_filter(file_selection, None, coroutine_selection, loop_num_selection))
+            coroutines = count_log_facet(conn, "active_coroutines", *build_log_filter(file_selection, level_selection, [], loop_num_selection))
+            where, params = build_log_filter(file_selection, level_selection, coroutine_selection, None)
+            loop_nums = count_log_facet(conn, "eval_loop_num", f"({where}) AND eval_loop_num != 0 AND {IN_EVALUATION_TASK}", params)
+            matching = count_logs(conn, *build_log_filter(file_selection, level_selection, coroutine_selection, loop_num_selection))
+            total = count_logs(conn, "1", [])
+            return files, levels, coroutines, loop_nums, matching, total
+    except Exception as e:
+        show_db_error(e, logs_db_path, "reading logs")
+
+# Returns the options for a facet, keeping the current selection(s) even if no logs match them anymore
+def facet_options(counts, selected):
+    return sorted(set(counts) | set(selected))
+
+# Formats a facet option with its log count, e.g. "ERROR (1,204)"
+def facet_label(counts):
+    return lambda value: f"{value} ({counts.get(value, 0):,})"
+
+# Returns one page of logs matching the filter, newest first, using the rowid as a keyset cursor
+# Fetches one extra row so the caller knows whether there are older logs to load
+def get_log_page(where, params, before_rowid, page_size):
+    try:
+        if before_rowid is not None:
+            where = f"({where}) AND rowid < ?"
+            params = params + [before_rowid]
+        logs = get_read_only_pool(logs_db_path, SIDECAR_DB_PATH).query_dicts(
+            f"SELECT rowid AS rowid, * FROM logs WHERE {where} ORDER BY rowid DESC LIMIT ?", params + [page_size + 1]
+        )
+        for log in logs:
+            if 'active_coroutines' in log:
+                log['active_coroutines'] = json.loads(log['active_coroutines'])
+        return logs[:page_size], len(logs) > page_size
+    except Exception as e:
+        show_db_error(e, logs_db_path, "reading logs")
+
+# Returns the largest rowid in the logs table, a cheap index lookup used to tell whether anything new was logged
+def get_max_log_rowid():
+    try:
+        return get_read_only_pool(logs_db_path).query_one("SELECT max(rowid) FROM logs")[0] or 0
+    except Exception as e:
+        show_db_error(e, logs_db_path, "reading logs")
+
+# Returns up to limit of the newest logs matching the filter with after_rowid < rowid <= max_rowid, oldest first
+def get_new_logs(where, params, after_rowid, max_rowid, limit):
+    page_logs, _ = get_log_page(f"({where}) AND rowid > ?", params + [after_rowid], max_rowid + 1, limit)
+    return list(reversed(page_logs))
+
+# Returns one page of logs whose message matches the search query and the filter, best match first
+# The sidecar full-text index is brought up to date first, which only reads logs written since the last search
+def search_log_page(search_query, where, params, offset, page_size):
     try:
-        with sqlite3.connect(logs_db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT * FROM logs")
-            columns = [description[0] for description in cursor.description]
-            logs = []
-            for row in cursor.fetchall():
-                log = dict(zip(columns, row))
-                # Parse JSON fields once when loading from database
+        sync_log_fts(logs_db_path)
+        with get_read_only_pool(logs_db_path, SIDECAR_DB_PATH).connection() as conn:
+            logs = search_logs(conn, search_query, where, params, page_size + 1, offset)
+            for log in logs:
                 if 'active_coroutines' in log:
                     log['active_coroutines'] = json.loads(log['active_coroutines'])
-                logs.append(log)
-            return logs
+            return logs[:page_size], len(logs) > page_size
     except Exception as e:
-        st.error(f"Error reading logs: ({e})")
-        st.info("Did you forget to set your environment variable? Cave is currently searching for " + logs_db_path)
-        st.info("If you are sure you have set the environment variable, please check that the logging database exists at " + logs_db_path)
-        st.info("If you are sure the database exists, please ensure a miner and validator are running")
-        st.stop()
+        show_db_error(e, logs_db_path, "searching logs")
+
+# Brings the sidecar JSON field index up to date, parsing only the JSON logs written since the last sync
+def sync_json_fields():
+    try:
+        sync_log_fields(logs_db_path)
+    except Exception as e:
+        show_db_error(e, logs_db_path, "indexing JSON logs")
+
+# Outputs the most common JSON keys in the logs and the value distribution of a chosen key
+def output_json_field_explorer():
+    sync_json_fields()
+    with closing(connect_sidecar()) as conn:
+        top_keys = get_top_field_keys(conn)
+        if not top_keys:
+            st.info("No JSON logs found. Log with logger.info(json.dumps({...})) to make fields explorable")
+            return
+        keys_col, values_col = st.columns(2)
+        with keys_col:
+            st.dataframe([{'Key': key, 'Logs': count} for key, count in top_keys], hide_index=True, use_container_width=True)
+        with values_col:
+            key = st.selectbox("Value distribution for key", [key for key, _ in top_keys])
+            st.dataframe([{'Value': value, 'Logs': count} for value, count in get_field_value_counts(conn, key)], hide_index=True, use_container_width=True)
+            st.caption(f'Filter on a value with e.g. `{key} = "value"` in the sidebar')
+
+# Returns the mined log templates, clustering only the logs written since the last call first
+def get_templates(order_by, level_selection):
+    try:
+        sync_log_templates(logs_db_path)
+        with closing(connect_sidecar()) as conn:
+            return get_log_templates(conn, order_by, level_selection)
+    except Exception as e:
+        show_db_error(e, logs_db_path, "grouping logs")
+
+# Outputs one row per log template, with the most recent logs of the selected template underneath
+def output_grouped_logs(level_selection):
+    sort_options = {"Most recently seen": "last_seen", "Most frequent": "log_count", "Newest patterns": "first_seen"}
+    sort_selection = st.selectbox("Sort templates by", list(sort_options))
+    templates = get_templates(sort_options[sort_selection], level_selection)
+    if not templates:
+        st.info("No logs appeared. Please update your filters (or you may have no logs)")
+        return
+
+    templates_df = st.dataframe(
+        [
+            {
+                'Template': template['template'],
+                'Logs': template['log_count'],
+                'Levels': " · ".join(f"{level} {count:,}" for level, count in sorted(template['levels'].items())),
+                'First seen': template['first_seen'],
+                'Last seen': template['last_seen']
+            }
+            for template in templates
+        ],
+        on_select="rerun",
+        selection_mode="single-row",
+        hide_index=True,
+        use_container_width=True
+    )
+    st.text(f"Displaying {len(templates)} templates grouping {sum(template['log_count'] for template in templates):,} logs")
+
+    selected_rows = templates_df['selection']['rows']
+    if not selected_rows:
+        st.write("Select a template to see its most recent logs")
+        return
+    template = templates[selected_rows[0]]
+    with closing(connect_sidecar()) as conn:
+        rowids = get_template_sample_rowids(conn, template['template_id'])
+    if rowids:
+        sample_logs, _ = get_log_page(f"rowid IN ({', '.join('?' for _ in rowids)})", rowids, None, len(rowids))
+        st.markdown(f"Most recent logs for `{template['template']}`")
+        output_logs(sample_logs)
 
 # Clears all logs by deleting all rows from the logs table
 def clear_logs():
-    """Clear all logs by deleting all rows from the logs table."""
+    """Clear all logs by deleting all rows from the logs table, in small batches so the subnet's loggers are not blocked."""
+    try:
+        run = apply_log_retention(logs_db_path, max_rows=0)
+        reset_log_fts()
+        reset_log_facets()
+        reset_log_fields()
+        reset_log_templates()
+        return run
+    except Exception as e:
+        show_db_error(e, logs_db_path, "clearing log database")
+
+# Deletes (and optionally archives) logs outside the retention window, returns what it cost
+def apply_retention(max_age_days, max_rows, archive):
     try:
-        with sqlite3.connect(logs_db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute("DELETE FROM logs")
-            conn.commit()
+        return apply_log_retention(logs_db_path, max_age_days=max_age_days, max_rows=max_rows, archive=archive)
     except Exception as e:
-        st.error(f"Error clearing log database ({e})")
-        st.info("Did you forget to set your environment variable? Cave is currently searching for " + logs_db_path)
-        st.info("If you are sure you have set the environment variable, please check that the logging database exists at " + logs_db_path)
-        st.info("If you are sure the database exists, please ensure a miner and validator are running")
-        st.stop()
+        show_db_error(e, logs_db_path, "applying log retention")
+
+# Switches logging.db to incremental vacuum, which rewrites the file once
+def enable_vacuum():
+    try:
+        enable_incremental_vacuum(logs_db_path)
+    except Exception as e:
+        show_db_error(e, logs_db_path, "enabling incremental vacuum")
+
+# Outputs a one line summary of what a retention run did and cost
+def output_retention_run(run):
+    st.success(
+        f"Deleted {run['rows_deleted']:,} logs in {run['batches']:,} batches (longest batch held the write lock for {run['longest_batch_ms']:.1f} ms), "
+        f"archived {run['rows_archived']:,} logs ({run['archive_bytes'] / 1024:,.0f} KiB), reclaimed {run['pages_reclaimed']:,} pages "
+        f"({run['free_pages']:,} free pages left) in {run['seconds']:.2f}s"
+    )
+
+# Outputs the history of retention runs and a search over archived logs
+def output_retention_history(level_selection):
+    runs = get_retention_runs()
+    if runs:
+        st.dataframe(runs, column_order=['ran_at', 'policy', 'rows_deleted', 'batches', 'longest_batch_ms', 'rows_archived', 'archive_bytes', 'pages_reclaimed', 'free_pages', 'seconds'], hide_index=True)
+    else:
+        st.info("No retention runs yet")
+    archive_query = st.text_input("Search archived logs", placeholder="text to look for in archived log messages").strip()
+    if archive_query:
+        archived_logs = search_archived_logs(archive_query, level_selection)
+        for log in archived_logs:
+            log['active_coroutines'] = json.loads(log['active_coroutines'])
+        output_logs(archived_logs)
+        st.text(f"Displaying the {len(archived_logs)} most recent archived logs containing \"{archive_query}\"")
 
 # Returns the desired color of a log levelname
 def get_log_color(log_levelname):
@@ -65,11 +248,11 @@ def get_log_color(log_levelname):
         log_color = 'white'
     return log_color
 
-# Outputs a log to the dashboard, displays JSON nicely if possible
-def output_log(log):
+# Returns a log as an HTML fragment, JSON messages are collapsed into an expandable block
+def render_log_html(log):
     log_levelname = log['levelname']
     log_color = get_log_color(log_levelname)
-    
+
     # Get active coroutines and format them
     active_coroutines = []
     if 'active_coroutines' in log:
@@ -78,22 +261,72 @@ def output_log(log):
                 active_coroutines.append(f"[{coroutine.upper()} loop #{log['eval_loop_num']}]")
             else:
                 active_coroutines.append(f"[{coroutine.upper()}]")
-    
+
     # Add coroutines to the output if any are active
     coroutine_text = " " + " ".join(active_coroutines) if active_coroutines else ""
-    
-    st.markdown(f"<span style='color: gray; font-style: italic;'>{log['timestamp']}</span> — <span style='color: {log_color};'>**{log_levelname}**</span> from `{log['pathname'] + ':' + str(log['lineno'])}`<span style='color: aqua;'>{coroutine_text}</span>", unsafe_allow_html=True)
-    
-    # Check if message is valid JSON, and output accordingly
+
+    header = (
+        f"<span style='color: gray; font-style: italic;'>{html.escape(str(log['timestamp']))}</span> — "
+        f"<span style='color: {log_color}; font-weight: bold;'>{html.escape(str(log_levelname))}</span> from "
+        f"<code>{html.escape(str(log['pathname']) + ':' + str(log['lineno']))}</code>"
+        f"<span style='color: aqua;'>{html.escape(coroutine_text)}</span>"
+    )
+
+    # Check if message is JSON; if so show a one line preview that expands to the pretty printed object on click
+    message = log['message']
     try:
-        json_obj = json.loads(log['message'])
-        st.json(json_obj)
+        json_obj = json.loads(message)
     except (json.JSONDecodeError, TypeError):
-        st.text(log['message'])
-    
-    # Spacing between logs
-    st.text('\n')
-    st.text('\n')
+        json_obj = None
+    if isinstance(json_obj, (dict, list)):
+        preview = json.dumps(json_obj)
+        if len(preview) > 160:
+            preview = preview[:160] + "…"
+        body = (
+            f"<details><summary style='cursor: pointer;'><code>{html.escape(preview)}</code></summary>"
+            f"<pre style='{LOG_PRE_STYLE}'>{html.escape(json.dumps(json_obj, indent=2))}</pre></details>"
+        )
+    else:
+        body = f"<pre style='{LOG_PRE_STYLE}'>{html.escape(str(message))}</pre>"
+
+    # Show where a search matched, with the matched terms highlighted
+    if log.get('snippet'):
+        snippet = html.escape(log['snippet']).replace(SNIPPET_START, "<mark>").replace(SNIPPET_END, "</mark>")
+        header += f"<div style='margin-top: 2px;'>🔍 {snippet}</div>"
+
+    return f"<div style='padding: 6px 0; border-bottom: 1px solid rgba(128, 128, 128, 0.2);'>{header}{body}</div>"
+
+# Outputs a list of logs to the dashboard as a single pre-rendered HTML block
+# One element per batch (instead of several per log) keeps the frontend payload proportional to what is on screen
+def output_logs(logs):
+    if logs:
+        st.html("<div style='font-size: 0.9rem;'>" + "".join(render_log_html(log) for log in logs) + "</div>")
+
+# Starts the live stream over from the newest logs matching the filter
+def reset_live_stream(where, params, buffer_size):
+    max_rowid = get_max_log_rowid()
+    st.session_state.live_logs = deque(get_new_logs(where, params, 0, max_rowid, buffer_size), maxlen=buffer_size)
+    st.session_state.live_last_rowid = max_rowid
+
+# Polls logs.db for logs newer than the last one streamed and appends them to the bounded live buffer
+# Runs as a fragment so only this part of the page reruns on each poll
+def live_log_stream(where, params, buffer_size, uses_json_fields):
+    max_rowid = get_max_log_rowid()
+    if uses_json_fields and max_rowid != st.session_state.live_last_rowid:
+        sync_json_fields()
+    if max_rowid < st.session_state.live_last_rowid:
+        # The table was cleared or truncated since the last poll
+        reset_live_stream(where, params, buffer_size)
+    elif max_rowid > st.session_state.live_last_rowid:
+        st.session_state.live_logs.extend(get_new_logs(where, params, st.session_state.live_last_rowid, max_rowid, buffer_size))
+        st.session_state.live_last_rowid = max_rowid
+
+    output_logs(list(reversed(st.session_state.live_logs)))
+
+    st.divider()
+    st.text(f"Streaming the latest {len(st.session_state.live_logs)} logs (newest first, keeping at most {buffer_size})")
+    if len(st.session_state.live_logs) == 0:
+        st.info("No logs appeared yet. Please update your filters (or you may have no logs)")
 
 # Wide view
 st.set_page_config(layout="wide")
@@ -102,41 +335,121 @@ st.set_page_config(layout="wide")
 log_container = st.empty()
 
 # Initialize session state variables
-if "logs" not in st.session_state:
-    st.session_state.logs = []
-if "files" not in st.session_state:
-    st.session_state.files = []
 if "file_selection" not in st.session_state:
     st.session_state.file_selection = None
-if "levels" not in st.session_state:
-    st.session_state.levels = []
 if "level_selection" not in st.session_state:
     st.session_state.level_selection = None
+if "coroutine_selection" not in st.session_state:
+    st.session_state.coroutine_selection = []
+if "loop_num_selection" not in st.session_state:
+    st.session_state.loop_num_selection = None
+if "log_page_cursors" not in st.session_state:
+    st.session_state.log_page_cursors = []
+if "log_filter_key" not in st.session_state:
+    st.session_state.log_filter_key = None
+if "live_paused" not in st.session_state:
+    st.session_state.live_paused = False
+if "live_logs" not in st.session_state:
+    st.session_state.live_logs = None
 
 # Display logs with log container
 with log_container.container():
-    # Get logs from logs.db
-    st.session_state.logs = get_logs()
-
-    # Get a list of all unique files and levels from the logs
-    st.session_state.files = set([log['pathname'] for log in st.session_state.logs])
-    st.session_state.levels = set([log['levelname'] for log in st.session_state.logs])
-    st.session_state.coroutines = set([coroutine for log in st.session_state.logs for coroutine in log['active_coroutines']])
-    st.session_state.loop_nums = set([log['eval_loop_num'] for log in st.session_state.logs if log['eval_loop_num'] != 0])
+    # Get the unique files, levels, coroutines and loop numbers with how many logs match each
+    selections = (
+        st.session_state.file_selection,
+        st.session_state.level_selection,
+        st.session_state.coroutine_selection,
+        st.session_state.loop_num_selection
+    )
+    files, levels, coroutines, loop_nums, num_matching_logs, num_total_logs = get_log_facets(*selections)
 
     # Sidebar for filters and clearing logs
     with st.sidebar:
-        st.session_state.file_selection = st.selectbox("Filter by file", st.session_state.files, index=None)
-        st.session_state.level_selection = st.selectbox("Filter by level", st.session_state.levels, index=None)
-        st.session_state.coroutine_selection = st.multiselect("Filter by coroutine", st.session_state.coroutines)
-        st.session_state.loop_num_selection = st.selectbox("Filter by evaluation loop number", st.session_state.loop_nums, index=None)
+        search_query = st.text_input(
+            "Search log messages",
+            placeholder='"exact phrase", prefix*, hotkey',
+            help="Full-text search over log messages. Supports \"phrases\", prefix* queries and AND / OR / NOT. Results are ranked by relevance"
+        ).strip()
+        field_query = st.text_input(
+            "Filter by JSON field",
+            placeholder='status = "error" AND data.miner_hotkey = 5F...',
+            help="Filter JSON logs on their fields. Nested keys are joined with dots, conditions use = or != and are joined with AND"
+        ).strip()
+        try:
+            field_conditions = parse_field_query(field_query) if field_query else []
+        except ValueError as e:
+            st.warning(str(e))
+            field_conditions = []
+
+        # The counts are part of each option's label, so a widget is recreated whenever its counts change;
+        # the selections are kept in session state and passed back in so they survive that
+        file_options = facet_options(files, [st.session_state.file_selection] if st.session_state.file_selection is not None else [])
+        level_options = facet_options(levels, [st.session_state.level_selection] if st.session_state.level_selection is not None else [])
+        coroutine_options = facet_options(coroutines, st.session_state.coroutine_selection)
+        loop_num_options = facet_options(loop_nums, [st.session_state.loop_num_selection] if st.session_state.loop_num_selection is not None else [])
+        st.session_state.file_selection = st.selectbox(
+            "Filter by file", file_options, format_func=facet_label(files),
+            index=file_options.index(st.session_state.file_selection) if st.session_state.file_selection is not None else None
+        )
+        st.session_state.level_selection = st.selectbox(
+            "Filter by level", level_options, format_func=facet_label(levels),
+            index=level_options.index(st.session_state.level_selection) if st.session_state.level_selection is not None else None
+        )
+        st.session_state.coroutine_selection = st.multiselect(
+            "Filter by coroutine", coroutine_options, format_func=facet_label(coroutines),
+            default=st.session_state.coroutine_selection
+        )
+        st.session_state.loop_num_selection = st.selectbox(
+            "Filter by evaluation loop number", loop_num_options, format_func=facet_label(loop_nums),
+            index=loop_num_options.index(st.session_state.loop_num_selection) if st.session_state.loop_num_selection is not None else None
+        )
+
+        page_size = st.selectbox("Logs per page", [50, 100, 250, 500], index=1)
+        grouped_view = st.toggle("Group similar logs", help="Collapse repetitive logs into templates such as \"Sent challenge <*> to miner <*>\" with counts")
+        st.divider()
+        live_mode = st.toggle("Live mode", help="Poll for new logs and stream them in without reloading the page")
+        if live_mode:
+            refresh_interval = st.selectbox("Refresh interval (seconds)", [1, 2, 5, 10, 30], index=1)
+            live_buffer_size = st.selectbox("Live logs to keep on screen", [50, 100, 250, 500], index=1)
+            if st.button("Resume live logs" if st.session_state.live_paused else "Pause live logs"):
+                st.session_state.live_paused = not st.session_state.live_paused
+                st.rerun()
+        st.divider()
+        with st.expander("Log retention"):
+            keep_days = st.number_input("Keep logs from the last N days (0 keeps all)", min_value=0.0, value=7.0, step=1.0)
+            keep_rows = st.number_input("Keep at most N logs (0 keeps all)", min_value=0, value=0, step=100000)
+            archive_logs = st.checkbox("Archive logs to Parquet before deleting them", value=True)
+            if st.button("Apply retention"):
+                st.session_state.last_retention_run = apply_retention(keep_days or None, keep_rows or None, archive_logs)
+                st.session_state.live_logs = None
+                st.rerun()
+            with get_read_only_pool(logs_db_path).connection() as conn:
+                vacuum_enabled = incremental_vacuum_enabled(conn)
+            if not vacuum_enabled and st.button("Enable incremental vacuum", help="Lets retention give freed space back to the disk. Runs a one-time VACUUM that locks logging.db while it rewrites the file"):
+                enable_vacuum()
+                st.rerun()
         if st.button("Clear existing logs", type="primary"):
-            clear_logs()
+            st.session_state.last_retention_run = clear_logs()
+            st.session_state.live_logs = None
+            st.rerun()
+
+        # Recount the other facets against the new selection, once every sidebar widget has been drawn so none lose their state
+        if selections != (st.session_state.file_selection, st.session_state.level_selection, st.session_state.coroutine_selection, st.session_state.loop_num_selection):
             st.rerun()
 
     # Title and refresh text
     st.subheader("Subnet Logs")
-    st.text("Press R to refresh to see latest logs (working on a fix for this)")
+    if not live_mode:
+        st.text("Turn on live mode in the sidebar to stream in new logs as they are written")
+    elif st.session_state.live_paused:
+        st.text("Live mode is paused")
+    else:
+        st.text(f"Live mode is on, checking for new logs every {refresh_interval}s")
+
+    # Display what the last retention action did
+    if st.session_state.get("last_retention_run") is not None:
+        output_retention_run(st.session_state.last_retention_run)
+        st.session_state.last_retention_run = None
 
     # Display the selected filters
     st.divider()
@@ -149,20 +462,73 @@ with log_container.container():
         st.markdown(f"Displaying logs that occured during coroutine(s) <span style='color: aqua;'>**{' or '.join(['[' + c.upper() + ']' for c in st.session_state.coroutine_selection])}**</span>", unsafe_allow_html=True)
     if st.session_state.loop_num_selection is not None:
         st.markdown(f"Displaying logs that occured during loop number <span style='color: aquamarine;'>**{st.session_state.loop_num_selection}**</span>", unsafe_allow_html=True)
+    if field_conditions:
+        st.markdown(f"Displaying JSON logs where `{field_query}`")
+    if search_query and not live_mode:
+        st.markdown(f"Displaying logs matching `{search_query}`")
+    elif search_query:
+        st.markdown("Search is not applied in live mode, turn live mode off to see search results")
     st.divider()
 
-    # Display the logs that match the selected filters
-    num_logs_ouputted = 0
-    for log in reversed(st.session_state.logs):
-        if (st.session_state.file_selection is None or log['pathname'] in st.session_state.file_selection) and \
-           (st.session_state.level_selection is None or log['levelname'] in st.session_state.level_selection) and \
-           (st.session_state.coroutine_selection == [] or any(coroutine in log['active_coroutines'] for coroutine in st.session_state.coroutine_selection)) and \
-           (st.session_state.loop_num_selection is None or (log['eval_loop_num'] == st.session_state.loop_num_selection and 'evaluation_task' in log['active_coroutines'])):
-            output_log(log)
-            num_logs_ouputted += 1
-    
-    # Output the number of logs that match the selected filters
-    st.divider()
-    st.text(f"Displayed {num_logs_ouputted} logs out of {len(st.session_state.logs)} total logs that match the selected filters (if applicable)")
-    if num_logs_ouputted == 0:
-        st.info("No logs appeared. Please update your filters (or you may have no logs)")
+    # Go back to the newest page whenever the filters change, since the old cursors no longer apply
+    where, params = build_log_filter(
+        st.session_state.file_selection,
+        st.session_state.level_selection,
+        st.session_state.coroutine_selection,
+        st.session_state.loop_num_selection
+    )
+    if field_conditions:
+        sync_json_fields()
+        field_where, field_params = build_field_filter(field_conditions)
+        where, params = f"({where}) AND {field_where}", params + field_params
+    filter_key = (where, tuple(params), page_size, search_query)
+    if st.session_state.log_filter_key != filter_key:
+        st.session_state.log_filter_key = filter_key
+        st.session_state.log_page_cursors = []
+        st.session_state.live_logs = None
+
+    # In live mode, stream the newest logs instead of showing a page
+    if live_mode:
+        if st.session_state.live_logs is None or st.session_state.live_logs.maxlen != live_buffer_size:
+            reset_live_stream(where, params, live_buffer_size)
+        run_every = None if st.session_state.live_paused else refresh_interval
+        st.fragment(live_log_stream, run_every=run_every)(where, params, live_buffer_size, bool(field_conditions))
+    else:
+        if st.toggle("Show JSON field explorer"):
+            output_json_field_explorer()
+            st.divider()
+        if st.toggle("Show retention history and archived logs"):
+            output_retention_history(st.session_state.level_selection)
+            st.divider()
+
+        if grouped_view:
+            # Templates are counted over all logs, so only the level filter applies to this view
+            output_grouped_logs(st.session_state.level_selection)
+        else:
+            # Display one page of the logs that match the selected filters (and the search, ranked by relevance)
+            page_num = len(st.session_state.log_page_cursors) + 1
+            if search_query:
+                page_logs, has_older_logs = search_log_page(search_query, where, params, (page_num - 1) * page_size, page_size)
+            else:
+                before_rowid = st.session_state.log_page_cursors[-1] if st.session_state.log_page_cursors else None
+                page_logs, has_older_logs = get_log_page(where, params, before_rowid, page_size)
+            output_logs(page_logs)
+
+            # Output the page position and controls for moving between pages
+            st.divider()
+            order_text = "best match first" if search_query else "newest first"
+            if search_query or field_conditions:
+                st.text(f"Displaying page {page_num} ({len(page_logs)} logs, {order_text}) out of {num_total_logs:,} total logs")
+            else:
+                st.text(f"Displaying page {page_num} ({len(page_logs)} logs, {order_text}) out of {num_matching_logs:,} logs that match the selected filters ({num_total_logs:,} total)")
+            if len(page_logs) == 0:
+                st.info("No logs appeared. Please update your filters (or you may have no logs)")
+            newer_col, older_col = st.columns(2)
+            with newer_col:
+                if st.button("Newer logs", disabled=page_num == 1, use_container_width=True):
+                    st.session_state.log_page_cursors.pop()
+                    st.rerun()
+            with older_col:
+                if st.button("More results" if search_query else "Load older logs", disabled=not has_older_logs, use_container_width=True):
+                    st.session_state.log_page_cursors.append(page_logs[-1]['rowid'])
+                    st.rerun()
@@ -0,0 +1,120 @@
+import streamlit as st
+import pandas as pd
+from contextlib import closing
+from typing import List, Optional, Tuple
+from alerts import show_anomaly_alerts
+from db import cache_until_changed, get_read_only_pool, show_db_error, subnet_db_path
+from grid import table_has_rows
+from patch_index import NEAR_DUPLICATE_SIMILARITY, get_cluster_responses, get_duplicate_clusters, sync_patch_index
+from sidecar import connect_sidecar
+
+# Get the absolute path to the database
+db_path = subnet_db_path("validator.db")
+
+st.set_page_config(layout="wide")
+show_anomaly_alerts()
+
+# How patches are matched
+MATCHES = {"Exact duplicates": False, f"Near duplicates (≥{NEAR_DUPLICATE_SIMILARITY:.0%} similar)": True}
+
+# Whether clusters are formed within each challenge or across all of them
+SCOPES = {"Per challenge": True, "Across challenges": False}
+
+# Distinct patches of a cluster shown, the most submitted first
+MAX_PATCH_TABS = 10
+
+# Returns the sorted distinct values of comma separated lists
+def distinct_values(lists: pd.Series) -> List[str]:
+    return sorted(set(','.join(lists.dropna()).split(',')) - {''})
+
+# Returns one row per duplicate cluster and the patches in it. The patches written since the last refresh are hashed
+# and signed into the sidecar index first, and near duplicates are found at that point through its LSH buckets,
+# so a refresh only groups the index and never compares patches pairwise
+@cache_until_changed
+def get_clusters(near_duplicates: bool, per_challenge: bool, db_path: str = db_path) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    try:
+        sync_patch_index(db_path)
+        with closing(connect_sidecar()) as conn:
+            patches = get_duplicate_clusters(conn, near_duplicates, per_challenge)
+    except Exception as e:
+        show_db_error(e, db_path)
+    clusters = patches.groupby('cluster', as_index=False).agg(
+        challenge_id=('scope', 'first'), responses=('responses', 'sum'), patches=('patch_id', 'count'),
+        challenges=('challenge_ids', lambda ids: len(distinct_values(ids))), miner_hotkeys=('miner_hotkeys', distinct_values),
+        first_received_at=('first_received_at', 'min'), last_received_at=('last_received_at', 'max')
+    )
+    clusters['miners'] = clusters['miner_hotkeys'].str.len()
+    return clusters.sort_values(['responses', 'cluster'], ascending=[False, True], ignore_index=True), patches
+
+# Returns the responses of one cluster (the patch ids are a tuple so they can be part of the cache key)
+@cache_until_changed
+def get_responses(patch_ids: Tuple[int, ...], challenge_id: Optional[str], db_path: str = db_path) -> pd.DataFrame:
+    try:
+        with closing(connect_sidecar()) as conn:
+            return get_cluster_responses(conn, list(patch_ids), challenge_id)
+    except Exception as e:
+        show_db_error(e, db_path)
+
+# Returns the patch of one response, to show a cluster's patches without reading them in the listing
+@cache_until_changed
+def get_patch(response_id: int, db_path: str = db_path) -> str:
+    try:
+        return get_read_only_pool(db_path).query_one(
+            """
+            SELECT coalesce(cr.response_patch, rr.response_patch)
+            FROM responses r
+            LEFT JOIN codegen_responses cr ON cr.response_id = r.response_id
+            LEFT JOIN regression_responses rr ON rr.response_id = r.response_id
+            WHERE r.response_id = ?
+            """,
+            (response_id,)
+        )[0]
+    except Exception as e:
+        show_db_error(e, db_path)
+
+if not table_has_rows("responses", "1", db_path=db_path):
+    st.info("No responses found in " + db_path + ". Please ensure a miner and validator are running.")
+    st.stop()
+
+match_col, scope_col, miners_col = st.columns(3)
+near_duplicates = MATCHES[match_col.selectbox("Match", list(MATCHES))]
+per_challenge = SCOPES[scope_col.selectbox("Clusters", list(SCOPES))]
+across_miners = miners_col.checkbox("Only clusters spanning several miners", value=True)
+clusters, patches = get_clusters(near_duplicates, per_challenge)
+if across_miners:
+    clusters = clusters[clusters['miners'] > 1].reset_index(drop=True)
+
+clusters_col, responses_col, miners_col = st.columns(3)
+clusters_col.metric("Duplicate clusters", f"{len(clusters):,}")
+responses_col.metric("Responses in them", f"{clusters['responses'].sum():,}")
+miners_col.metric("Miners involved", f"{len(set().union(*clusters['miner_hotkeys'])) if len(clusters) else 0:,}")
+
+if clusters.empty:
+    st.info("No duplicate patches found")
+    st.stop()
+
+st.caption("Select a cluster to see its responses and patches")
+selection = st.dataframe(
+    clusters,
+    column_order=(['challenge_id'] if per_challenge else ['challenges']) + ['responses', 'patches', 'miners', 'miner_hotkeys', 'first_received_at', 'last_received_at'],
+    on_select="rerun",
+    selection_mode="single-row",
+    hide_index=True,
+    use_container_width=True,
+    key=f"patch_clusters_{near_duplicates}_{per_challenge}_{across_miners}"
+)
+
+selected_rows = selection['selection']['rows']
+if selected_rows:
+    cluster = clusters.iloc[selected_rows[0]]
+    patch_ids = tuple(patches.loc[patches['cluster'] == cluster['cluster'], 'patch_id'].tolist())
+    responses = get_responses(patch_ids, cluster['challenge_id'] if per_challenge else None)
+    st.subheader(f"{cluster['responses']:,} responses from {cluster['miners']:,} miners" + (f" to challenge {cluster['challenge_id']}" if per_challenge else ""))
+    st.dataframe(responses, hide_index=True, use_container_width=True)
+
+    # One tab per distinct patch, showing the patch of the first response that submitted it
+    first_responses = responses.groupby('patch_hash', sort=False)['response_id'].agg(['first', 'count']).sort_values('count', ascending=False, kind="stable").head(MAX_PATCH_TABS)
+    tabs = st.tabs([f"{patch_hash[:12]} ({count:,})" for patch_hash, count in first_responses['count'].items()])
+    for tab, response_id in zip(tabs, first_responses['first']):
+        with tab:
+            st.code(get_patch(int(response_id)), language='diff')
@@ -1,21 +1,38 @@
 import streamlit as st
-from datetime import datetime
-from typing import Optional, List
-import sqlite3
-from dotenv import load_dotenv
-import os
-
-# Load environment variables
-load_dotenv() 
+from contextlib import closing
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+import pandas as pd
+from alerts import show_anomaly_alerts
+from db import (
+    cache_until_changed, create_index, duration_column, get_read_only_pool, index_exists, show_db_error, subnet_db_path, text_stats_columns
+)
+from grid import GridFilter, PaginatedGrid, get_distinct_values
+from response_queue import get_backlog, get_queue_minutes, sync_response_queue
+from sidecar import connect_sidecar
 
 # Get the absolute path to the database
-try:
-    db_path = os.getenv("ABSOLUTE_PATH_TO_SUBNET_REPO") + "/validator.db"
-except Exception as e:
-    st.error("You did not set your environment variable")
-    st.stop()
+db_path = subnet_db_path("validator.db")
 
 st.set_page_config(layout="wide")
+show_anomaly_alerts()
+
+# Pending responses only, for the filter options
+PENDING_SOURCE = "(SELECT node_id, miner_hotkey FROM responses WHERE evaluated = 0)"
+
+# Optional index that serves counting and paging pending responses newest first from an index range instead of a full scan
+PENDING_INDEX = "idx_responses_evaluated_received_at"
+
+# Throughput is measured over this trailing window to estimate how long the backlog takes to drain
+RATE_WINDOW = timedelta(minutes=30)
+
+# How far back the throughput chart can go, with the width of each of its points
+THROUGHPUT_WINDOWS = {
+    "Last hour": (timedelta(hours=1), "1min"),
+    "Last 6 hours": (timedelta(hours=6), "5min"),
+    "Last 24 hours": (timedelta(days=1), "15min"),
+    "Last 7 days": (timedelta(days=7), "2h")
+}
 
 class Response:
     def __init__(
@@ -81,102 +98,140 @@ class Response:
             response_patch=row[11]
         )
 
-def get_pending_responses(db_path: str = db_path) -> List[Response]:
+@cache_until_changed
+def get_pending_response(response_id: int, db_path: str = db_path) -> Response:
     """
-    Read all pending (unevaluated) responses from the database and return them as a list of Response objects.
+    Read a single response by its id, for the details view.
     
     Args:
+        response_id (int): The response to read
         db_path (str): Path to the SQLite database file
         
     Returns:
-        List[Response]: List of Response objects
+        Response: The response
     """
     try:
-        with sqlite3.connect(db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                SELECT r.response_id, r.challenge_id, c.type, r.miner_hotkey, 
-                       r.node_id, r.processing_time, r.received_at, r.completed_at, 
-                       r.evaluated, r.score, r.evaluated_at, r.response_patch
-                FROM responses r
-                JOIN challenges c ON r.challenge_id = c.challenge_id
-                WHERE r.evaluated = 0
-                ORDER BY r.received_at DESC
-            """)
-            return [Response.from_db_row(row) for row in cursor.fetchall()]
+        row = get_read_only_pool(db_path).query_one("""
+            SELECT r.response_id, r.challenge_id, c.type, r.miner_hotkey, 
+                   r.node_id, r.processing_time, r.received_at, r.completed_at, 
+                   r.evaluated, r.score, r.evaluated_at, r.response_patch
+            FROM responses r
+            JOIN challenges c ON r.challenge_id = c.challenge_id
+            WHERE r.response_id = ?
+        """, (response_id,))
+        return Response.from_db_row(row)
     except Exception as e:
-        st.error(f"Error reading from validator.db ({e})")
-        st.info("Did you forget to set your environment variable? Cave is currently searching for " + db_path)
-        st.info("If you are sure you have set the environment variable, please check that the database file exists at " + db_path)
-        st.info("If you are sure the file exists, please ensure a miner and validator are running")
-        st.stop()
-
-# Get and process pending responses
-responses = get_pending_responses()
-
-for response in responses:
-    response.processing_time = str(response.completed_at - response.received_at).split('.')[0]
+        show_db_error(e, db_path)
 
-responses_dict = [response.to_dict() for response in responses]
+@cache_until_changed
+def get_queue_health(db_path: str = db_path) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Read the evaluation queue's backlog per challenge type and its arrivals and evaluations per minute.
+    Both come from the sidecar, which only folds in new responses and checks the pending ones for evaluations.
+    
+    Args:
+        db_path (str): Path to the SQLite database file
+        
+    Returns:
+        Tuple[pd.DataFrame, pd.DataFrame]: The backlog per type and the arrivals and evaluations per minute over the longest throughput window
+    """
+    try:
+        sync_response_queue(db_path)
+        with closing(connect_sidecar()) as conn:
+            return get_backlog(conn), get_queue_minutes(conn, datetime.now() - max(window for window, _ in THROUGHPUT_WINDOWS.values()))
+    except Exception as e:
+        show_db_error(e, db_path)
+
+# Display whether the evaluator is keeping up with incoming responses
+st.subheader('Queue health')
+backlog, queue_minutes = get_queue_health()
+now = datetime.now()
+recent = queue_minutes[queue_minutes['minute'].between(now - RATE_WINDOW, now)]
+evaluation_rate = recent['evaluations'].sum() / (RATE_WINDOW / timedelta(minutes=1))
+arrival_rate = recent['arrivals'].sum() / (RATE_WINDOW / timedelta(minutes=1))
+pending_total = int(backlog['pending'].sum())
+oldest_received_at = pd.to_datetime(backlog['oldest_received_at'], format="ISO8601", errors="coerce").min()
+if pending_total == 0:
+    drain_time = "Empty"
+elif evaluation_rate > arrival_rate:
+    drain_time = str(timedelta(minutes=round(pending_total / (evaluation_rate - arrival_rate))))
+else:
+    drain_time = "Not draining"
+pending_col, oldest_col, evaluations_col, arrivals_col, drain_col = st.columns(5)
+pending_col.metric("Pending", f"{pending_total:,}")
+oldest_col.metric("Oldest pending", str(now - oldest_received_at).split(".")[0] if pd.notna(oldest_received_at) else "-", help="How long the oldest pending response has been waiting")
+evaluations_col.metric("Evaluations / min", f"{evaluation_rate:.1f}", help=f"Over the last {RATE_WINDOW.seconds // 60} minutes")
+arrivals_col.metric("Arrivals / min", f"{arrival_rate:.1f}", help=f"Over the last {RATE_WINDOW.seconds // 60} minutes")
+drain_col.metric("Estimated drain time", drain_time, help="Pending responses divided by how much faster responses are evaluated than they arrive")
+
+backlog_col, throughput_col = st.columns([1, 2])
+with backlog_col:
+    st.bar_chart(backlog, x='type', y='pending', x_label='Challenge type', y_label='Pending responses')
+with throughput_col:
+    throughput_window, point_width = THROUGHPUT_WINDOWS[st.selectbox("Throughput over", list(THROUGHPUT_WINDOWS))]
+    window_minutes = queue_minutes[queue_minutes['minute'].between(now - throughput_window, now)]
+    if window_minutes.empty:
+        st.info("No responses arrived or were evaluated in this window")
+    else:
+        # Average the per minute counts over each point, so the rates are comparable between windows
+        throughput = window_minutes.set_index('minute').resample(point_width).sum() / (pd.Timedelta(point_width) / pd.Timedelta(minutes=1))
+        st.line_chart(throughput.rename(columns={'arrivals': 'Arrivals / min', 'evaluations': 'Evaluations / min'}), y_label='Responses per minute')
+
+pending_responses_grid = PaginatedGrid(
+    key="pending_responses",
+    db_path=db_path,
+    select=f"""
+        r.response_id, r.challenge_id, c.type, r.miner_hotkey, r.node_id,
+        {duration_column('r.received_at', 'r.completed_at', 'processing_time')}, r.received_at, r.completed_at,
+        {text_stats_columns('r.response_patch', 'patch')}
+    """,
+    source="responses r JOIN challenges c ON r.challenge_id = c.challenge_id",
+    primary_key="r.response_id",
+    # received_at is set when a response is stored, so it is sorted on directly (not through coalesce),
+    # which lets the optional PENDING_INDEX serve the newest pending responses without a sort
+    sort_options={
+        "Received at": "r.received_at",
+        "Response ID": "r.response_id",
+        "Node ID": "coalesce(r.node_id, -1)"
+    },
+    where="r.evaluated = 0",
+    filters=[
+        GridFilter("Challenge Type", "c.type", "choice", get_distinct_values("challenges", "type", db_path=db_path)),
+        GridFilter("Node ID", "r.node_id", "choice", get_distinct_values(PENDING_SOURCE, "node_id", db_path=db_path)),
+        GridFilter("Miner Hotkey", "r.miner_hotkey", "choice", get_distinct_values(PENDING_SOURCE, "miner_hotkey", db_path=db_path))
+    ],
+    timestamp_columns=['received_at', 'completed_at']
+)
 
-if len(responses) == 0:
+if not pending_responses_grid.has_rows():
     st.info("No pending responses found in " + db_path + ". All responses have been evaluated.")
     st.stop()
 
 # Display pending responses table
 st.subheader('Pending Responses')
-st.write(f"Found {len(responses)} pending responses")
-
-# Add filters in the sidebar
-with st.sidebar:
-    st.subheader("Filters")
-    
-    # Filter by challenge type
-    types = sorted(list(set(r['type'] for r in responses_dict)))
-    selected_type = st.selectbox("Challenge Type", ["All"] + types)
-    
-    # Filter by node
-    nodes = sorted(list(set(r['node_id'] for r in responses_dict if r['node_id'] is not None)))
-    selected_node = st.selectbox("Node ID", ["All"] + [str(n) for n in nodes])
-    
-    # Filter by miner
-    miners = sorted(list(set(r['miner_hotkey'] for r in responses_dict)))
-    selected_miner = st.selectbox("Miner Hotkey", ["All"] + miners)
-
-# Apply filters
-filtered_responses = responses_dict
-if selected_type != "All":
-    filtered_responses = [r for r in filtered_responses if r['type'] == selected_type]
-if selected_node != "All":
-    filtered_responses = [r for r in filtered_responses if str(r['node_id']) == selected_node]
-if selected_miner != "All":
-    filtered_responses = [r for r in filtered_responses if r['miner_hotkey'] == selected_miner]
-
-# Display filtered responses
-responses_df = st.dataframe(
-    filtered_responses,
-    column_order=['response_id', 'challenge_id', 'type', 'miner_hotkey', 'node_id', 'processing_time', 
-                 'received_at', 'completed_at', 'response_patch'],
-    on_select="rerun",
-    selection_mode="single-row",
-    hide_index=True
+selected_row = pending_responses_grid.render(
+    column_order=['response_id', 'challenge_id', 'type', 'miner_hotkey', 'node_id', 'processing_time',
+                  'received_at', 'completed_at', 'patch_size', 'patch_lines']
 )
 
+if not index_exists(PENDING_INDEX, db_path=db_path):
+    if st.button("Index pending responses", help="Counting and paging pending responses currently scans every response. This creates an index on (evaluated, received_at) in validator.db, which locks the database while it is built and is then kept up to date by the validator"):
+        create_index(db_path, PENDING_INDEX, "responses", "evaluated, received_at")
+        st.rerun()
+
 # Display response details when selected
-try:
-    row_num = responses_df['selection']['rows'][0]
-    selected_response = filtered_responses[row_num]
+if selected_row is not None:
+    selected_response = get_pending_response(int(selected_row['response_id']))
     
     st.subheader('Response Details')
-    st.write(f"**Challenge Type:** {selected_response['type']}")
-    st.write(f"**Miner:** `{selected_response['miner_hotkey']}`")
-    st.write(f"**Node ID:** {selected_response['node_id']}")
-    st.write(f"**Processing Time:** {selected_response['processing_time']}")
-    st.write(f"**Received At:** {selected_response['received_at']}")
-    st.write(f"**Completed At:** {selected_response['completed_at']}")
+    st.write(f"**Challenge Type:** {selected_response.type}")
+    st.write(f"**Miner:** `{selected_response.miner_hotkey}`")
+    st.write(f"**Node ID:** {selected_response.node_id}")
+    st.write(f"**Processing Time:** {selected_row['processing_time']}")
+    st.write(f"**Received At:** {selected_response.received_at.isoformat() if selected_response.received_at else None}")
+    st.write(f"**Completed At:** {selected_response.completed_at.isoformat() if selected_response.completed_at else None}")
     
     st.subheader('Response Patch')
-    st.code(selected_response['response_patch'], language='diff')
-except:
+    st.code(selected_response.response_patch, language='diff')
+else:
     st.write("Select a response to see its details")
-    pass 
\ No newline at end of file
@@ -1,22 +1,16 @@
 import streamlit as st
 from datetime import datetime
 from typing import Optional, List
-import sqlite3
 import json
-from dotenv import load_dotenv
-import os
-
-# Load environment variables
-load_dotenv() 
+from alerts import show_anomaly_alerts
+from db import cache_until_changed, get_read_only_pool, show_db_error, subnet_db_path
+from grid import GridFilter, PaginatedGrid
 
 # Get the absolute path to the database
-try:
-    db_path = os.getenv("ABSOLUTE_PATH_TO_SUBNET_REPO") + "/validator.db"
-except Exception as e:
-    st.error("You did not set your environment variable")
-    st.stop()
+db_path = subnet_db_path("validator.db")
 
 st.set_page_config(layout="wide")
+show_anomaly_alerts()
 
 class RegressionChallenge:
     def __init__(
@@ -58,57 +52,59 @@ class RegressionChallenge:
             context_file_paths=json.loads(row[5])
         )
 
-def get_all_regression_challenges(db_path: str = db_path) -> List[RegressionChallenge]:
+@cache_until_changed
+def get_regression_challenge(challenge_id: str, db_path: str = db_path) -> RegressionChallenge:
     """
-    Read all regression challenges from the database and return them as a list of RegressionChallenge objects.
+    Read a single regression challenge by its id, for the details view.
     
     Args:
+        challenge_id (str): The challenge to read
         db_path (str): Path to the SQLite database file
         
     Returns:
-        List[RegressionChallenge]: List of RegressionChallenge objects
+        RegressionChallenge: The challenge
     """
     try:
-        with sqlite3.connect(db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                SELECT rc.challenge_id, c.created_at, rc.problem_statement, 
-                       rc.repository_url, rc.commit_hash, rc.context_file_paths
-                FROM regression_challenges rc
-                JOIN challenges c ON rc.challenge_id = c.challenge_id
-                WHERE c.type = 'regression'
-            """)
-            return [RegressionChallenge.from_db_row(row) for row in cursor.fetchall()]
+        row = get_read_only_pool(db_path).query_one("""
+            SELECT rc.challenge_id, c.created_at, rc.problem_statement, 
+                   rc.repository_url, rc.commit_hash, rc.context_file_paths
+            FROM regression_challenges rc
+            JOIN challenges c ON rc.challenge_id = c.challenge_id
+            WHERE rc.challenge_id = ?
+        """, (challenge_id,))
+        return RegressionChallenge.from_db_row(row)
     except Exception as e:
-        st.error(f"Error reading from validator.db ({e})")
-        st.info("Did you forget to set your environment variable? Cave is currently searching for " + db_path)
-        st.info("If you are sure you have set the environment variable, please check that the database file exists at " + db_path)
-        st.info("If you are sure the file exists, please ensure a miner and validator are running")
-        st.stop()
+        show_db_error(e, db_path)
 
-# Get all regression challenges
-challenges = get_all_regression_challenges()
-challenges_dict = [challenge.to_dict() for challenge in challenges]
+regression_challenges_grid = PaginatedGrid(
+    key="regression_challenges",
+    db_path=db_path,
+    select="rc.challenge_id, c.created_at, rc.problem_statement, rc.repository_url, rc.commit_hash, rc.context_file_paths",
+    source="regression_challenges rc JOIN challenges c ON rc.challenge_id = c.challenge_id",
+    primary_key="rc.challenge_id",
+    sort_options={"Created at": "coalesce(c.created_at, '')", "Challenge ID": "rc.challenge_id"},
+    where="c.type = 'regression'",
+    filters=[
+        GridFilter("Repository URL", "rc.repository_url", "text"),
+        GridFilter("Created at", "c.created_at", "date_range")
+    ],
+    timestamp_columns=['created_at']
+)
 
-if len(challenges) == 0:
+if not regression_challenges_grid.has_rows():
     st.info("No regression challenges found in " + db_path + ". Please ensure a miner and validator are running. It may be the case that everything is fine, but your regression_challenges table is empty.")
     st.stop()
 
 # Display challenges table
 st.subheader('Regression Challenges table')
-challenges_df = st.dataframe(
-    challenges_dict,
+selected_row = regression_challenges_grid.render(
     column_order=['challenge_id', 'created_at', 'problem_statement', 'repository_url', 
-                 'commit_hash', 'context_file_paths'],
-    on_select="rerun",
-    selection_mode="single-row",
-    hide_index=True
+                  'commit_hash', 'context_file_paths']
 )
 
 # Display challenge details when selected
-try:
-    row_num = challenges_df['selection']['rows'][0]
-    selected_challenge = challenges[row_num]
+if selected_row is not None:
+    selected_challenge = get_regression_challenge(selected_row['challenge_id'])
     
     st.subheader(f'Challenge {selected_challenge.challenge_id}')
     
@@ -126,6 +122,5 @@ try:
     st.write('**Context Files:**')
     for i, file_path in enumerate(selected_challenge.context_file_paths, 1):
         st.write(f"{i}. `{file_path}`")
-except:
+else:
     st.write("Select a challenge from the table to see its details")
-    pass 
\ No newline at end of file
@@ -1,81 +1,73 @@
 import streamlit as st
-from datetime import datetime
-from typing import Optional, List
-import sqlite3
-from dotenv import load_dotenv
-import os
-from models import RegressionResponse
-
-# Load environment variables
-load_dotenv() 
+from alerts import show_anomaly_alerts
+from db import cache_until_changed, duration_column, get_read_only_pool, show_db_error, subnet_db_path, text_stats_columns
+from grid import GridFilter, PaginatedGrid
 
 # Get the absolute path to the database
-try:
-    db_path = os.getenv("ABSOLUTE_PATH_TO_SUBNET_REPO") + "/validator.db"
-except Exception as e:
-    st.error("You did not set your environment variable")
-    st.stop()
+db_path = subnet_db_path("validator.db")
 
 st.set_page_config(layout="wide")
+show_anomaly_alerts()
 
-def get_regression_responses(db_path: str = db_path) -> List[RegressionResponse]:
+@cache_until_changed
+def get_regression_response_patch(response_id: int, db_path: str = db_path) -> str:
     """
-    Read all regression responses from the database and return them as a list of RegressionResponse objects.
+    Read the patch of a single regression response by its id.
     
     Args:
+        response_id (int): The response whose patch to read
         db_path (str): Path to the SQLite database file
         
     Returns:
-        List[RegressionResponse]: List of RegressionResponse objects
+        str: The response patch
     """
     try:
-        with sqlite3.connect(db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                SELECT r.response_id, r.challenge_id, r.miner_hotkey, r.node_id, 
-                       r.processing_time, r.received_at, r.completed_at, 
-                       r.evaluated, r.score, r.evaluated_at, rr.response_patch
-                FROM responses r
-                JOIN regression_responses rr ON r.response_id = rr.response_id
-                JOIN challenges c ON r.challenge_id = c.challenge_id
-                WHERE c.type = 'regression'
-            """)
-            return [RegressionResponse.from_db_row(row) for row in cursor.fetchall()]
+        return get_read_only_pool(db_path).query_one("SELECT response_patch FROM regression_responses WHERE response_id = ?", (response_id,))[0]
     except Exception as e:
-        st.error(f"Error reading from validator.db ({e})")
-        st.info("Did you forget to set your environment variable? Cave is currently searching for " + db_path)
-        st.info("If you are sure you have set the environment variable, please check that the database file exists at " + db_path)
-        st.info("If you are sure the file exists, please ensure a miner and validator are running")
-        st.stop()
-
-# Get and process responses
-responses = get_regression_responses()
+        show_db_error(e, db_path)
 
-for response in responses:
-    response.processing_time = str(response.completed_at - response.received_at).split('.')[0]
-
-responses_dict = [response.to_dict() for response in responses]
+# Patches are only measured in the listing, the selected response's patch is read on its own
+regression_responses_grid = PaginatedGrid(
+    key="regression_responses",
+    db_path=db_path,
+    select=f"""
+        r.response_id, r.challenge_id, r.miner_hotkey, r.node_id,
+        {duration_column('r.received_at', 'r.completed_at', 'processing_time')}, r.received_at, r.completed_at,
+        r.evaluated, r.score, r.evaluated_at, {text_stats_columns('rr.response_patch', 'patch')}
+    """,
+    source="responses r JOIN regression_responses rr ON r.response_id = rr.response_id JOIN challenges c ON r.challenge_id = c.challenge_id",
+    primary_key="r.response_id",
+    sort_options={
+        "Response ID": "r.response_id",
+        "Received at": "coalesce(r.received_at, '')",
+        "Score": "coalesce(r.score, -1)",
+        "Node ID": "coalesce(r.node_id, -1)"
+    },
+    where="c.type = 'regression'",
+    filters=[
+        GridFilter("Node ID", "r.node_id", "integer"),
+        GridFilter("Miner hotkey", "r.miner_hotkey", "text"),
+        GridFilter("Evaluated", "r.evaluated", "boolean"),
+        GridFilter("Received at", "r.received_at", "date_range")
+    ],
+    timestamp_columns=['received_at', 'completed_at', 'evaluated_at'],
+    boolean_columns=['evaluated']
+)
 
-if len(responses) == 0:
+if not regression_responses_grid.has_rows():
     st.info("No regression responses found in " + db_path + ". Please ensure a miner and validator are running.")
     st.stop()
 
 # Display responses table
 st.subheader('Regression Responses')
-responses_df = st.dataframe(
-    responses_dict,
+selected_row = regression_responses_grid.render(
     column_order=['response_id', 'challenge_id', 'miner_hotkey', 'node_id', 'processing_time', 
-                 'received_at', 'completed_at', 'evaluated', 'score', 'evaluated_at', 'response_patch'],
-    on_select="rerun",
-    selection_mode="single-row",
-    hide_index=True
+                  'received_at', 'completed_at', 'evaluated', 'score', 'evaluated_at', 'patch_size', 'patch_lines']
 )
 
-try:
-    row_num = responses_df['selection']['rows'][0]
-    selected_response = responses_dict[row_num]
+if selected_row is not None:
+    response_id = int(selected_row['response_id'])
     st.subheader('Response patch')
-    st.code(selected_response['response_patch'], language='diff')
-except:
+    st.code(get_regression_response_patch(response_id), language='diff')
+else:
     st.write("Select a response to see the patch")
-    pass 
\ No newline at end of file
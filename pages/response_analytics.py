@@ -0,0 +1,140 @@
+import streamlit as st
+import altair as alt
+import numpy as np
+import pandas as pd
+from datetime import timedelta
+from typing import Optional, Tuple
+from alerts import show_anomaly_alerts
+from db import cache_until_changed, first_id_since, format_like, get_read_only_pool, show_db_error, subnet_db_path
+from grid import table_has_rows
+
+# Get the absolute path to the database
+db_path = subnet_db_path("validator.db")
+
+st.set_page_config(layout="wide")
+show_anomaly_alerts()
+
+# Metrics that can be analyzed, as SQL over responses r (NULL where a response has no value yet)
+METRICS = {
+    "Processing time (s)": "r.processing_time",
+    "Evaluation delay (s)": "CASE WHEN r.evaluated THEN (julianday(r.evaluated_at) - julianday(r.received_at)) * 86400 END",
+    "Score": "r.score"
+}
+
+# What the metrics can be broken down by
+BREAKDOWNS = {"Challenge type": "c.type", "Miner": "r.miner_hotkey", "Node": "r.node_id"}
+
+# Time windows that can be analyzed, ending at the newest response (None analyzes every response)
+TIME_WINDOWS = {
+    "Last 24 hours": timedelta(days=1),
+    "Last 7 days": timedelta(days=7),
+    "Last 30 days": timedelta(days=30),
+    "All time": None
+}
+
+# Histogram bins spanning the metric's range, percentiles are interpolated within a bin
+HISTOGRAM_BINS = 200
+
+# Percentiles reported per group
+PERCENTILES = [0.5, 0.9, 0.99]
+
+# Returns the condition selecting responses received in a window ending at the newest response, and its parameters.
+# The window starts at an id found by binary search, so it doesn't scan the unindexed received_at column
+@cache_until_changed
+def get_window_condition(window: Optional[timedelta], db_path: str = db_path) -> Tuple[str, tuple]:
+    if window is None:
+        return "1", ()
+    try:
+        pool = get_read_only_pool(db_path)
+        newest = pool.query_one("SELECT received_at FROM responses ORDER BY response_id DESC LIMIT 1")[0]
+        since = format_like(pd.Timestamp(newest) - window, newest)
+        first_id = first_id_since(pool, "responses", "response_id", "received_at", since)
+    except Exception as e:
+        show_db_error(e, db_path)
+    return "r.response_id >= ? AND r.received_at >= ?", (first_id if first_id is not None else -1, since)
+
+# Returns a metric's distribution per group: one grouped query for count, mean, min and max per group,
+# and one for the number of values per group in each of HISTOGRAM_BINS equal bins over the metric's range
+@cache_until_changed
+def get_distribution(metric: str, breakdown: str, window: Optional[timedelta], db_path: str = db_path) -> Tuple[pd.DataFrame, pd.DataFrame, float, float]:
+    where, params = get_window_condition(window, db_path=db_path)
+    value = METRICS[metric]
+    source = f"responses r LEFT JOIN challenges c ON c.challenge_id = r.challenge_id WHERE {where} AND ({value}) IS NOT NULL"
+    try:
+        pool = get_read_only_pool(db_path)
+        summary = pool.query_frame(f"""
+            SELECT coalesce({BREAKDOWNS[breakdown]}, 'unknown') AS "group", count(*) AS count, avg({value}) AS mean, min({value}) AS min, max({value}) AS max
+            FROM {source}
+            GROUP BY 1
+        """, params)
+        low = summary['min'].min() if not summary.empty else 0.0
+        width = (summary['max'].max() - low) / HISTOGRAM_BINS if not summary.empty else 0.0
+        width = width or 1.0
+        histogram = pool.query_frame(f"""
+            SELECT coalesce({BREAKDOWNS[breakdown]}, 'unknown') AS "group", min(CAST((({value}) - ?) / ? AS INTEGER), ?) AS bin, count(*) AS count
+            FROM {source}
+            GROUP BY 1, 2
+        """, (low, width, HISTOGRAM_BINS - 1) + params)
+    except Exception as e:
+        show_db_error(e, db_path)
+    return summary, histogram, float(low), float(width)
+
+# Returns percentiles per group from binned counts, assuming values are spread evenly within a bin
+def histogram_percentiles(histogram: pd.DataFrame, low: float, width: float) -> pd.DataFrame:
+    histogram = histogram.sort_values(['group', 'bin'])
+    running = histogram.groupby('group')['count'].cumsum()
+    total = histogram.groupby('group')['count'].transform('sum')
+    percentiles = {}
+    for q in PERCENTILES:
+        reached = histogram[running >= q * total].assign(running=running, total=total).groupby('group').head(1)
+        within = (q * reached['total'] - (reached['running'] - reached['count'])) / reached['count']
+        percentiles[f"p{round(q * 100)}"] = pd.Series((low + width * (reached['bin'] + within)).to_numpy(), index=reached['group'].to_numpy())
+    return pd.DataFrame(percentiles)
+
+if not table_has_rows("responses", "1", db_path=db_path):
+    st.info("No responses found in " + db_path + ". Please ensure a miner and validator are running.")
+    st.stop()
+
+metric_col, breakdown_col, window_col = st.columns(3)
+metric = metric_col.selectbox("Metric", list(METRICS))
+breakdown = breakdown_col.selectbox("Break down by", list(BREAKDOWNS))
+window = TIME_WINDOWS[window_col.selectbox("Time window", list(TIME_WINDOWS), index=1)]
+summary, histogram, low, width = get_distribution(metric, breakdown, window)
+
+if summary.empty:
+    st.info(f"No responses with a {metric.lower()} in this time window")
+    st.stop()
+
+# Display the overall distribution
+overall = histogram_percentiles(histogram.assign(group="All"), low, width).iloc[0]
+st.subheader(metric)
+count_col, mean_col, *percentile_cols = st.columns(2 + len(PERCENTILES))
+count_col.metric("Responses", f"{summary['count'].sum():,}")
+mean_col.metric("Mean", f"{np.average(summary['mean'], weights=summary['count']):,.2f}")
+for percentile_col, (name, percentile) in zip(percentile_cols, overall.items()):
+    percentile_col.metric(name, f"{percentile:,.2f}")
+st.caption(f"Percentiles are interpolated within histogram bins {width:,.3g} wide")
+
+bins = histogram.groupby('bin', as_index=False)['count'].sum()
+bins['start'] = low + bins['bin'] * width
+bins['end'] = bins['start'] + width
+st.altair_chart(
+    alt.Chart(bins).mark_bar().encode(
+        x=alt.X('start:Q', title=metric),
+        x2='end:Q',
+        y=alt.Y('count:Q', title='Responses'),
+        tooltip=[alt.Tooltip('start:Q', title='From', format=',.3g'), alt.Tooltip('end:Q', title='To', format=',.3g'), alt.Tooltip('count:Q', title='Responses')]
+    ),
+    use_container_width=True
+)
+
+# Display percentiles per group
+st.subheader(f"{metric} per {breakdown.lower()}")
+per_group = summary.set_index('group').join(histogram_percentiles(histogram, low, width)).reset_index()
+per_group['group'] = per_group['group'].astype(str)
+st.bar_chart(per_group, x='group', y=[f"p{round(q * 100)}" for q in PERCENTILES], x_label=breakdown, y_label=metric, stack=False)
+st.dataframe(
+    per_group.rename(columns={'group': breakdown}),
+    column_order=[breakdown, 'count', 'mean', 'min'] + [f"p{round(q * 100)}" for q in PERCENTILES] + ['max'],
+    hide_index=True
+)
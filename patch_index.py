@@ -0,0 +1,315 @@
+import hashlib
+import re
+import sqlite3
+import zlib
+from contextlib import closing
+from itertools import chain
+from typing import List, Optional
+import numpy as np
+import pandas as pd
+from db import CACHE_SIZE_KIB, connect_read_only
+from response_queue import PENDING_LOOKUP_SIZE
+from sidecar import SIDECAR_DB_PATH, chunks, connect_sidecar, get_watermark, set_watermark
+
+# Responses read from validator.db per batch while indexing new ones
+PATCH_BATCH_SIZE = 5000
+
+# Patches are compared as sets of this many consecutive tokens of their added and removed lines
+SHINGLE_SIZE = 5
+
+# MinHash signature length, split into LSH_BANDS bands of equal width. Two patches share a band (and are
+# compared) with a probability of 1 - (1 - s^r)^b for a similarity s, about 0.9998 at s = 0.8 for r = 4, b = 16
+SIGNATURE_LENGTH = 64
+LSH_BANDS = 16
+
+# Two patches sharing a band are near duplicates if this fraction of their signatures agrees (an estimate of their Jaccard similarity)
+NEAR_DUPLICATE_SIMILARITY = 0.8
+
+# Fixed seeds and odd multipliers of the hash functions and multipliers combining token hashes into shingle hashes,
+# changing any of them invalidates every stored signature
+SIGNATURE_SEEDS = np.random.default_rng(20250101).integers(0, 2 ** 63, SIGNATURE_LENGTH, dtype=np.uint64)
+SIGNATURE_MULTIPLIERS = np.random.default_rng(20250102).integers(0, 2 ** 63, SIGNATURE_LENGTH, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+SHINGLE_MULTIPLIERS = np.array([pow(0x9E3779B97F4A7C15, position + 1, 2 ** 64) for position in range(SHINGLE_SIZE)], dtype=np.uint64)
+
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+def ensure_patch_index(conn: sqlite3.Connection) -> None:
+    """
+    Create the patch index: one row per distinct patch (addressed by its SHA-256) with its MinHash signature,
+    the LSH band buckets of every distinct patch, the near duplicate pairs found through them and the patch of every response
+    """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS patch_contents (
+            patch_id INTEGER PRIMARY KEY,
+            patch_hash TEXT NOT NULL UNIQUE,
+            signature BLOB NOT NULL,
+            size INTEGER NOT NULL,
+            first_response_id INTEGER NOT NULL
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS patch_bands (
+            band INTEGER NOT NULL,
+            bucket INTEGER NOT NULL,
+            patch_id INTEGER NOT NULL,
+            PRIMARY KEY (band, bucket, patch_id)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS patch_similarities (
+            patch_id INTEGER NOT NULL,
+            similar_id INTEGER NOT NULL,
+            similarity REAL NOT NULL,
+            PRIMARY KEY (patch_id, similar_id)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS patch_responses (
+            response_id INTEGER PRIMARY KEY,
+            patch_id INTEGER NOT NULL,
+            challenge_id TEXT,
+            type TEXT,
+            miner_hotkey TEXT,
+            node_id INTEGER,
+            received_at TEXT
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_patch_responses_patch_id ON patch_responses (patch_id)")
+
+def patch_tokens(patch: str) -> List[str]:
+    """
+    Return the tokens of a patch's added and removed lines (of all of it if it has none).
+
+    Context lines and file headers come from the repository rather than the miner, so two
+    patches to the same file would look alike through them alone.
+    """
+    lines = [line for line in patch.splitlines() if line[:1] in "+-" and not line.startswith(("+++", "---"))]
+    return TOKEN_PATTERN.findall("\n".join(lines) if lines else patch)
+
+def _mix(values: np.ndarray) -> np.ndarray:
+    """Scramble 64 bit values (the splitmix64 finalizer), wrapping around on overflow"""
+    values = values ^ (values >> np.uint64(30))
+    values = values * np.uint64(0xBF58476D1CE4E5B9)
+    values = values ^ (values >> np.uint64(27))
+    values = values * np.uint64(0x94D049BB133111EB)
+    return values ^ (values >> np.uint64(31))
+
+def minhash_signatures(patches: List[str]) -> np.ndarray:
+    """
+    Return the MinHash signature of every patch, one row of SIGNATURE_LENGTH 32 bit values each.
+
+    Token hashes (CRC-32, computed once per distinct token of the batch) are combined into
+    shingle hashes with a rolling polynomial and scrambled once. Each of the SIGNATURE_LENGTH
+    hash functions is then a multiply-shift of the scrambled hash, all with numpy over the
+    whole batch, so the Python work per patch is its tokenization only.
+    """
+    token_lists = [patch_tokens(patch) for patch in patches]
+    # Patches shorter than a shingle are padded so they still have one
+    token_lists = [tokens + [""] * (SHINGLE_SIZE - len(tokens)) for tokens in token_lists]
+    lengths = np.array([len(tokens) for tokens in token_lists], dtype=np.int64)
+    codes, distinct_tokens = pd.factorize(pd.Series(list(chain.from_iterable(token_lists)), dtype=object))
+    token_hashes = np.array([zlib.crc32(token.encode()) for token in distinct_tokens], dtype=np.uint64)[codes]
+    windows = len(token_hashes) - SHINGLE_SIZE + 1
+    shingles = token_hashes[:windows] * SHINGLE_MULTIPLIERS[0]
+    for position in range(1, SHINGLE_SIZE):
+        shingles += token_hashes[position:position + windows] * SHINGLE_MULTIPLIERS[position]
+    # Keep the windows lying within one patch
+    counts = lengths - SHINGLE_SIZE + 1
+    firsts = np.cumsum(counts) - counts
+    shingles = shingles[np.repeat(np.cumsum(lengths) - lengths, counts) + np.arange(counts.sum()) - np.repeat(firsts, counts)]
+    shingles = _mix(shingles)
+    signatures = np.empty((len(patches), SIGNATURE_LENGTH), dtype=np.uint32)
+    for column, (seed, multiplier) in enumerate(zip(SIGNATURE_SEEDS, SIGNATURE_MULTIPLIERS)):
+        # The top 32 bits of each minimum are kept, which halves the index and rarely makes two minimums agree by chance
+        signatures[:, column] = np.minimum.reduceat((shingles ^ seed) * multiplier, firsts) >> np.uint64(32)
+    return signatures
+
+def band_buckets(signatures: np.ndarray) -> np.ndarray:
+    """Return the bucket of every LSH band of every signature, as a signed 64 bit hash of the band's values"""
+    bands = signatures.astype(np.uint64).reshape(len(signatures), LSH_BANDS, -1)
+    buckets = np.zeros(bands.shape[:2], dtype=np.uint64)
+    for row in range(bands.shape[2]):
+        buckets = _mix(buckets ^ (bands[:, :, row] + np.uint64(0x9E3779B97F4A7C15)))
+    return buckets.view(np.int64)
+
+def _index_patches(conn: sqlite3.Connection, patches: List[str], patch_ids: List[int], first_response_ids: List[int], patch_hashes: List[str]) -> None:
+    """
+    Add distinct patches not indexed yet with their signatures and band buckets, and link near duplicates.
+
+    A new patch is only compared with the first patch (the smallest id) of each of its buckets,
+    looked up through the bucket's primary key, so indexing costs the same however many
+    patches share a bucket. Near duplicates of a bucket's first patch cluster through it.
+    """
+    signatures = minhash_signatures(patches)
+    buckets = band_buckets(signatures)
+    conn.executemany(
+        "INSERT INTO patch_contents (patch_id, patch_hash, signature, size, first_response_id) VALUES (?, ?, ?, ?, ?)",
+        [(patch_id, patch_hash, signature.astype("<u4").tobytes(), len(patch), response_id)
+         for patch_id, patch_hash, signature, patch, response_id in zip(patch_ids, patch_hashes, signatures, patches, first_response_ids)]
+    )
+    # The batch's buckets are staged in a temporary table and copied over sorted, so the inserts walk the
+    # bands' B-tree in order. Buckets first filled in this batch have a new patch as their first, which
+    # the batch's other patches in them are compared with
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS new_patch_bands (band INTEGER NOT NULL, bucket INTEGER NOT NULL, patch_id INTEGER NOT NULL)")
+    conn.execute("DELETE FROM new_patch_bands")
+    conn.executemany(
+        "INSERT INTO new_patch_bands (band, bucket, patch_id) VALUES (?, ?, ?)",
+        [(band, bucket, patch_id) for patch_id, patch_buckets in zip(patch_ids, buckets.tolist()) for band, bucket in enumerate(patch_buckets)]
+    )
+    conn.execute("INSERT INTO patch_bands (band, bucket, patch_id) SELECT band, bucket, patch_id FROM new_patch_bands ORDER BY band, bucket, patch_id")
+    pairs = np.array(conn.execute("""
+        SELECT DISTINCT patch_id, anchor_id FROM (
+            SELECT n.patch_id, (SELECT b.patch_id FROM patch_bands b WHERE b.band = n.band AND b.bucket = n.bucket ORDER BY b.patch_id LIMIT 1) AS anchor_id
+            FROM new_patch_bands n
+        )
+        WHERE anchor_id != patch_id
+    """).fetchall(), dtype=np.int64).reshape(-1, 2)
+    if not len(pairs):
+        return
+    positions = dict(zip(patch_ids, range(len(patch_ids))))
+    anchor_signatures = {}
+    old_anchors = sorted({int(anchor_id) for anchor_id in pairs[:, 1]} - positions.keys())
+    for chunk in chunks(old_anchors, PENDING_LOOKUP_SIZE):
+        for anchor_id, signature in conn.execute(f"SELECT patch_id, signature FROM patch_contents WHERE patch_id IN ({', '.join('?' for _ in chunk)})", chunk):
+            anchor_signatures[anchor_id] = np.frombuffer(signature, dtype="<u4")
+    anchors = np.array([signatures[positions[anchor_id]] if anchor_id in positions else anchor_signatures[anchor_id] for anchor_id in pairs[:, 1].tolist()])
+    similarities = (signatures[[positions[patch_id] for patch_id in pairs[:, 0].tolist()]] == anchors).mean(axis=1)
+    similar = similarities >= NEAR_DUPLICATE_SIMILARITY
+    conn.executemany(
+        "INSERT OR REPLACE INTO patch_similarities (patch_id, similar_id, similarity) VALUES (?, ?, ?)",
+        zip(pairs[similar, 0].tolist(), pairs[similar, 1].tolist(), similarities[similar].tolist())
+    )
+
+def sync_patch_index(validator_db_path: str, sidecar_path: str = SIDECAR_DB_PATH) -> int:
+    """
+    Index the patches of responses written since the last sync and return how many responses were indexed.
+
+    Patches don't change once stored, so each response is read once, by id above the watermark.
+    Every patch is hashed, but only patches not seen before are tokenized and signed.
+    """
+    with closing(connect_sidecar(sidecar_path)) as conn, closing(connect_read_only(validator_db_path)) as source:
+        ensure_patch_index(conn)
+        # The band buckets are looked up at random, a bigger page cache keeps more of them in memory
+        conn.execute(f"PRAGMA cache_size = -{CACHE_SIZE_KIB}")
+        max_id = source.execute("SELECT max(response_id) FROM responses").fetchone()[0] or 0
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            watermark = get_watermark(conn, "patch_index")
+            if max_id < watermark:
+                for table in ("patch_contents", "patch_bands", "patch_similarities", "patch_responses"):
+                    conn.execute(f"DELETE FROM {table}")
+                watermark = 0
+
+            indexed = 0
+            last_id = watermark
+            next_patch_id = (conn.execute("SELECT max(patch_id) FROM patch_contents").fetchone()[0] or 0) + 1
+            while True:
+                responses = source.execute(
+                    """
+                    SELECT r.response_id, r.challenge_id, c.type, r.miner_hotkey, r.node_id, r.received_at, coalesce(cr.response_patch, rr.response_patch)
+                    FROM responses r
+                    LEFT JOIN challenges c ON c.challenge_id = r.challenge_id
+                    LEFT JOIN codegen_responses cr ON cr.response_id = r.response_id
+                    LEFT JOIN regression_responses rr ON rr.response_id = r.response_id
+                    WHERE r.response_id > ? AND r.response_id <= ?
+                    ORDER BY r.response_id LIMIT ?
+                    """,
+                    (last_id, max_id, PATCH_BATCH_SIZE)
+                ).fetchall()
+                if not responses:
+                    break
+                # Responses without a patch have nothing to compare
+                responses_with_patch = [response for response in responses if response[6]]
+                hashes = [hashlib.sha256(response[6].encode()).hexdigest() for response in responses_with_patch]
+                patch_ids = {}
+                for chunk in chunks(sorted(set(hashes)), PENDING_LOOKUP_SIZE):
+                    patch_ids.update(conn.execute(f"SELECT patch_hash, patch_id FROM patch_contents WHERE patch_hash IN ({', '.join('?' for _ in chunk)})", chunk))
+                new_patches = {}
+                for response, patch_hash in zip(responses_with_patch, hashes):
+                    if patch_hash not in patch_ids:
+                        patch_ids[patch_hash] = next_patch_id
+                        new_patches[patch_hash] = (response[6], next_patch_id, response[0])
+                        next_patch_id += 1
+                if new_patches:
+                    patches, new_ids, first_response_ids = zip(*new_patches.values())
+                    _index_patches(conn, list(patches), list(new_ids), list(first_response_ids), list(new_patches))
+                conn.executemany(
+                    "INSERT OR REPLACE INTO patch_responses (response_id, patch_id, challenge_id, type, miner_hotkey, node_id, received_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [
+                        (response_id, patch_ids[patch_hash], challenge_id, type, miner_hotkey, node_id, None if received_at is None else str(received_at))
+                        for (response_id, challenge_id, type, miner_hotkey, node_id, received_at, _), patch_hash in zip(responses_with_patch, hashes)
+                    ]
+                )
+                indexed += len(responses_with_patch)
+                last_id = responses[-1][0]
+
+            set_watermark(conn, "patch_index", max(watermark, max_id))
+            conn.execute("COMMIT")
+            return indexed
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+def _components(node_count: int, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Return the connected component (its smallest node) of nodes 0 to node_count - 1 linked by the edges (a, b)"""
+    parent = list(range(node_count))
+
+    def find(node):
+        while parent[node] != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+    for node_a, node_b in zip(a.tolist(), b.tolist()):
+        root_a, root_b = find(node_a), find(node_b)
+        if root_a != root_b:
+            parent[max(root_a, root_b)] = min(root_a, root_b)
+    return np.array([find(node) for node in range(node_count)], dtype=np.int64)
+
+def get_duplicate_clusters(conn: sqlite3.Connection, near_duplicates: bool, per_challenge: bool) -> pd.DataFrame:
+    """
+    Return every distinct patch (per challenge, or overall) in a duplicate cluster of more than one response, with its cluster.
+
+    Exact clusters are the responses with the same patch. Near duplicate clusters also join
+    patches linked by a stored similarity, transitively. Per challenge, only responses to the
+    same challenge are clustered together, otherwise clusters span challenges.
+    """
+    # Patches submitted once can only be in a cluster through a similarity, so most are never grouped
+    candidates = "SELECT patch_id FROM patch_responses GROUP BY patch_id HAVING count(*) > 1"
+    if near_duplicates:
+        candidates += " UNION SELECT patch_id FROM patch_similarities UNION SELECT similar_id FROM patch_similarities"
+    patches = pd.read_sql_query(
+        f"""
+        SELECT {"challenge_id" if per_challenge else "''"} AS scope, p.patch_id, c.patch_hash, count(*) AS responses,
+            group_concat(DISTINCT p.miner_hotkey) AS miner_hotkeys, group_concat(DISTINCT p.challenge_id) AS challenge_ids,
+            min(p.received_at) AS first_received_at, max(p.received_at) AS last_received_at
+        FROM patch_responses p JOIN patch_contents c ON c.patch_id = p.patch_id
+        WHERE p.patch_id IN ({candidates})
+        GROUP BY 1, 2
+        """,
+        conn
+    )
+    patches['scope'] = patches['scope'].fillna('')
+    if near_duplicates:
+        similarities = pd.read_sql_query("SELECT patch_id, similar_id FROM patch_similarities", conn)
+        # A similarity links two patches within every scope they both appear in
+        nodes = patches[['scope', 'patch_id']].reset_index()
+        edges = similarities.merge(nodes, on='patch_id').merge(nodes.rename(columns={'patch_id': 'similar_id'}), on=['scope', 'similar_id'])
+        patches['cluster'] = _components(len(patches), edges['index_x'].to_numpy(), edges['index_y'].to_numpy())
+    else:
+        patches['cluster'] = np.arange(len(patches))
+    sizes = patches.groupby('cluster')['responses'].transform('sum')
+    return patches[sizes > 1].reset_index(drop=True)
+
+def get_cluster_responses(conn: sqlite3.Connection, patch_ids: List[int], challenge_id: Optional[str]) -> pd.DataFrame:
+    """Return the responses with any of the patches, to one challenge or (if None) any"""
+    where = f"p.patch_id IN ({', '.join('?' for _ in patch_ids)})" + ("" if challenge_id is None else " AND p.challenge_id = ?")
+    return pd.read_sql_query(
+        f"""
+        SELECT p.response_id, p.challenge_id, p.type, p.miner_hotkey, p.node_id, p.received_at, c.patch_hash, c.size AS patch_size
+        FROM patch_responses p JOIN patch_contents c ON c.patch_id = p.patch_id
+        WHERE {where}
+        ORDER BY p.response_id
+        """,
+        conn, params=list(patch_ids) + ([] if challenge_id is None else [challenge_id])
+    )
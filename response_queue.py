@@ -0,0 +1,108 @@
+import sqlite3
+from contextlib import closing
+from datetime import datetime
+import pandas as pd
+from db import connect_read_only
+from sidecar import SIDECAR_DB_PATH, chunks, connect_sidecar, get_watermark, set_watermark
+
+# Responses read from validator.db per batch while folding new ones
+QUEUE_BATCH_SIZE = 20000
+
+# Pending responses looked up per query when checking which were evaluated (below SQLite's limit on parameters)
+PENDING_LOOKUP_SIZE = 500
+
+def ensure_response_queue(conn: sqlite3.Connection) -> None:
+    """Create the tables tracking the evaluation queue: the pending responses, and arrivals and evaluations per minute"""
+    conn.execute("CREATE TABLE IF NOT EXISTS pending_queue (response_id INTEGER PRIMARY KEY, type TEXT, received_at TEXT)")
+    conn.execute("CREATE TABLE IF NOT EXISTS queue_minutes (minute TEXT PRIMARY KEY, arrivals INTEGER NOT NULL, evaluations INTEGER NOT NULL)")
+
+def _count_per_minute(conn: sqlite3.Connection, timestamps: pd.Series, column: str) -> None:
+    """Add one to the arrivals or evaluations of the minute of every timestamp"""
+    counts = pd.to_datetime(timestamps, format="ISO8601", errors="coerce").dt.floor("min").value_counts()
+    values = "?, ?, 0" if column == "arrivals" else "?, 0, ?"
+    conn.executemany(
+        f"INSERT INTO queue_minutes (minute, arrivals, evaluations) VALUES ({values}) "
+        f"ON CONFLICT(minute) DO UPDATE SET {column} = {column} + excluded.{column}",
+        [(minute.strftime("%Y-%m-%dT%H:%M"), int(count)) for minute, count in counts.items()]
+    )
+
+def sync_response_queue(validator_db_path: str, sidecar_path: str = SIDECAR_DB_PATH) -> int:
+    """
+    Bring the queue tables up to date and return how many responses were evaluated since the last sync.
+
+    New responses are read by id above the watermark, counted as arrivals and, while unevaluated,
+    remembered as pending. Evaluation updates rows in place, so instead of rescanning the table
+    only the remembered pending responses are looked up (by primary key) to see which have been
+    evaluated since. A sync therefore costs the new responses plus the current backlog.
+    """
+    with closing(connect_sidecar(sidecar_path)) as conn, closing(connect_read_only(validator_db_path)) as source:
+        ensure_response_queue(conn)
+        max_id = source.execute("SELECT max(response_id) FROM responses").fetchone()[0] or 0
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            watermark = get_watermark(conn, "response_queue")
+            if max_id < watermark:
+                conn.execute("DELETE FROM pending_queue")
+                conn.execute("DELETE FROM queue_minutes")
+                watermark = 0
+
+            # Look up the pending responses from earlier syncs before adding new ones
+            evaluated = 0
+            pending_ids = [row[0] for row in conn.execute("SELECT response_id FROM pending_queue")]
+            for chunk in chunks(pending_ids, PENDING_LOOKUP_SIZE):
+                rows = source.execute(
+                    f"SELECT response_id, evaluated, evaluated_at FROM responses WHERE response_id IN ({', '.join('?' for _ in chunk)})", chunk
+                ).fetchall()
+                done = [(response_id, evaluated_at) for response_id, is_evaluated, evaluated_at in rows if is_evaluated]
+                # Responses that no longer exist are dropped without counting as evaluated
+                gone = set(chunk) - {row[0] for row in rows}
+                _count_per_minute(conn, pd.Series([evaluated_at for _, evaluated_at in done], dtype=object), "evaluations")
+                conn.executemany("DELETE FROM pending_queue WHERE response_id = ?", [(response_id,) for response_id, _ in done] + [(response_id,) for response_id in gone])
+                evaluated += len(done)
+
+            last_id = watermark
+            while True:
+                responses = pd.read_sql_query(
+                    """
+                    SELECT r.response_id, c.type, r.received_at, r.evaluated, r.evaluated_at
+                    FROM responses r LEFT JOIN challenges c ON c.challenge_id = r.challenge_id
+                    WHERE r.response_id > ? AND r.response_id <= ?
+                    ORDER BY r.response_id LIMIT ?
+                    """,
+                    source, params=(last_id, max_id, QUEUE_BATCH_SIZE)
+                )
+                if responses.empty:
+                    break
+                is_evaluated = responses['evaluated'].fillna(0).astype(bool)
+                _count_per_minute(conn, responses['received_at'], "arrivals")
+                _count_per_minute(conn, responses.loc[is_evaluated, 'evaluated_at'], "evaluations")
+                pending = responses[~is_evaluated]
+                conn.executemany(
+                    "INSERT OR REPLACE INTO pending_queue (response_id, type, received_at) VALUES (?, ?, ?)",
+                    [(int(response_id), type, received_at) for response_id, type, received_at in zip(pending['response_id'], pending['type'], pending['received_at'])]
+                )
+                evaluated += int(is_evaluated.sum())
+                last_id = int(responses['response_id'].iloc[-1])
+
+            set_watermark(conn, "response_queue", max(watermark, max_id))
+            conn.execute("COMMIT")
+            return evaluated
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+def get_backlog(conn: sqlite3.Connection) -> pd.DataFrame:
+    """Return the pending responses per challenge type with the oldest one's received_at"""
+    return pd.read_sql_query(
+        "SELECT coalesce(type, 'unknown') AS type, count(*) AS pending, min(received_at) AS oldest_received_at FROM pending_queue GROUP BY 1 ORDER BY 2 DESC",
+        conn
+    )
+
+def get_queue_minutes(conn: sqlite3.Connection, since: datetime) -> pd.DataFrame:
+    """Return arrivals and evaluations per minute from since on, minutes without either are left out"""
+    minutes = pd.read_sql_query(
+        "SELECT minute, arrivals, evaluations FROM queue_minutes WHERE minute >= ? ORDER BY minute",
+        conn, params=(since.strftime("%Y-%m-%dT%H:%M"),)
+    )
+    minutes['minute'] = pd.to_datetime(minutes['minute'], format="%Y-%m-%dT%H:%M")
+    return minutes
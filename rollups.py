@@ -0,0 +1,344 @@
+import json
+import math
+import sqlite3
+from contextlib import closing
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+import numpy as np
+import pandas as pd
+from anomalies import clear_baselines, ensure_baselines, update_baselines
+from db import connect_read_only
+from sidecar import SIDECAR_DB_PATH, connect_sidecar, get_watermark, set_watermark
+
+# Relative accuracy of the quantile sketches: a reported p95 is within 1% of the true p95
+SKETCH_RELATIVE_ACCURACY = 0.01
+SKETCH_GAMMA = (1 + SKETCH_RELATIVE_ACCURACY) / (1 - SKETCH_RELATIVE_ACCURACY)
+
+# Sketch bucket holding zero and negative values
+SKETCH_ZERO_BUCKET = "z"
+
+# Width of a rollup time bucket, the all-time rollup of a node is stored under the bucket ""
+BUCKET_FORMAT = "%Y-%m-%dT%H:00:00"
+ALL_TIME_BUCKET = ""
+
+# Source rows read per batch while folding
+ROLLUP_BATCH_SIZE = 20000
+
+# An assignment that is still not completed this long after it was assigned is assumed to never complete
+ASSIGNMENT_SETTLE_TIME = timedelta(hours=1)
+
+# SQL for the index of the bucket of width ? seconds from the start ? an hourly rollup falls into
+BUCKET_INDEX_SQL = "CAST(round((julianday(bucket_start) - julianday(?)) * 86400) / ? AS INTEGER)"
+
+# Rolled up metrics: response time of availability checks, whether a node was available (as 0/1,
+# so the mean is the availability ratio) and the time from sending a challenge to its completion
+RESPONSE_TIME_METRIC = "availability_response_time_ms"
+AVAILABILITY_METRIC = "availability_ratio"
+COMPLETION_TIME_METRIC = "assignment_completion_time_s"
+
+class QuantileSketch:
+    """
+    A mergeable quantile sketch (DDSketch, Masson et al., 2019).
+
+    Values are counted in logarithmically sized buckets, so any quantile is known to within
+    SKETCH_RELATIVE_ACCURACY and two sketches merge by adding their bucket counts.
+    """
+
+    def __init__(self, counts: Optional[Dict[str, int]] = None):
+        self.counts = counts or {}
+
+    @staticmethod
+    def bucket_indexes(values: np.ndarray) -> np.ndarray:
+        """Return the bucket index of each positive value"""
+        return np.ceil(np.log(values) / math.log(SKETCH_GAMMA)).astype(np.int64)
+
+    def add(self, values: np.ndarray) -> None:
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        positive = values[values > 0]
+        if len(positive) < len(values):
+            self.counts[SKETCH_ZERO_BUCKET] = self.counts.get(SKETCH_ZERO_BUCKET, 0) + int(len(values) - len(positive))
+        indexes, counts = np.unique(self.bucket_indexes(positive), return_counts=True)
+        for index, count in zip(indexes.tolist(), counts.tolist()):
+            self.counts[str(index)] = self.counts.get(str(index), 0) + count
+
+    def merge(self, other: 'QuantileSketch') -> None:
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Return the estimated q-quantile (0 <= q <= 1), or None if the sketch is empty"""
+        total = sum(self.counts.values())
+        if total == 0:
+            return None
+        rank = q * (total - 1)
+        seen = self.counts.get(SKETCH_ZERO_BUCKET, 0)
+        if rank < seen:
+            return 0.0
+        indexes = sorted(int(index) for index in self.counts if index != SKETCH_ZERO_BUCKET)
+        for index in indexes:
+            seen += self.counts[str(index)]
+            if rank < seen:
+                break
+        # The middle of the bucket, in relative terms, is within the accuracy of both its edges
+        return 2 * SKETCH_GAMMA ** index / (SKETCH_GAMMA + 1)
+
+    def to_json(self) -> str:
+        return json.dumps(self.counts, separators=(",", ":"))
+
+    @classmethod
+    def from_json(cls, text: Optional[str]) -> 'QuantileSketch':
+        return cls(json.loads(text) if text else None)
+
+def ensure_rollups(conn: sqlite3.Connection) -> None:
+    """Create the rollup table (count, sum, min, max and a quantile sketch per metric, node and hour, and all time) and the node baselines fed with it"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS node_rollups (
+            metric TEXT NOT NULL,
+            node_id INTEGER NOT NULL,
+            bucket_start TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            sum REAL NOT NULL,
+            min REAL,
+            max REAL,
+            sketch TEXT NOT NULL,
+            PRIMARY KEY (metric, node_id, bucket_start)
+        )
+    """)
+    conn.execute("CREATE TABLE IF NOT EXISTS assignment_rollup_folded (assignment_id INTEGER PRIMARY KEY)")
+    ensure_baselines(conn)
+
+def _clear_metrics(conn: sqlite3.Connection, metrics: Iterable[str]) -> None:
+    for metric in metrics:
+        conn.execute("DELETE FROM node_rollups WHERE metric = ?", (metric,))
+    clear_baselines(conn, metrics)
+
+def fold_into_rollups(conn: sqlite3.Connection, metric: str, samples: pd.DataFrame) -> None:
+    """
+    Fold samples (node_id, timestamp, value) into a metric's hourly and all-time rollups.
+
+    Counts, sums, extremes and sketch buckets are aggregated per node and hour with pandas, then
+    merged with the stored rollups they touch, which are read and written in one query each.
+    """
+    samples = samples.dropna(subset=['node_id', 'value'])
+    if samples.empty:
+        return
+    values = samples['value'].to_numpy(dtype=float)
+    sketch_index = np.full(len(values), SKETCH_ZERO_BUCKET, dtype=object)
+    positive = values > 0
+    sketch_index[positive] = QuantileSketch.bucket_indexes(values[positive]).astype(str)
+    # Only format each distinct hour once, formatting every timestamp is slower than the rest of the fold
+    hours, unique_hours = pd.factorize(pd.to_datetime(samples['timestamp'], format="ISO8601", errors="coerce").dt.floor("h"))
+    bucket_starts = np.asarray(unique_hours.strftime(BUCKET_FORMAT), dtype=object)[hours]
+    bucket_starts[hours == -1] = None
+    hourly = pd.DataFrame({
+        'node_id': samples['node_id'].astype(int).to_numpy(),
+        'bucket_start': bucket_starts,
+        'value': values,
+        'sketch_index': sketch_index
+    }).dropna(subset=['bucket_start'])
+    all_time = hourly.assign(bucket_start=ALL_TIME_BUCKET)
+    frame = pd.concat([hourly, all_time])
+
+    stats = frame.groupby(['node_id', 'bucket_start'])['value'].agg(['count', 'sum', 'min', 'max'])
+    sketches = {}
+    for (node_id, bucket_start, index), count in frame.groupby(['node_id', 'bucket_start', 'sketch_index']).size().items():
+        sketches.setdefault((node_id, bucket_start), {})[index] = count
+
+    # Batches are read in id order, so every hourly rollup they touch starts at or after their first hour
+    first_bucket = hourly['bucket_start'].min() if not hourly.empty else ALL_TIME_BUCKET
+    stored = {
+        (node_id, bucket_start): (count, total, minimum, maximum, sketch)
+        for node_id, bucket_start, count, total, minimum, maximum, sketch in conn.execute(
+            "SELECT node_id, bucket_start, count, sum, min, max, sketch FROM node_rollups WHERE metric = ? AND (bucket_start >= ? OR bucket_start = ?)",
+            (metric, first_bucket, ALL_TIME_BUCKET)
+        )
+    }
+    rows = []
+    for (node_id, bucket_start), count, total, minimum, maximum in zip(stats.index, stats['count'], stats['sum'], stats['min'], stats['max']):
+        sketch = QuantileSketch(sketches[(node_id, bucket_start)])
+        if (node_id, bucket_start) in stored:
+            stored_count, stored_total, stored_min, stored_max, stored_sketch = stored[(node_id, bucket_start)]
+            sketch.merge(QuantileSketch.from_json(stored_sketch))
+            count, total = count + stored_count, total + stored_total
+            minimum = minimum if stored_min is None else min(minimum, stored_min)
+            maximum = maximum if stored_max is None else max(maximum, stored_max)
+        rows.append((metric, int(node_id), bucket_start, int(count), float(total), float(minimum), float(maximum), sketch.to_json()))
+    conn.executemany(
+        "INSERT OR REPLACE INTO node_rollups (metric, node_id, bucket_start, count, sum, min, max, sketch) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        rows
+    )
+
+def sync_availability_rollups(validator_db_path: str, sidecar_path: str = SIDECAR_DB_PATH) -> int:
+    """
+    Fold the availability checks written since the last sync into the rollups and return how many were read.
+
+    Checks are only ever appended, so the id of the last folded check is all that needs to be
+    remembered. If the table was recreated (its ids went backwards) the rollups are rebuilt.
+    """
+    with closing(connect_sidecar(sidecar_path)) as conn, closing(connect_read_only(validator_db_path)) as source:
+        ensure_rollups(conn)
+        max_id = source.execute("SELECT max(id) FROM availability_checks").fetchone()[0] or 0
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            watermark = get_watermark(conn, "availability_rollups")
+            if max_id < watermark:
+                _clear_metrics(conn, (RESPONSE_TIME_METRIC, AVAILABILITY_METRIC))
+                watermark = 0
+            last_id = watermark
+            while True:
+                checks = pd.read_sql_query(
+                    "SELECT id, node_id, checked_at AS timestamp, is_available, response_time_ms FROM availability_checks WHERE id > ? AND id <= ? ORDER BY id LIMIT ?",
+                    source, params=(last_id, max_id, ROLLUP_BATCH_SIZE)
+                )
+                if checks.empty:
+                    break
+                response_times = checks.rename(columns={'response_time_ms': 'value'})
+                availability = checks.assign(value=checks['is_available'].astype(float))
+                fold_into_rollups(conn, RESPONSE_TIME_METRIC, response_times)
+                fold_into_rollups(conn, AVAILABILITY_METRIC, availability)
+                update_baselines(conn, RESPONSE_TIME_METRIC, response_times)
+                update_baselines(conn, AVAILABILITY_METRIC, availability)
+                last_id = int(checks['id'].iloc[-1])
+            set_watermark(conn, "availability_rollups", max(watermark, max_id))
+            conn.execute("COMMIT")
+            return max(max_id - watermark, 0)
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+def sync_assignment_rollups(validator_db_path: str, sidecar_path: str = SIDECAR_DB_PATH) -> int:
+    """
+    Fold newly completed challenge assignments into the completion time rollups and return how many were folded.
+
+    Assignments are completed after they are written, so the watermark only moves past an
+    assignment once it has completed or has been waiting longer than ASSIGNMENT_SETTLE_TIME
+    (measured against the newest assignment, not the wall clock). Completed assignments above
+    the watermark are remembered so none is folded twice.
+    """
+    with closing(connect_sidecar(sidecar_path)) as conn, closing(connect_read_only(validator_db_path)) as source:
+        ensure_rollups(conn)
+        max_id = source.execute("SELECT max(assignment_id) FROM challenge_assignments").fetchone()[0] or 0
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            watermark = get_watermark(conn, "assignment_rollups")
+            if max_id < watermark:
+                _clear_metrics(conn, (COMPLETION_TIME_METRIC,))
+                conn.execute("DELETE FROM assignment_rollup_folded")
+                watermark = 0
+
+            assignments = pd.read_sql_query(
+                "SELECT assignment_id, node_id, assigned_at, sent_at, completed_at FROM challenge_assignments WHERE assignment_id > ? AND assignment_id <= ? ORDER BY assignment_id",
+                source, params=(watermark, max_id)
+            )
+            folded = {row[0] for row in conn.execute("SELECT assignment_id FROM assignment_rollup_folded WHERE assignment_id > ?", (watermark,))}
+            completed = assignments[assignments['completed_at'].notna() & assignments['sent_at'].notna() & ~assignments['assignment_id'].isin(folded)]
+            completion_time = (
+                pd.to_datetime(completed['completed_at'], format="ISO8601", errors="coerce")
+                - pd.to_datetime(completed['sent_at'], format="ISO8601", errors="coerce")
+            ).dt.total_seconds()
+            completion_times = pd.DataFrame({'node_id': completed['node_id'], 'timestamp': completed['completed_at'], 'value': completion_time})
+            fold_into_rollups(conn, COMPLETION_TIME_METRIC, completion_times)
+            update_baselines(conn, COMPLETION_TIME_METRIC, completion_times)
+            conn.executemany("INSERT OR IGNORE INTO assignment_rollup_folded (assignment_id) VALUES (?)", [(int(i),) for i in completed['assignment_id']])
+
+            # Move the watermark up to the first assignment that may still complete
+            assigned_at = pd.to_datetime(assignments['assigned_at'], format="ISO8601", errors="coerce")
+            newest = assigned_at.max()
+            in_flight = assignments['completed_at'].isna() & (assigned_at > newest - ASSIGNMENT_SETTLE_TIME)
+            new_watermark = int(assignments.loc[in_flight, 'assignment_id'].min()) - 1 if in_flight.any() else max_id
+            new_watermark = max(watermark, new_watermark)
+            conn.execute("DELETE FROM assignment_rollup_folded WHERE assignment_id <= ?", (new_watermark,))
+            set_watermark(conn, "assignment_rollups", new_watermark)
+            conn.execute("COMMIT")
+            return len(completed)
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+def reset_rollups(sidecar_path: str = SIDECAR_DB_PATH) -> None:
+    """Drop all rollups, they are rebuilt from the validator tables on the next sync"""
+    with closing(connect_sidecar(sidecar_path)) as conn:
+        ensure_rollups(conn)
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute("DELETE FROM node_rollups")
+        conn.execute("DELETE FROM assignment_rollup_folded")
+        conn.execute("DELETE FROM node_baselines")
+        set_watermark(conn, "availability_rollups", 0)
+        set_watermark(conn, "assignment_rollups", 0)
+        conn.execute("COMMIT")
+
+def get_node_summary(conn: sqlite3.Connection, metric: str, quantiles: Iterable[float] = (0.5, 0.95, 0.99)) -> pd.DataFrame:
+    """Return one row per node with the all-time count, mean, min, max and quantiles of a metric"""
+    rows = conn.execute(
+        "SELECT node_id, count, sum, min, max, sketch FROM node_rollups WHERE metric = ? AND bucket_start = ? ORDER BY node_id",
+        (metric, ALL_TIME_BUCKET)
+    ).fetchall()
+    summary = []
+    for node_id, count, total, minimum, maximum, sketch in rows:
+        sketch = QuantileSketch.from_json(sketch)
+        summary.append({
+            'node_id': node_id, 'count': count, 'mean': total / count if count else None, 'min': minimum, 'max': maximum,
+            **{f"p{round(q * 100)}": sketch.quantile(q) for q in quantiles}
+        })
+    return pd.DataFrame(summary, columns=['node_id', 'count', 'mean', 'min', 'max'] + [f"p{round(q * 100)}" for q in quantiles])
+
+def _bucket_starts(buckets: pd.DataFrame, start: datetime, width: timedelta) -> pd.DataFrame:
+    """Replace the bucket index column of a query result with the time each bucket starts at"""
+    buckets.insert(1, 'bucket_start', pd.Timestamp(start) + pd.to_timedelta(buckets.pop('bucket') * width.total_seconds(), unit="s"))
+    return buckets
+
+def get_node_series(conn: sqlite3.Connection, metric: str, start: datetime, width: timedelta, node_ids: Optional[List[int]] = None) -> pd.DataFrame:
+    """
+    Return a metric per node in buckets of width (a whole number of hours) from start, as node_id, bucket_start, count, mean.
+
+    The hourly rollups are merged into the wider buckets in SQL, so a month of a metric is read
+    as a few rows per node however many samples it was folded from.
+    """
+    clauses = ["metric = ?", "bucket_start != ?", "bucket_start >= ?"]
+    params = [metric, ALL_TIME_BUCKET, start.strftime(BUCKET_FORMAT)]
+    if node_ids:
+        clauses.append(f"node_id IN ({', '.join('?' for _ in node_ids)})")
+        params.extend(node_ids)
+    series = pd.read_sql_query(
+        f"""
+        SELECT node_id, {BUCKET_INDEX_SQL} AS bucket, sum(count) AS count, sum(sum) / sum(count) AS mean
+        FROM node_rollups WHERE {' AND '.join(clauses)}
+        GROUP BY node_id, bucket ORDER BY bucket, node_id
+        """,
+        conn, params=[start.strftime(BUCKET_FORMAT), width.total_seconds()] + params
+    )
+    return _bucket_starts(series, start, width)
+
+def get_node_quantiles(conn: sqlite3.Connection, metric: str, start: datetime, width: timedelta, q: float) -> pd.DataFrame:
+    """
+    Return the q-quantile of a metric per node in buckets of width (a whole number of hours) from start, as node_id, bucket_start, count, quantile.
+
+    The sketches of the hourly rollups are merged in one grouped SQL query (merging sketches is
+    adding up their bucket counts), and the quantile of every node and bucket is then read off
+    the merged counts in one vectorized pass, the same way QuantileSketch.quantile does for one.
+    """
+    counts = pd.read_sql_query(
+        f"""
+        SELECT node_id, {BUCKET_INDEX_SQL} AS bucket, sketch_bucket.key AS sketch_index, sum(sketch_bucket.value) AS count
+        FROM node_rollups, json_each(node_rollups.sketch) AS sketch_bucket
+        WHERE metric = ? AND bucket_start != ? AND bucket_start >= ?
+        GROUP BY node_id, bucket, sketch_index
+        """,
+        conn, params=(start.strftime(BUCKET_FORMAT), width.total_seconds(), metric, ALL_TIME_BUCKET, start.strftime(BUCKET_FORMAT))
+    )
+    # The zero bucket comes before every other, and its values are estimated as 0 (GAMMA ** -inf)
+    counts['index'] = pd.to_numeric(counts['sketch_index'], errors="coerce").fillna(-np.inf)
+    counts = counts.sort_values(['node_id', 'bucket', 'index'])
+    groups = counts.groupby(['node_id', 'bucket'], sort=False)['count']
+    counts['total'] = groups.transform('sum')
+    # The quantile falls into the first sketch bucket whose running count passes its rank
+    reached = counts[groups.cumsum() > q * (counts['total'] - 1)]
+    quantiles = reached.groupby(['node_id', 'bucket'], sort=False).head(1)
+    quantiles = pd.DataFrame({
+        'node_id': quantiles['node_id'],
+        'bucket': quantiles['bucket'],
+        'count': quantiles['total'],
+        'quantile': 2 * SKETCH_GAMMA ** quantiles['index'] / (SKETCH_GAMMA + 1)
+    }).sort_values(['bucket', 'node_id'], ignore_index=True)
+    return _bucket_starts(quantiles, start, width)
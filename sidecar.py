@@ -0,0 +1,40 @@
+import os
+import sqlite3
+from typing import Iterator, List
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Cave keeps its own indexes and rollups in this database so that the subnet's
+# logging.db and validator.db are never altered by the dashboard
+SIDECAR_DB_PATH = os.getenv("CAVE_SIDECAR_DB_PATH") or os.path.join(os.path.dirname(os.path.abspath(__file__)), "cave.db")
+
+def connect_sidecar(path: str = SIDECAR_DB_PATH) -> sqlite3.Connection:
+    """Open the sidecar database in autocommit mode, creating it if needed"""
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("CREATE TABLE IF NOT EXISTS watermarks (name TEXT PRIMARY KEY, last_rowid INTEGER NOT NULL)")
+    return conn
+
+def attach_sidecar(conn: sqlite3.Connection, path: str = SIDECAR_DB_PATH, alias: str = "cave") -> None:
+    """Attach the sidecar database to a connection on a subnet database so both can be joined in one query"""
+    conn.execute("ATTACH DATABASE ? AS " + alias, (path,))
+
+def get_watermark(conn: sqlite3.Connection, name: str) -> int:
+    """Return the last source rowid folded into the sidecar under this name (0 if none)"""
+    row = conn.execute("SELECT last_rowid FROM watermarks WHERE name = ?", (name,)).fetchone()
+    return row[0] if row else 0
+
+def set_watermark(conn: sqlite3.Connection, name: str, last_rowid: int) -> None:
+    """Record the last source rowid folded into the sidecar under this name"""
+    conn.execute(
+        "INSERT INTO watermarks (name, last_rowid) VALUES (?, ?) ON CONFLICT(name) DO UPDATE SET last_rowid = excluded.last_rowid",
+        (name, last_rowid)
+    )
+
+def chunks(values: List, size: int) -> Iterator[List]:
+    """Split ids or keys into lists of at most size, for looking them up with IN (...) below SQLite's limit on parameters"""
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
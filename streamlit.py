@@ -2,12 +2,18 @@ import streamlit as st
 
 cave_page = st.Page("pages/cave.py", title="Cave")
 logs_page = st.Page("pages/logs.py", title="Logging")
+eval_loops_page = st.Page("pages/eval_loops.py", title="Evaluation Loops")
 availability_check_page = st.Page("pages/availability_checks.py", title="Availability Checks")
+availability_heatmap_page = st.Page("pages/availability_heatmap.py", title="Availability Heatmap")
 challenge_assignments_page = st.Page("pages/challenge_assignments.py", title="Challenge Assignments")
 codegen_challenges_page = st.Page("pages/codegen_challenges.py", title="Codegen Challenges")
 regression_challenges_page = st.Page("pages/regression_challenges.py", title="Regression Challenges")
 codegen_responses_page = st.Page("pages/codegen_responses.py", title="Codegen Responses")
 regression_responses_page = st.Page("pages/regression_responses.py", title="Regression Responses")
+pending_responses_page = st.Page("pages/pending_responses.py", title="Pending Responses")
+response_analytics_page = st.Page("pages/response_analytics.py", title="Response Analytics")
+leaderboard_page = st.Page("pages/leaderboard.py", title="Miner Leaderboard")
+patch_duplicates_page = st.Page("pages/patch_duplicates.py", title="Duplicate Patches")
 
-pg = st.navigation([cave_page, logs_page, availability_check_page, challenge_assignments_page, codegen_challenges_page, regression_challenges_page, codegen_responses_page, regression_responses_page])
+pg = st.navigation([cave_page, logs_page, eval_loops_page, availability_check_page, availability_heatmap_page, challenge_assignments_page, codegen_challenges_page, regression_challenges_page, codegen_responses_page, regression_responses_page, pending_responses_page, response_analytics_page, leaderboard_page, patch_duplicates_page])
 pg.run()
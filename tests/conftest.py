@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The modules live at the repository root, which also holds the app's streamlit.py. The root goes last
+# on the path (python -m pytest puts it first), so that file doesn't shadow the streamlit package
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:] = [path for path in sys.path if os.path.abspath(path or os.curdir) != ROOT] + [ROOT]
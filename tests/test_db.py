@@ -0,0 +1,34 @@
+import sqlite3
+import pytest
+from db import ReadOnlyPool
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "validator.db")
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE t (x INTEGER)")
+    return path
+
+def test_connections_are_reused(db_path):
+    pool = ReadOnlyPool(db_path, size=1)
+    with pool.connection() as first:
+        pass
+    with pool.connection() as second:
+        assert second is first
+
+@pytest.mark.parametrize("interruption", [ValueError, KeyboardInterrupt])
+def test_interrupted_borrow_returns_its_slot(db_path, interruption):
+    pool = ReadOnlyPool(db_path, size=1)
+    with pytest.raises(interruption):
+        with pool.connection():
+            raise interruption()
+    assert pool.slots.qsize() == 1
+    assert pool.idle.empty()
+    assert pool.query_one("SELECT count(*) FROM t") == (0,)
+
+def test_failed_open_returns_its_slot(tmp_path):
+    pool = ReadOnlyPool(str(tmp_path / "missing.db"), size=1)
+    with pytest.raises(OSError):
+        with pool.connection():
+            pass
+    assert pool.slots.qsize() == 1
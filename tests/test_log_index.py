@@ -0,0 +1,18 @@
+import pytest
+from log_index import parse_field_query
+
+def test_bare_values():
+    assert parse_field_query("status = error") == [("status", "=", "error")]
+    assert parse_field_query("data.count=5 AND ok = true") == [("data.count", "=", "5"), ("ok", "=", "true")]
+
+def test_not_equal():
+    assert parse_field_query('status != "error"') == [("status", "!=", "error")]
+
+def test_quoted_values():
+    assert parse_field_query('msg = "cats AND dogs"') == [("msg", "=", "cats AND dogs")]
+    assert parse_field_query('msg = "say \\"hi\\"" and level != debug') == [("msg", "=", 'say "hi"'), ("level", "!=", "debug")]
+
+@pytest.mark.parametrize("query", ["", "status", "a = 1 b = 2", "a = 1 AND", "= 1"])
+def test_bad_queries(query):
+    with pytest.raises(ValueError):
+        parse_field_query(query)